@@ -57,6 +57,7 @@ from __future__ import print_function
 import argparse
 import os
 import sys
+import time
 import urllib
 
 import decorator
@@ -938,19 +939,48 @@ class DbCommands(object):
         """Print the current database version."""
         print(migration.db_version())
 
-    @args('--max_rows', metavar='<number>',
-            help='Maximum number of deleted rows to archive')
-    def archive_deleted_rows(self, max_rows):
+    @args('--max_rows', metavar='<number>', default=1000,
+            help='Maximum number of deleted rows to archive in each batch')
+    @args('--until-complete', action='store_true', dest='until_complete',
+          default=False,
+          help='Archive batches of deleted rows until there are none left')
+    @args('--sleep', metavar='<seconds>', default=0,
+          help='Number of seconds to wait between two batches when '
+               '--until-complete is used, to limit the load on the database')
+    def archive_deleted_rows(self, max_rows=1000, until_complete=False,
+                             sleep=0):
         """Move up to max_rows deleted rows from production tables to shadow
-        tables.
+        tables, or batches of max_rows deleted rows until all of them are
+        moved when --until-complete is used.
+
+        Each batch is archived in its own transactions, so the command can be
+        interrupted and run again at any time.
         """
         if max_rows is not None:
             max_rows = int(max_rows)
             if max_rows < 0:
                 print(_("Must supply a positive value for max_rows"))
                 return(1)
+        sleep = float(sleep)
         admin_context = context.get_admin_context()
-        db.archive_deleted_rows(admin_context, max_rows)
+        rows_archived = 0
+        start = time.time()
+        while True:
+            batch_rows = db.archive_deleted_rows(admin_context, max_rows)
+            rows_archived += batch_rows
+            if not until_complete or not batch_rows:
+                break
+            elapsed = time.time() - start
+            print(_("Archived %(rows)d rows so far (%(rate).1f rows/s)") %
+                  {'rows': rows_archived,
+                   'rate': rows_archived / elapsed if elapsed else 0.0})
+            if sleep:
+                time.sleep(sleep)
+        elapsed = time.time() - start
+        print(_("Archived %(rows)d rows in %(elapsed).1f seconds "
+                "(%(rate).1f rows/s)") %
+              {'rows': rows_archived, 'elapsed': elapsed,
+               'rate': rows_archived / elapsed if elapsed else 0.0})
 
     @args('--delete', action='store_true', dest='delete',
           help='If specified, automatically delete any records found where '
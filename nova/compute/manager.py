@@ -140,7 +140,16 @@ compute_opts = [
     cfg.IntOpt('block_device_allocate_retries',
                default=60,
                help='Number of times to retry block device'
-                    ' allocation on failures')
+                    ' allocation on failures'),
+    cfg.IntOpt('resource_audit_concurrency',
+               default=1,
+               help='Number of nodes whose resources are audited '
+                    'concurrently by the update_available_resource periodic '
+                    'task. When greater than 1, the instances and the '
+                    'in-progress migrations of all the nodes of the host are '
+                    'also loaded with one query each instead of one per '
+                    'node, which helps drivers managing many nodes like '
+                    'Ironic.'),
     ]
 
 interval_opts = [
@@ -158,6 +167,13 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance network information "
                     "cache updates"),
+    cfg.IntOpt("heal_instance_info_cache_batch_size",
+               default=0,
+               help="Number of instances whose network information cache "
+                    "is updated on each run of the heal task, with bulk "
+                    "requests to the network API. The instances whose "
+                    "cache failed to update or is the oldest are updated "
+                    "first. 0 updates one instance per run."),
     cfg.IntOpt('reclaim_instance_interval',
                default=0,
                help='Interval in seconds for reclaiming deleted instances'),
@@ -666,7 +682,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='4.5')
+    target = messaging.Target(version='4.6')
 
     # How long to wait in seconds before re-issuing a shutdown
     # signal to an instance during power off.  The overall
@@ -696,6 +712,12 @@ class ComputeManager(manager.Manager):
         self.instance_events = InstanceEvents()
         self._sync_power_pool = eventlet.GreenPool()
         self._syncs_in_progress = {}
+        # Instances whose network info cache failed to update, which the
+        # next runs of the heal task update first
+        self._instance_uuids_heal_first = set()
+        self._heal_cycle_start = None
+        self.heal_stats = {'cycles': 0, 'last_cycle_time': None,
+                           'healed': 0, 'failed': 0}
         self.send_instance_updates = CONF.scheduler_tracks_instance_changes
         if CONF.max_concurrent_builds != 0:
             self._build_semaphore = eventlet.semaphore.Semaphore(
@@ -1364,6 +1386,16 @@ class ComputeManager(manager.Manager):
         """
         return self.driver.refresh_security_group_members(security_group_id)
 
+    @wrap_exception()
+    def prefetch_images(self, context, image_ids):
+        """Tell the virtualization driver to fetch images into its image
+        cache ahead of the instances booted from them.
+        """
+        try:
+            self.driver.prefetch_images(context, image_ids)
+        except NotImplementedError:
+            LOG.debug("The compute driver does not prefetch images")
+
     @object_compat
     @wrap_exception()
     def refresh_instance_security_rules(self, context, instance):
@@ -5469,6 +5501,10 @@ class ComputeManager(manager.Manager):
         if not heal_interval:
             return
 
+        if CONF.heal_instance_info_cache_batch_size > 0:
+            self._heal_instance_info_cache_batch(context)
+            return
+
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
         instance = None
 
@@ -5550,6 +5586,96 @@ class ComputeManager(manager.Manager):
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
 
+    def _heal_instance_info_cache_batch(self, context):
+        """Update the info_cache of the next batch of instances of the
+        host, CONF.heal_instance_info_cache_batch_size at a time.
+
+        The list of the instances to heal is rebuilt once all of them were
+        healed, with the instances whose info_cache is the oldest first. The
+        instances which failed to heal since the previous batch are moved to
+        the front of the list.
+        """
+        instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
+        if not instance_uuids:
+            now = time.time()
+            if self._heal_cycle_start is not None:
+                self.heal_stats['cycles'] += 1
+                self.heal_stats['last_cycle_time'] = (
+                    now - self._heal_cycle_start)
+                LOG.info(_LI('Updated the network info_cache of all the '
+                             'instances in %d seconds'),
+                         self.heal_stats['last_cycle_time'])
+            self._heal_cycle_start = now
+
+            LOG.debug('Rebuilding the list of instances to heal')
+            db_instances = objects.InstanceList.get_by_host(
+                context, self.host, expected_attrs=['info_cache'],
+                use_slave=True)
+
+            def _heal_order(inst):
+                info_cache = inst.info_cache
+                updated_at = (info_cache and (info_cache.updated_at or
+                                              info_cache.created_at))
+                # Instances without info_cache go first
+                return updated_at is not None, updated_at or 0
+
+            instance_uuids = [
+                inst.uuid for inst in sorted(db_instances, key=_heal_order)
+                if inst.vm_state != vm_states.BUILDING and
+                inst.task_state != task_states.DELETING]
+            self._instance_uuids_to_heal = instance_uuids
+
+        heal_first = self._instance_uuids_heal_first
+        if heal_first:
+            # NOTE: the flagged instances which were already healed during
+            # this cycle, or which are not listed yet, are healed again too.
+            # get_by_filters() below drops the ones not on this host anymore.
+            instance_uuids[:] = sorted(heal_first) + [
+                uuid for uuid in instance_uuids if uuid not in heal_first]
+            heal_first.clear()
+
+        batch = instance_uuids[:CONF.heal_instance_info_cache_batch_size]
+        del instance_uuids[:len(batch)]
+        if not batch:
+            LOG.debug("Didn't find any instances for network info cache "
+                      "update.")
+            return
+
+        # The instances which are gone or migrated are not listed
+        filters = {'uuid': batch, 'host': self.host, 'deleted': False}
+        instances = [inst for inst in objects.InstanceList.get_by_filters(
+                         context, filters,
+                         expected_attrs=['system_metadata', 'info_cache'],
+                         use_slave=True)
+                     if inst.task_state != task_states.DELETING]
+        if not instances:
+            return
+
+        try:
+            self.network_api.get_instances_nw_info(context, instances)
+            self.heal_stats['healed'] += len(instances)
+            LOG.debug('Updated the network info_cache of %d instances',
+                      len(instances))
+            return
+        except Exception:
+            LOG.warning(_LW('Failed to update the network info_cache of '
+                            '%d instances at once, updating them one by '
+                            'one'), len(instances), exc_info=True)
+
+        for instance in instances:
+            try:
+                self.network_api.get_instance_nw_info(context, instance)
+                self.heal_stats['healed'] += 1
+            except (exception.InstanceNotFound,
+                    exception.InstanceInfoCacheNotFound):
+                LOG.debug('Instance or its info_cache no longer exists. '
+                          'Unable to refresh', instance=instance)
+            except Exception:
+                LOG.error(_LE('An error occurred while refreshing the network '
+                              'cache.'), instance=instance, exc_info=True)
+                self.heal_stats['failed'] += 1
+                self._instance_uuids_heal_first.add(instance.uuid)
+
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -5924,13 +6050,21 @@ class ComputeManager(manager.Manager):
                         {'num_db_instances': num_db_instances,
                          'num_vm_instances': num_vm_instances})
 
+        # Query the power states of all the instances at once when the
+        # driver can do it in fewer calls than one per instance
+        try:
+            vm_power_states = self.driver.get_power_states()
+        except NotImplementedError:
+            vm_power_states = None
+
         def _sync(db_instance):
             # NOTE(melwitt): This must be synchronized as we query state from
             #                two separate sources, the driver and the database.
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                self._query_driver_power_state_and_sync(
+                    context, db_instance, vm_power_states=vm_power_states)
 
             try:
                 query_driver_power_state_and_sync()
@@ -5952,18 +6086,29 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
-    def _query_driver_power_state_and_sync(self, context, db_instance):
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           vm_power_states=None):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
                          "pending task (%(task)s). Skip."),
                      {'task': db_instance.task_state}, instance=db_instance)
             return
         # No pending tasks. Now try to figure out the real vm_power_state.
-        try:
-            vm_instance = self.driver.get_info(db_instance)
-            vm_power_state = vm_instance.state
-        except exception.InstanceNotFound:
-            vm_power_state = power_state.NOSTATE
+        vm_power_state = None
+        if vm_power_states is not None:
+            vm_power_state = vm_power_states.get(db_instance.uuid,
+                                                 power_state.NOSTATE)
+            # NOTE: the power states of all the instances were queried before
+            # the instance got locked, so the state may have changed since.
+            # Query again the instances which have to be synced.
+            if vm_power_state != db_instance.power_state:
+                vm_power_state = None
+        if vm_power_state is None:
+            try:
+                vm_instance = self.driver.get_info(db_instance)
+                vm_power_state = vm_instance.state
+            except exception.InstanceNotFound:
+                vm_power_state = power_state.NOSTATE
         # Note(maoy): the above get_info call might take a long time,
         # for example, because of a broken libvirt driver.
         try:
@@ -6188,25 +6333,27 @@ class ComputeManager(manager.Manager):
         compute_nodes_in_db = self._get_compute_nodes_in_db(context,
                                                             use_slave=True)
         nodenames = set(self.driver.get_available_nodes())
-        for nodename in nodenames:
-            rt = self._get_resource_tracker(nodename)
-            try:
-                rt.update_available_resource(context)
-            except exception.ComputeHostNotFound:
-                # NOTE(comstud): We can get to this case if a node was
-                # marked 'deleted' in the DB and then re-added with a
-                # different auto-increment id. The cached resource
-                # tracker tried to update a deleted record and failed.
-                # Don't add this resource tracker to the new dict, so
-                # that this will resolve itself on the next run.
-                LOG.info(_LI("Compute node '%s' not found in "
-                             "update_available_resource."), nodename)
-                continue
-            except Exception as e:
-                LOG.error(_LE("Error updating resources for node "
-                              "%(node)s: %(e)s"),
-                          {'node': nodename, 'e': e})
-            new_resource_tracker_dict[nodename] = rt
+        start = time.time()
+        if CONF.resource_audit_concurrency > 1:
+            audit_data = resource_tracker.HostAuditData(context, self.host)
+
+            def _update_node(nodename):
+                return nodename, self._update_available_resource_for_node(
+                    context, nodename, audit_data=audit_data)
+
+            pool = eventlet.GreenPool(CONF.resource_audit_concurrency)
+            for nodename, rt in pool.imap(_update_node, nodenames):
+                if rt is not None:
+                    new_resource_tracker_dict[nodename] = rt
+        else:
+            for nodename in nodenames:
+                rt = self._update_available_resource_for_node(context,
+                                                              nodename)
+                if rt is not None:
+                    new_resource_tracker_dict[nodename] = rt
+        LOG.info(_LI("Audited the resources of %(count)d nodes in "
+                     "%(elapsed).2f seconds"),
+                 {'count': len(nodenames), 'elapsed': time.time() - start})
 
         # NOTE(comstud): Replace the RT cache before looping through
         # compute nodes to delete below, as we can end up doing greenthread
@@ -6220,6 +6367,35 @@ class ComputeManager(manager.Manager):
                 LOG.info(_LI("Deleting orphan compute node %s") % cn.id)
                 cn.destroy()
 
+    def _update_available_resource_for_node(self, context, nodename,
+                                            audit_data=None):
+        """Audit the resources of a node.
+
+        :returns: the resource tracker of the node, or None if its compute
+                  node record was not found.
+        """
+        rt = self._get_resource_tracker(nodename)
+        try:
+            if audit_data is None:
+                rt.update_available_resource(context)
+            else:
+                rt.update_available_resource(context, audit_data=audit_data)
+        except exception.ComputeHostNotFound:
+            # NOTE(comstud): We can get to this case if a node was
+            # marked 'deleted' in the DB and then re-added with a
+            # different auto-increment id. The cached resource
+            # tracker tried to update a deleted record and failed.
+            # Don't add this resource tracker to the new dict, so
+            # that this will resolve itself on the next run.
+            LOG.info(_LI("Compute node '%s' not found in "
+                         "update_available_resource."), nodename)
+            return None
+        except Exception as e:
+            LOG.error(_LE("Error updating resources for node "
+                          "%(node)s: %(e)s"),
+                      {'node': nodename, 'e': e})
+        return rt
+
     def _get_compute_nodes_in_db(self, context, use_slave=False):
         try:
             return objects.ComputeNodeList.get_all_by_host(context, self.host,
@@ -6445,6 +6621,15 @@ class ComputeManager(manager.Manager):
                                  '%(event)s due to: %(error)s'),
                              {'event': event.key, 'error': six.text_type(e)},
                              instance=instance)
+                except Exception:
+                    LOG.error(_LE('Failed to refresh the network info_cache '
+                                  'for external instance event %(event)s'),
+                              {'event': event.key}, instance=instance,
+                              exc_info=True)
+                    # The info_cache is out of date, update it as soon as
+                    # possible. Only the batch heal task clears the set.
+                    if CONF.heal_instance_info_cache_batch_size > 0:
+                        self._instance_uuids_heal_first.add(instance.uuid)
             elif event.name == 'network-vif-deleted':
                 self._process_instance_vif_deleted_event(context,
                                                          instance,
@@ -18,12 +18,15 @@ Track resources like memory and disk for a compute host.  Provides the
 scheduler with useful information about availability through the ComputeNode
 model.
 """
+import collections
 import copy
+import hashlib
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 
 from nova.compute import claims
 from nova.compute import monitors
@@ -52,6 +55,15 @@ resource_tracker_opts = [
     cfg.ListOpt('compute_resources',
                 default=['vcpu'],
                 help='The names of the extra resources to track.'),
+    cfg.IntOpt('resource_tracker_full_audit_interval',
+               default=0,
+               help='Interval in seconds between two full audits of the '
+                    'resource usage of a compute node, which rebuild it from '
+                    'the instances, the migrations and the orphans of the '
+                    'node. In between, the periodic audit only refreshes the '
+                    'hypervisor resources and keeps the usage tracked from '
+                    'the claims, unless the hypervisor runs instances which '
+                    'are not tracked. 0 rebuilds the usage on every audit.'),
 ]
 
 allocation_ratio_opts = [
@@ -85,6 +97,25 @@ COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
 CONF.import_opt('my_ip', 'nova.netconf')
 
+# Instance fields used to compute the usage of a node
+_AUDIT_INSTANCE_ATTRS = ['system_metadata', 'numa_topology']
+
+# Compute node fields which are maintained by the database
+_NON_RESOURCE_FIELDS = ('id', 'created_at', 'updated_at', 'deleted_at',
+                        'deleted')
+
+# Compute node fields which are tracked from the claims between two full
+# audits instead of being copied from the hypervisor view
+_TRACKED_USAGE_FIELDS = ('vcpus_used', 'memory_mb_used', 'local_gb_used',
+                         'numa_topology')
+
+# Compute node fields compared with their audited value to detect drifts
+_DRIFT_FIELDS = ('memory_mb_used', 'local_gb_used', 'running_vms')
+
+# Number of claims made, aborted or dropped and of usage updates on each
+# node, see HostAuditData
+_claim_generations = collections.Counter()
+
 
 def _instance_in_resize_state(instance):
     """Returns True if the instance is in one of the resizing states.
@@ -106,6 +137,75 @@ def _instance_in_resize_state(instance):
     return False
 
 
+def _field_to_primitive(value):
+    if isinstance(value, list):
+        return [obj_base.obj_to_primitive(item) for item in value]
+    return obj_base.obj_to_primitive(value)
+
+
+def _get_field_digests(compute_node):
+    """Returns the digest of the value of each resource field set on a
+    compute node.
+    """
+    digests = {}
+    for field in compute_node.fields:
+        if field in _NON_RESOURCE_FIELDS:
+            continue
+        if compute_node.obj_attr_is_set(field):
+            value = jsonutils.dumps(_field_to_primitive(compute_node[field]),
+                                    sort_keys=True)
+            digests[field] = hashlib.md5(value.encode('utf-8')).hexdigest()
+    return digests
+
+
+class HostAuditData(object):
+    """Instances and in-progress migrations of all the nodes of a host,
+    loaded with one query each for the resource trackers of the nodes.
+
+    The data is loaded under the resource tracker lock. A node which gets a
+    claim afterwards, or whose claims or instances change, has instances or
+    migrations which may be missing or stale in the data, so its resource
+    tracker must query them again.
+    """
+
+    def __init__(self, context, host):
+        self._instances = collections.defaultdict(list)
+        self._migrations = collections.defaultdict(list)
+        self._claim_generations = {}
+        self._load(context, host)
+
+    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
+    def _load(self, context, host):
+        self._claim_generations = dict(_claim_generations)
+        for instance in objects.InstanceList.get_by_host(
+                context, host, expected_attrs=_AUDIT_INSTANCE_ATTRS):
+            self._instances[instance.node].append(instance)
+
+        for migration in objects.MigrationList.get_in_progress_by_host(
+                context, host):
+            nodes = set()
+            if migration.source_compute == host:
+                nodes.add(migration.source_node)
+            if migration.dest_compute == host:
+                nodes.add(migration.dest_node)
+            for node in nodes:
+                self._migrations[node].append(migration)
+
+    def get(self, context, nodename):
+        """Returns the InstanceList and the MigrationList of a node, or
+        (None, None) if the node got a claim since the data was loaded.
+
+        The caller must hold the resource tracker lock.
+        """
+        if (_claim_generations.get(nodename, 0) !=
+                self._claim_generations.get(nodename, 0)):
+            return None, None
+        return (objects.InstanceList(context,
+                                     objects=self._instances[nodename]),
+                objects.MigrationList(context,
+                                      objects=self._migrations[nodename]))
+
+
 class ResourceTracker(object):
     """Compute helper class for keeping track of resource usage as instances
     are built and destroyed.
@@ -124,7 +224,17 @@ class ResourceTracker(object):
         self.monitors = monitor_handler.monitors
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
-        self.old_resources = objects.ComputeNode()
+        # Digests of the fields of the compute node last reported
+        self.old_field_digests = {}
+        self.update_bytes_total = 0
+        self.last_full_audit = None
+        # PCI devices reported by the hypervisor at the last full audit
+        self.last_pci_devices = None
+        self.orphan_uuids = frozenset()
+        # Numbers of full and partial audits, and of full audits which found
+        # a usage different from the one tracked since the previous audit
+        self.audit_stats = {'full': 0, 'partial': 0, 'drifted': 0}
+        self.last_drift = {}
         self.scheduler_client = scheduler_client.SchedulerClient()
         self.ram_allocation_ratio = CONF.ram_allocation_ratio
         self.cpu_allocation_ratio = CONF.cpu_allocation_ratio
@@ -146,6 +256,7 @@ class ResourceTracker(object):
                   be used to revert the resource usage if an error occurs
                   during the instance build.
         """
+        _claim_generations[self.nodename] += 1
         if self.disabled:
             # compute_driver doesn't support resource tracking, just
             # set the 'host' and node fields and continue the build:
@@ -225,6 +336,7 @@ class ResourceTracker(object):
         should be turned into finalize  a resource claim or free
         resources after the compute operation is finished.
         """
+        _claim_generations[self.nodename] += 1
         image_meta = image_meta or {}
         if migration:
             self._claim_existing_migration(migration)
@@ -310,6 +422,7 @@ class ResourceTracker(object):
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
     def abort_instance_claim(self, context, instance):
         """Remove usage from the given instance."""
+        _claim_generations[self.nodename] += 1
         # flag the instance as deleted to revert the resource usage
         # and associated stats:
         instance['vm_state'] = vm_states.DELETED
@@ -321,6 +434,7 @@ class ResourceTracker(object):
     def drop_move_claim(self, context, instance, instance_type=None,
                         image_meta=None, prefix='new_'):
         """Remove usage for an incoming/outgoing migration."""
+        _claim_generations[self.nodename] += 1
         if instance['uuid'] in self.tracked_migrations:
             migration, itype = self.tracked_migrations.pop(instance['uuid'])
 
@@ -357,6 +471,7 @@ class ResourceTracker(object):
         """Update the resource usage and stats after a change in an
         instance
         """
+        _claim_generations[self.nodename] += 1
         if self.disabled:
             return
 
@@ -449,13 +564,18 @@ class ResourceTracker(object):
             notifier.info(context, 'compute.metrics.update', metrics_info)
         return metrics
 
-    def update_available_resource(self, context):
+    def update_available_resource(self, context, audit_data=None):
         """Override in-memory calculations of compute node resource usage based
         on data audited from the hypervisor layer.
 
         Add in resource claims in progress to account for operations that have
         declared a need for resources, but not necessarily retrieved them from
         the hypervisor layer yet.
+
+        :param audit_data: HostAuditData holding the instances and the
+                           migrations of the node, when the caller has loaded
+                           them for all the nodes of the host at once. They
+                           are loaded here if None.
         """
         LOG.info(_LI("Auditing locally available compute resources for "
                      "node %(node)s"),
@@ -481,20 +601,129 @@ class ResourceTracker(object):
 
         self._report_hypervisor_resource_view(resources)
 
-        self._update_available_resource(context, resources)
+        self._update_available_resource(context, resources,
+                                        audit_data=audit_data)
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
-    def _update_available_resource(self, context, resources):
+    def _update_available_resource(self, context, resources, audit_data=None):
 
-        # initialise the compute node object, creating it
-        # if it does not already exist.
-        self._init_compute_node(context, resources)
+        if self._needs_full_audit(resources):
+            tracked_usage = self._get_tracked_usage()
 
-        # if we could not init the compute node the tracker will be
-        # disabled and we should quit now
-        if self.disabled:
+            # initialise the compute node object, creating it
+            # if it does not already exist.
+            self._init_compute_node(context, resources)
+
+            # if we could not init the compute node the tracker will be
+            # disabled and we should quit now
+            if self.disabled:
+                return
+
+            self._audit_usage(context, resources, audit_data)
+            self._record_drift(tracked_usage)
+        else:
+            self._refresh_hypervisor_resources(resources)
+            self.audit_stats['partial'] += 1
+
+        self._report_final_resource_view()
+
+        metrics = self._get_host_metrics(context, self.nodename)
+        # TODO(pmurray): metrics should not be a json string in ComputeNode,
+        # but it is. This should be changed in ComputeNode
+        self.compute_node.metrics = jsonutils.dumps(metrics)
+
+        # update the compute_node
+        self._update(context)
+        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
+                     {'host': self.host, 'node': self.nodename})
+
+    def _needs_full_audit(self, resources):
+        """Returns True if the usage has to be rebuilt from the instances,
+        the migrations and the orphans of the node, False if the usage
+        tracked from the claims since the last full audit can be kept.
+        """
+        interval = CONF.resource_tracker_full_audit_interval
+        if interval <= 0 or self.disabled or self.last_full_audit is None:
+            return True
+        if timeutils.is_older_than(self.last_full_audit, interval):
+            return True
+
+        # The PCI tracker is only updated by a full audit, so a change of the
+        # devices reported by the hypervisor can't wait for the next one
+        if resources.get('pci_passthrough_devices') != self.last_pci_devices:
+            LOG.info(_LI("Running a full audit of node %s for a change of "
+                         "its PCI devices"), self.nodename)
+            return True
+
+        # Instances unknown to the tracker mean that the usage missed some
+        # operation, which only a full audit can account for
+        try:
+            uuids = self.driver.list_instance_uuids_on_node(self.nodename)
+        except NotImplementedError:
+            return False
+        untracked = (set(uuids) - set(self.tracked_instances) -
+                     set(self.tracked_migrations) - self.orphan_uuids)
+        if untracked:
+            LOG.info(_LI("Running a full audit of node %(node)s for the "
+                         "untracked instances %(uuids)s"),
+                     {'node': self.nodename, 'uuids': sorted(untracked)})
+            return True
+        return False
+
+    def _get_tracked_usage(self):
+        """Returns the usage tracked since the last full audit, to be
+        compared with the audited usage, or None if there is none.
+        """
+        if self.disabled or self.last_full_audit is None:
+            return None
+        return {key: self.compute_node[key] for key in _DRIFT_FIELDS}
+
+    def _record_drift(self, tracked_usage):
+        """Compares the usage tracked from the claims since the last full
+        audit with the audited one and records the difference.
+        """
+        self.last_full_audit = timeutils.utcnow()
+        self.audit_stats['full'] += 1
+        if tracked_usage is None:
             return
 
+        self.last_drift = {}
+        for key, value in tracked_usage.items():
+            if self.compute_node[key] != value:
+                self.last_drift[key] = self.compute_node[key] - value
+        if self.last_drift:
+            self.audit_stats['drifted'] += 1
+            LOG.warning(_LW("The usage of node %(node)s tracked since the "
+                            "last audit drifted from the audited usage: "
+                            "%(drift)s (%(drifted)d of %(full)d audits)"),
+                        {'node': self.nodename, 'drift': self.last_drift,
+                         'drifted': self.audit_stats['drifted'],
+                         'full': self.audit_stats['full']})
+
+    def _refresh_hypervisor_resources(self, resources):
+        """Copies the resources reported by the hypervisor to the compute
+        node, keeping the usage tracked from the claims.
+        """
+        usage = {key: self.compute_node[key] for key in _TRACKED_USAGE_FIELDS
+                 if self.compute_node.obj_attr_is_set(key)}
+
+        self.compute_node.ram_allocation_ratio = self.ram_allocation_ratio
+        self.compute_node.cpu_allocation_ratio = self.cpu_allocation_ratio
+        self.compute_node.update_from_virt_driver(resources)
+        for key, value in usage.items():
+            setattr(self.compute_node, key, value)
+
+        # free ram and disk may be negative, depending on policy:
+        self.compute_node.free_ram_mb = (self.compute_node.memory_mb -
+                                         self.compute_node.memory_mb_used)
+        self.compute_node.free_disk_gb = (self.compute_node.local_gb -
+                                          self.compute_node.local_gb_used)
+
+    def _audit_usage(self, context, resources, audit_data):
+        """Rebuilds the usage of the node from its instances, migrations and
+        orphans.
+        """
+        self.last_pci_devices = resources.get('pci_passthrough_devices')
         if 'pci_passthrough_devices' in resources:
             # TODO(jaypipes): Move this into _init_compute_node()
             if not self.pci_tracker:
@@ -504,18 +733,24 @@ class ResourceTracker(object):
             dev_json = resources.pop('pci_passthrough_devices')
             self.pci_tracker.update_devices_from_hypervisor_resources(dev_json)
 
+        instances = migrations = None
+        if audit_data is not None:
+            instances, migrations = audit_data.get(context, self.nodename)
+
         # Grab all instances assigned to this node:
-        instances = objects.InstanceList.get_by_host_and_node(
-            context, self.host, self.nodename,
-            expected_attrs=['system_metadata',
-                            'numa_topology'])
+        if instances is None:
+            instances = objects.InstanceList.get_by_host_and_node(
+                context, self.host, self.nodename,
+                expected_attrs=_AUDIT_INSTANCE_ATTRS)
 
         # Now calculate usage based on instance utilization:
         self._update_usage_from_instances(context, instances)
 
         # Grab all in-progress migrations:
-        migrations = objects.MigrationList.get_in_progress_by_host_and_node(
-                context, self.host, self.nodename)
+        if migrations is None:
+            migrations = (
+                objects.MigrationList.get_in_progress_by_host_and_node(
+                    context, self.host, self.nodename))
 
         self._update_usage_from_migrations(context, migrations)
 
@@ -523,6 +758,7 @@ class ResourceTracker(object):
         # hypervisor, but are not in the DB:
         orphans = self._find_orphaned_instances()
         self._update_usage_from_orphans(orphans)
+        self.orphan_uuids = frozenset(orphan['uuid'] for orphan in orphans)
 
         # NOTE(yjiang5): Because pci device tracker status is not cleared in
         # this periodic task, and also because the resource tracker is not
@@ -535,18 +771,6 @@ class ResourceTracker(object):
         else:
             self.compute_node.pci_device_pools = objects.PciDevicePoolList()
 
-        self._report_final_resource_view()
-
-        metrics = self._get_host_metrics(context, self.nodename)
-        # TODO(pmurray): metrics should not be a json string in ComputeNode,
-        # but it is. This should be changed in ComputeNode
-        self.compute_node.metrics = jsonutils.dumps(metrics)
-
-        # update the compute_node
-        self._update(context)
-        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
-                     {'host': self.host, 'node': self.nodename})
-
     def _get_compute_node(self, context):
         """Returns compute node for the host and nodename."""
         try:
@@ -638,11 +862,31 @@ class ResourceTracker(object):
                   'pci_stats': pci_stats})
 
     def _resource_change(self):
-        """Check to see if any resources have changed."""
-        if not obj_base.obj_equal_prims(self.compute_node, self.old_resources):
-            self.old_resources = copy.deepcopy(self.compute_node)
-            return True
-        return False
+        """Check to see if any resources have changed.
+
+        The fields whose value is the same as when they were last reported
+        are marked as unchanged, so that saving the compute node only writes
+        the changed fields, and their JSON blobs, to the database.
+        """
+        digests = _get_field_digests(self.compute_node)
+        unchanged = [field for field, digest in digests.items()
+                     if self.old_field_digests.get(field) == digest]
+        if unchanged:
+            self.compute_node.obj_reset_changes(unchanged, recursive=True)
+        if len(unchanged) == len(digests):
+            return False
+        self.old_field_digests = digests
+
+        changes = self.compute_node.obj_get_changes()
+        update_bytes = len(jsonutils.dumps(
+            {field: _field_to_primitive(value)
+             for field, value in changes.items()}))
+        self.update_bytes_total += update_bytes
+        LOG.debug("Updating fields %(fields)s of compute node %(node)s: "
+                  "%(bytes)d bytes, %(total)d bytes since startup",
+                  {'fields': sorted(changes), 'node': self.nodename,
+                   'bytes': update_bytes, 'total': self.update_bytes_total})
+        return True
 
     def _update(self, context):
         """Update partial stats locally and populate them to Scheduler."""
@@ -22,6 +22,7 @@ from oslo_serialization import jsonutils
 
 from nova import exception
 from nova.i18n import _
+from nova.i18n import _LW
 from nova import objects
 from nova.objects import base as objects_base
 from nova import rpc
@@ -302,6 +303,7 @@ class ComputeAPI(object):
         * 4.4  - Make refresh_instance_security_rules send an instance object
         * 4.5  - Add migration, scheduler_node and limits arguments to
                  rebuild_instance()
+        * 4.6  - Add prefetch_images()
     '''
 
     VERSION_ALIASES = {
@@ -939,6 +941,16 @@ class ComputeAPI(object):
         cctxt.cast(ctxt, 'refresh_security_group_members',
                    security_group_id=security_group_id)
 
+    def prefetch_images(self, ctxt, host, image_ids):
+        version = '4.6'
+        if not self.client.can_send_version(version):
+            LOG.warning(_LW('Not prefetching images %(image_ids)s on host '
+                            '%(host)s, its compute service is too old'),
+                        {'image_ids': image_ids, 'host': host})
+            return
+        cctxt = self.client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'prefetch_images', image_ids=image_ids)
+
     def refresh_instance_security_rules(self, ctxt, host, instance):
         version = '4.4'
         if not self.client.can_send_version(version):
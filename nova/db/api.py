@@ -209,6 +209,20 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_updated_since(context, since):
+    """Get all computeNodes created, updated or deleted since a given time.
+
+    :param context: The security context
+    :param since: datetime; only nodes with a created_at, updated_at or
+                  deleted_at timestamp newer than or equal to this are
+                  returned
+
+    :returns: List of dictionaries each containing compute node properties,
+              including soft-deleted nodes so that callers can evict them
+    """
+    return IMPL.compute_node_get_all_updated_since(context, since)
+
+
 def compute_node_get_all_by_host(context, host, use_slave=False):
     """Get compute nodes by host name
 
@@ -479,6 +493,13 @@ def migration_get_in_progress_by_host_and_node(context, host, node):
     return IMPL.migration_get_in_progress_by_host_and_node(context, host, node)
 
 
+def migration_get_in_progress_by_host(context, host):
+    """Finds all migrations from or to any node of the given host that are
+    not yet confirmed or reverted.
+    """
+    return IMPL.migration_get_in_progress_by_host(context, host)
+
+
 def migration_get_all_by_filters(context, filters):
     """Finds all migrations in progress."""
     return IMPL.migration_get_all_by_filters(context, filters)
@@ -1113,6 +1134,20 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_multi(context, resources, requests, until_refresh, max_age,
+                        project_id=None, user_id=None):
+    """Check quotas and create the reservations of several requests at once.
+
+    Each request is a dict with the project_quotas, user_quotas, deltas and
+    expire of a quota_reserve() call. Returns a list holding, for each
+    request, either the list of reservation UUIDs or the OverQuota exception
+    to raise.
+    """
+    return IMPL.quota_reserve_multi(context, resources, requests,
+                                    until_refresh, max_age,
+                                    project_id=project_id, user_id=user_id)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
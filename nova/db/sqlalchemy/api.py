@@ -72,6 +72,22 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.IntOpt('instance_list_join_batch_size',
+               default=0,
+               help='When set, the instance listings load the info cache and '
+                    'security groups of the instances with separate queries '
+                    'instead of joining them to the instances query, and the '
+                    'tables associated with the instances are queried for '
+                    'batches of at most this many instances. Set to 0 to '
+                    'join the info cache and security groups and to query '
+                    'the other tables for all the instances at once.'),
+    cfg.BoolOpt('instance_list_keyset_pagination',
+                default=True,
+                help='When paginating instance listings, also bound the '
+                     'first sort key with the value of the marker so that '
+                     'the database can seek to the marker using an index '
+                     'instead of scanning all the instances sorted before '
+                     'it.'),
 ]
 
 api_db_opts = [
@@ -589,6 +605,15 @@ def compute_node_get_all(context):
     return model_query(context, models.ComputeNode, read_deleted='no').all()
 
 
+def compute_node_get_all_updated_since(context, since):
+    model = models.ComputeNode
+    return model_query(context, model, read_deleted='yes').\
+        filter(or_(model.created_at >= since,
+                   model.updated_at >= since,
+                   model.deleted_at >= since)).\
+        all()
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
     return model_query(context, models.ComputeNode).\
@@ -1727,6 +1752,24 @@ def _instance_get_by_uuid(context, uuid, session=None,
     return result
 
 
+def _instance_get_marker(context, uuid, sort_keys, session=None):
+    """Returns a row with the values of the sort keys of an instance, used
+    as a pagination marker.
+    """
+    columns = models.Instance.__table__.columns
+    sort_attrs = [getattr(models.Instance, key)
+                  for key in sort_keys if key in columns]
+    result = model_query(context, models.Instance, args=sort_attrs or None,
+                         session=session).\
+                filter(models.Instance.uuid == uuid).\
+                first()
+
+    if not result:
+        raise exception.InstanceNotFound(instance_id=uuid)
+
+    return result
+
+
 @require_context
 def instance_get(context, instance_id, columns_to_join=None):
     try:
@@ -1769,37 +1812,64 @@ def _build_instance_get(context, session=None,
 
 
 def _instances_fill_metadata(context, instances,
-                             manual_joins=None, use_slave=False):
+                             manual_joins=None, use_slave=False,
+                             batch_size=0):
     """Selectively fill instances with manually-joined metadata. Note that
     instance will be converted to a dict.
 
     :param context: security context
     :param instances: list of instances to fill
     :param manual_joins: list of tables to manually join (can be any
-                         combination of 'metadata' and 'system_metadata' or
-                         None to take the default of both)
+                         combination of 'metadata', 'system_metadata',
+                         'pci_devices', 'info_cache' and 'security_groups' or
+                         None to take the default of 'metadata' and
+                         'system_metadata')
+    :param batch_size: maximum number of instances whose rows are queried at
+                       once for each table, or 0 to query all the instances
+                       at once
     """
     uuids = [inst['uuid'] for inst in instances]
+    if batch_size > 0:
+        uuid_batches = [uuids[i:i + batch_size]
+                        for i in range(0, len(uuids), batch_size)]
+    else:
+        uuid_batches = [uuids]
 
     if manual_joins is None:
         manual_joins = ['metadata', 'system_metadata']
 
+    def _get_rows_by_uuid(get_multi, **kwargs):
+        rows_by_uuid = collections.defaultdict(list)
+        for batch in uuid_batches:
+            for row in get_multi(context, batch, **kwargs):
+                rows_by_uuid[row['instance_uuid']].append(row)
+        return rows_by_uuid
+
     meta = collections.defaultdict(list)
     if 'metadata' in manual_joins:
-        for row in _instance_metadata_get_multi(context, uuids,
-                                                use_slave=use_slave):
-            meta[row['instance_uuid']].append(row)
+        meta = _get_rows_by_uuid(_instance_metadata_get_multi,
+                                 use_slave=use_slave)
 
     sys_meta = collections.defaultdict(list)
     if 'system_metadata' in manual_joins:
-        for row in _instance_system_metadata_get_multi(context, uuids,
-                                                       use_slave=use_slave):
-            sys_meta[row['instance_uuid']].append(row)
+        sys_meta = _get_rows_by_uuid(_instance_system_metadata_get_multi,
+                                     use_slave=use_slave)
 
     pcidevs = collections.defaultdict(list)
     if 'pci_devices' in manual_joins:
-        for row in _instance_pcidevs_get_multi(context, uuids):
-            pcidevs[row['instance_uuid']].append(row)
+        pcidevs = _get_rows_by_uuid(_instance_pcidevs_get_multi)
+
+    info_caches = collections.defaultdict(list)
+    if 'info_cache' in manual_joins:
+        info_caches = _get_rows_by_uuid(_instance_info_cache_get_multi,
+                                        use_slave=use_slave)
+
+    secgroups = collections.defaultdict(list)
+    if 'security_groups' in manual_joins:
+        for batch in uuid_batches:
+            for secgroup, instance_uuid in _instance_security_groups_get_multi(
+                    context, batch, use_slave=use_slave):
+                secgroups[instance_uuid].append(secgroup)
 
     filled_instances = []
     for inst in instances:
@@ -1808,6 +1878,14 @@ def _instances_fill_metadata(context, instances,
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
             inst['pci_devices'] = pcidevs[inst['uuid']]
+        if 'info_cache' in manual_joins:
+            caches = info_caches[inst['uuid']]
+            inst['info_cache'] = caches[0] if caches else None
+        if 'security_groups' in manual_joins:
+            # NOTE: Like the Instance.security_groups relationship, only
+            # report the security groups of the instances not deleted.
+            inst['security_groups'] = ([] if inst['deleted'] else
+                                       secgroups[inst['uuid']])
         filled_instances.append(inst)
 
     return filled_instances
@@ -1951,6 +2029,16 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
         manual_joins, columns_to_join_new = (
             _manual_join_columns(columns_to_join))
 
+    # NOTE: Joining the info cache and security groups makes the database
+    # return wide and duplicated rows, which are expensive to turn into
+    # models when listing many instances.
+    batch_size = CONF.instance_list_join_batch_size
+    if batch_size > 0:
+        for column in ('info_cache', 'security_groups'):
+            if column in columns_to_join_new:
+                columns_to_join_new.remove(column)
+                manual_joins.append(column)
+
     query_prefix = session.query(models.Instance)
     for column in columns_to_join_new:
         if 'extra.' in column:
@@ -2048,11 +2136,14 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     # paginate query
     if marker is not None:
         try:
-            marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker,
+            marker = _instance_get_marker(
+                    context.elevated(read_deleted='yes'), marker, sort_keys,
                     session=session)
         except exception.InstanceNotFound:
             raise exception.MarkerNotFound(marker)
+        if CONF.instance_list_keyset_pagination:
+            query_prefix = _instance_keyset_filter(query_prefix, marker,
+                                                   sort_keys[0], sort_dirs[0])
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2062,7 +2153,28 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     except db_exc.InvalidSortKey:
         raise exception.InvalidSortKey()
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins,
+                                    batch_size=batch_size)
+
+
+def _instance_keyset_filter(query, marker, sort_key, sort_dir):
+    """Bounds an Instance query with the marker value of the first sort key.
+
+    paginate_query() selects the rows following the marker with an OR of
+    comparisons on all the sort keys, which databases can't resolve with an
+    index range scan. The bound is redundant with that OR but lets the
+    database seek to the marker in an index starting with the sort key, so
+    that deep pages cost as much as the first ones.
+    """
+    if sort_key not in models.Instance.__table__.columns:
+        return query
+    value = getattr(marker, sort_key)
+    if value is None:
+        return query
+    sort_attr = getattr(models.Instance, sort_key)
+    if sort_dir == 'desc':
+        return query.filter(sort_attr <= value)
+    return query.filter(sort_attr >= value)
 
 
 def _tag_instance_filter(context, query, filters):
@@ -2645,6 +2757,15 @@ def instance_remove_security_group(context, instance_uuid, security_group_id):
 ###################
 
 
+def _instance_info_cache_get_multi(context, instance_uuids, use_slave=False):
+    if not instance_uuids:
+        return []
+    return model_query(context, models.InstanceInfoCache,
+                       use_slave=use_slave, read_deleted='yes').\
+                    filter(
+            models.InstanceInfoCache.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 def instance_info_cache_get(context, instance_uuid):
     """Gets an instance info cache from the table.
@@ -3517,6 +3638,155 @@ def _calculate_overquota(project_quotas, user_quotas, deltas,
     return overs
 
 
+def _quota_reserve(elevated, session, resources, project_quotas, user_quotas,
+                   deltas, expire, until_refresh, max_age, project_id,
+                   user_id, project_usages, user_usages):
+    """Checks quotas and creates the reservations of a single request.
+
+    This must be called within a transaction holding the lock on the
+    quota_usages rows of the project, which have been loaded in
+    project_usages and user_usages. Both are updated with the reserved
+    quantities, so that several requests can be checked one after the other
+    within the same transaction.
+
+    :return: tuple of the list of reservation UUIDs (None if the request is
+             over quota), the list of over quota resources and the list of
+             resources whose usage would go below 0.
+    """
+    # Handle usage refresh
+    work = set(deltas.keys())
+    while work:
+        resource = work.pop()
+
+        # Do we need to refresh the usage?
+        created = _create_quota_usage_if_missing(user_usages, resource,
+                                                 until_refresh, project_id,
+                                                 user_id, session)
+        refresh = created or _is_quota_refresh_needed(
+                                    user_usages[resource], max_age)
+
+        # OK, refresh the usage
+        if refresh:
+            # Grab the sync routine
+            sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
+
+            updates = sync(elevated, project_id, user_id, session)
+            for res, in_use in updates.items():
+                # Make sure we have a destination for the usage!
+                _create_quota_usage_if_missing(user_usages, res,
+                                               until_refresh, project_id,
+                                               user_id, session)
+                _refresh_quota_usages(user_usages[res], until_refresh,
+                                      in_use)
+
+                # Because more than one resource may be refreshed
+                # by the call to the sync routine, and we don't
+                # want to double-sync, we make sure all refreshed
+                # resources are dropped from the work set.
+                work.discard(res)
+
+                # NOTE(Vek): We make the assumption that the sync
+                #            routine actually refreshes the
+                #            resources that it is the sync routine
+                #            for.  We don't check, because this is
+                #            a best-effort mechanism.
+
+    # Check for deltas that would go negative
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and
+              delta + user_usages[res].in_use < 0]
+
+    # Now, let's check the quotas
+    # NOTE(Vek): We're only concerned about positive increments.
+    #            If a project has gone over quota, we want them to
+    #            be able to reduce their usage without any
+    #            problems.
+    for key, value in user_usages.items():
+        if key not in project_usages:
+            LOG.debug('Copying QuotaUsage for resource "%(key)s" from '
+                      'user_usages into project_usages: %(value)s',
+                      {'key': key, 'value': dict(value)})
+            project_usages[key] = value
+
+    overs = _calculate_overquota(project_quotas, user_quotas, deltas,
+                                 project_usages, user_usages)
+
+    # NOTE(Vek): The quota check needs to be in the transaction,
+    #            but the transaction doesn't fail just because
+    #            we're over quota, so the OverQuota raise is
+    #            outside the transaction.  If we did the raise
+    #            here, our usage updates would be discarded, but
+    #            they're not invalidated by being over-quota.
+
+    # Create the reservations
+    reservations = None
+    if not overs:
+        reservations = []
+        for res, delta in deltas.items():
+            reservation = _reservation_create(
+                                             str(uuid.uuid4()),
+                                             user_usages[res],
+                                             project_id,
+                                             user_id,
+                                             res, delta, expire,
+                                             session=session)
+            reservations.append(reservation.uuid)
+
+            # Also update the reserved quantity
+            # NOTE(Vek): Again, we are only concerned here about
+            #            positive increments.  Here, though, we're
+            #            worried about the following scenario:
+            #
+            #            1) User initiates resize down.
+            #            2) User allocates a new instance.
+            #            3) Resize down fails or is reverted.
+            #            4) User is now over quota.
+            #
+            #            To prevent this, we only update the
+            #            reserved value if the delta is positive.
+            if delta > 0:
+                user_usages[res].reserved += delta
+                # NOTE: The project usages are aggregated in dicts, which
+                # must be kept in sync for the next requests of the same
+                # transaction.
+                if isinstance(project_usages[res], dict):
+                    project_usages[res]['reserved'] += delta
+                    project_usages[res]['total'] += delta
+
+    return reservations, overs, unders
+
+
+def _build_overquota(project_quotas, user_quotas, deltas, overs,
+                     project_usages, user_usages):
+    """Returns the OverQuota exception to raise for a request."""
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        # NOTE(mriedem): user_usages is a dict of resource keys to
+        # QuotaUsage sqlalchemy dict-like objects and doen't log well
+        # so convert the user_usages values to something useful for
+        # logging. Remove this if we ever change how
+        # _get_project_user_quota_usages returns the user_usages values.
+        user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
+                               total=v['total'])
+                  for k, v in user_usages.items()}
+        usages = user_usages
+    usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+              for k, v in usages.items()}
+    LOG.debug('Raise OverQuota exception because: '
+              'project_quotas: %(project_quotas)s, '
+              'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
+              'overs: %(overs)s, project_usages: %(project_usages)s, '
+              'user_usages: %(user_usages)s',
+              {'project_quotas': project_quotas,
+               'user_quotas': user_quotas,
+               'overs': overs, 'deltas': deltas,
+               'project_usages': project_usages,
+               'user_usages': user_usages})
+    return exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                               usages=usages)
+
+
 @require_context
 @oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
@@ -3535,98 +3805,10 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         project_usages, user_usages = _get_project_user_quota_usages(
                 context, session, project_id, user_id)
 
-        # Handle usage refresh
-        work = set(deltas.keys())
-        while work:
-            resource = work.pop()
-
-            # Do we need to refresh the usage?
-            created = _create_quota_usage_if_missing(user_usages, resource,
-                                                     until_refresh, project_id,
-                                                     user_id, session)
-            refresh = created or _is_quota_refresh_needed(
-                                        user_usages[resource], max_age)
-
-            # OK, refresh the usage
-            if refresh:
-                # Grab the sync routine
-                sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
-
-                updates = sync(elevated, project_id, user_id, session)
-                for res, in_use in updates.items():
-                    # Make sure we have a destination for the usage!
-                    _create_quota_usage_if_missing(user_usages, res,
-                                                   until_refresh, project_id,
-                                                   user_id, session)
-                    _refresh_quota_usages(user_usages[res], until_refresh,
-                                          in_use)
-
-                    # Because more than one resource may be refreshed
-                    # by the call to the sync routine, and we don't
-                    # want to double-sync, we make sure all refreshed
-                    # resources are dropped from the work set.
-                    work.discard(res)
-
-                    # NOTE(Vek): We make the assumption that the sync
-                    #            routine actually refreshes the
-                    #            resources that it is the sync routine
-                    #            for.  We don't check, because this is
-                    #            a best-effort mechanism.
-
-        # Check for deltas that would go negative
-        unders = [res for res, delta in deltas.items()
-                  if delta < 0 and
-                  delta + user_usages[res].in_use < 0]
-
-        # Now, let's check the quotas
-        # NOTE(Vek): We're only concerned about positive increments.
-        #            If a project has gone over quota, we want them to
-        #            be able to reduce their usage without any
-        #            problems.
-        for key, value in user_usages.items():
-            if key not in project_usages:
-                LOG.debug('Copying QuotaUsage for resource "%(key)s" from '
-                          'user_usages into project_usages: %(value)s',
-                          {'key': key, 'value': dict(value)})
-                project_usages[key] = value
-
-        overs = _calculate_overquota(project_quotas, user_quotas, deltas,
-                                     project_usages, user_usages)
-
-        # NOTE(Vek): The quota check needs to be in the transaction,
-        #            but the transaction doesn't fail just because
-        #            we're over quota, so the OverQuota raise is
-        #            outside the transaction.  If we did the raise
-        #            here, our usage updates would be discarded, but
-        #            they're not invalidated by being over-quota.
-
-        # Create the reservations
-        if not overs:
-            reservations = []
-            for res, delta in deltas.items():
-                reservation = _reservation_create(
-                                                 str(uuid.uuid4()),
-                                                 user_usages[res],
-                                                 project_id,
-                                                 user_id,
-                                                 res, delta, expire,
-                                                 session=session)
-                reservations.append(reservation.uuid)
-
-                # Also update the reserved quantity
-                # NOTE(Vek): Again, we are only concerned here about
-                #            positive increments.  Here, though, we're
-                #            worried about the following scenario:
-                #
-                #            1) User initiates resize down.
-                #            2) User allocates a new instance.
-                #            3) Resize down fails or is reverted.
-                #            4) User is now over quota.
-                #
-                #            To prevent this, we only update the
-                #            reserved value if the delta is positive.
-                if delta > 0:
-                    user_usages[res].reserved += delta
+        reservations, overs, unders = _quota_reserve(
+            elevated, session, resources, project_quotas, user_quotas,
+            deltas, expire, until_refresh, max_age, project_id, user_id,
+            project_usages, user_usages)
 
         # Apply updates to the usages table
         for usage_ref in user_usages.values():
@@ -3637,36 +3819,55 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                         "resources: %s"), unders)
 
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            # NOTE(mriedem): user_usages is a dict of resource keys to
-            # QuotaUsage sqlalchemy dict-like objects and doen't log well
-            # so convert the user_usages values to something useful for
-            # logging. Remove this if we ever change how
-            # _get_project_user_quota_usages returns the user_usages values.
-            user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
-                                   total=v['total'])
-                      for k, v in user_usages.items()}
-            usages = user_usages
-        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
-                  for k, v in usages.items()}
-        LOG.debug('Raise OverQuota exception because: '
-                  'project_quotas: %(project_quotas)s, '
-                  'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
-                  'overs: %(overs)s, project_usages: %(project_usages)s, '
-                  'user_usages: %(user_usages)s',
-                  {'project_quotas': project_quotas,
-                   'user_quotas': user_quotas,
-                   'overs': overs, 'deltas': deltas,
-                   'project_usages': project_usages,
-                   'user_usages': user_usages})
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages)
+        raise _build_overquota(project_quotas, user_quotas, deltas, overs,
+                               project_usages, user_usages)
 
     return reservations
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def quota_reserve_multi(context, resources, requests, until_refresh, max_age,
+                        project_id=None, user_id=None):
+    elevated = context.elevated()
+    session = get_session()
+    results = []
+    with session.begin():
+
+        if project_id is None:
+            project_id = context.project_id
+        if user_id is None:
+            user_id = context.user_id
+
+        # NOTE: The quota_usages rows are locked once for all the requests,
+        # which are then checked in order as if they had been reserved one
+        # after the other.
+        project_usages, user_usages = _get_project_user_quota_usages(
+                context, session, project_id, user_id)
+
+        for request in requests:
+            reservations, overs, unders = _quota_reserve(
+                elevated, session, resources, request['project_quotas'],
+                request['user_quotas'], request['deltas'], request['expire'],
+                until_refresh, max_age, project_id, user_id,
+                project_usages, user_usages)
+            if unders:
+                LOG.warning(_LW("Change will make usage less than 0 for the "
+                                "following resources: %s"), unders)
+            if overs:
+                results.append(_build_overquota(
+                    request['project_quotas'], request['user_quotas'],
+                    request['deltas'], overs, project_usages, user_usages))
+            else:
+                results.append(reservations)
+
+        # Apply updates to the usages table
+        for usage_ref in user_usages.values():
+            session.add(usage_ref)
+
+    return results
+
+
 def _quota_reservations_query(session, context, reservations):
     """Return the relevant reservations."""
 
@@ -4096,6 +4297,22 @@ def security_group_get_by_project(context, project_id):
                         all()
 
 
+def _instance_security_groups_get_multi(context, instance_uuids,
+                                        use_slave=False):
+    """Returns (security group, instance_uuid) tuples for the instances."""
+    if not instance_uuids:
+        return []
+    association = models.SecurityGroupInstanceAssociation
+    return model_query(context, models.SecurityGroup,
+                       args=(models.SecurityGroup, association.instance_uuid),
+                       use_slave=use_slave, read_deleted='no').\
+                    join(association, and_(
+                        association.security_group_id ==
+                        models.SecurityGroup.id,
+                        association.deleted == 0)).\
+                    filter(association.instance_uuid.in_(instance_uuids))
+
+
 @require_context
 def security_group_get_by_instance(context, instance_uuid):
     return _security_group_get_query(context, read_deleted="no").\
@@ -4480,6 +4697,17 @@ def migration_get_in_progress_by_host_and_node(context, host, node):
             all()
 
 
+def migration_get_in_progress_by_host(context, host):
+
+    return model_query(context, models.Migration).\
+            filter(or_(models.Migration.source_compute == host,
+                       models.Migration.dest_compute == host)).\
+            filter(~models.Migration.status.in_(['confirmed', 'reverted',
+                                                 'error'])).\
+            options(joinedload_all('instance.system_metadata')).\
+            all()
+
+
 def migration_get_all_by_filters(context, filters):
     query = model_query(context, models.Migration)
     if "status" in filters:
@@ -6024,18 +6252,21 @@ def archive_deleted_rows(context, max_rows=None):
     """Move up to max_rows rows from production tables to the corresponding
     shadow tables.
 
+    The tables are walked so that the rows of a table are archived before the
+    rows of the tables they reference through foreign keys.
+
     :returns: Number of rows archived.
     """
     # The context argument is only used for the decorator.
-    tablenames = []
-    for model_class in six.itervalues(models.__dict__):
-        if hasattr(model_class, "__tablename__"):
-            tablenames.append(model_class.__tablename__)
     rows_archived = 0
-    for tablename in tablenames:
-        rows_archived += archive_deleted_rows_for_table(context, tablename,
-                                         max_rows=max_rows - rows_archived)
-        if rows_archived >= max_rows:
+    for table in reversed(models.BASE.metadata.sorted_tables):
+        if max_rows is not None:
+            table_max_rows = max_rows - rows_archived
+        else:
+            table_max_rows = None
+        rows_archived += archive_deleted_rows_for_table(
+            context, table.name, max_rows=table_max_rows)
+        if max_rows is not None and rows_archived >= max_rows:
             break
     return rows_archived
 
@@ -0,0 +1,37 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from oslo_db.sqlalchemy import utils
+
+
+INSTANCES_TABLE_NAME = 'instances'
+# Indexes matching the default sort keys of the instance listings, for all
+# the projects and for a single project
+INDEXES = [
+    ('instances_deleted_created_at_id_idx',
+     ['deleted', 'created_at', 'id']),
+    ('instances_project_id_deleted_created_at_id_idx',
+     ['project_id', 'deleted', 'created_at', 'id']),
+]
+
+
+def upgrade(migrate_engine):
+    """Add indexes to paginate the instance listings."""
+    for index_name, index_columns in INDEXES:
+        if not utils.index_exists(migrate_engine, INSTANCES_TABLE_NAME,
+                                  index_name):
+            utils.add_index(migrate_engine, INSTANCES_TABLE_NAME, index_name,
+                            index_columns)
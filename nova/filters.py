@@ -17,6 +17,8 @@
 Filter support
 """
 
+import logging as std_logging
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -78,6 +80,7 @@ class BaseFilterHandler(loadables.BaseLoader):
         part_filter_results = []
         full_filter_results = []
         log_msg = "%(cls_name)s: (start: %(start)s, end: %(end)s)"
+        debug_enabled = LOG.isEnabledFor(std_logging.DEBUG)
         for filter_ in filters:
             if filter_.run_filter_for_index(index):
                 cls_name = filter_.__class__.__name__
@@ -91,10 +94,11 @@ class BaseFilterHandler(loadables.BaseLoader):
                 part_filter_results.append(log_msg % {"cls_name": cls_name,
                         "start": start_count, "end": end_count})
                 if list_objs:
-                    remaining = [(getattr(obj, "host", obj),
-                                  getattr(obj, "nodename", ""))
-                                 for obj in list_objs]
-                    full_filter_results.append((cls_name, remaining))
+                    if debug_enabled:
+                        remaining = [(getattr(obj, "host", obj),
+                                      getattr(obj, "nodename", ""))
+                                     for obj in list_objs]
+                        full_filter_results.append((cls_name, remaining))
                 else:
                     LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
                     full_filter_results.append((cls_name, None))
@@ -251,6 +251,14 @@ class NetworkAPI(base.Base):
                                                update_cells=False)
         return result
 
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances, by instance
+        uuid, and updates their info caches.
+        """
+        return dict((instance.uuid,
+                     self.get_instance_nw_info(context, instance))
+                    for instance in instances)
+
     def _get_instance_nw_info(self, context, instance, **kwargs):
         """Template method, so a subclass can implement for neutron/network."""
         raise NotImplementedError()
@@ -18,6 +18,7 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
@@ -124,6 +125,13 @@ linux_net_opts = [
                default='DROP',
                help='The table that iptables to jump to when a packet is '
                     'to be dropped.'),
+    cfg.BoolOpt('iptables_incremental_apply',
+                default=False,
+                help='If True, only the chains of this service which '
+                     'changed since the last apply are rewritten, with '
+                     'iptables-restore --noflush, instead of saving and '
+                     'restoring the whole tables. Changes to the shared '
+                     'chains still restore the whole tables.'),
     cfg.IntOpt('ovs_vsctl_timeout',
                default=120,
                help='Amount of time, in seconds, that ovs_vsctl should wait '
@@ -181,6 +189,9 @@ class IptablesRule(object):
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        return hash((self.chain, self.rule, self.wrap, self.top))
+
     def __repr__(self):
         if self.wrap:
             chain = '%s-%s' % (binary_name, self.chain)
@@ -200,6 +211,28 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.dirty = True
+        # Hashes of the rules, to skip duplicate rules in constant time
+        self._rule_set = set()
+        # (name, wrap) of the chains changed since the last apply
+        self.dirty_chains = set()
+        # Whether the whole table was applied once, which is required
+        # before applying the dirty chains only
+        self.applied = False
+
+    def _set_rules(self, rules):
+        self.rules = rules
+        self._rule_set = set(rules)
+
+    def can_apply_incrementally(self):
+        """Returns whether applying the dirty chains of the table is
+        enough, which is the case when only chains wrapped by this service
+        changed since the table was fully applied.
+        """
+        if not self.dirty:
+            return True
+        return (self.applied and not self.remove_rules and
+                not self.remove_chains and
+                all(wrap for _name, wrap in self.dirty_chains))
 
     def has_chain(self, name, wrap=True):
         if wrap:
@@ -223,6 +256,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
         self.dirty = True
 
     def remove_chain(self, name, wrap=True):
@@ -244,6 +278,7 @@ class IptablesTable(object):
                             'exist'), name)
             return
         self.dirty = True
+        self.dirty_chains.add((name, wrap))
 
         # non-wrapped chains and rules need to be dealt with specially,
         # so we keep a list of them to be iterated over in apply()
@@ -252,17 +287,19 @@ class IptablesTable(object):
         chain_set.remove(name)
         if not wrap:
             self.remove_rules += filter(lambda r: r.chain == name, self.rules)
-        self.rules = filter(lambda r: r.chain != name, self.rules)
+        self._set_rules(filter(lambda r: r.chain != name, self.rules))
 
         if wrap:
             jump_snippet = '-j %s-%s' % (binary_name, name)
         else:
             jump_snippet = '-j %s' % (name,)
 
+        jump_rules = filter(lambda r: jump_snippet in r.rule, self.rules)
         if not wrap:
-            self.remove_rules += filter(lambda r: jump_snippet in r.rule,
-                                        self.rules)
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+            self.remove_rules += jump_rules
+        self.dirty_chains.update((r.chain, r.wrap) for r in jump_rules)
+        self._set_rules(filter(lambda r: jump_snippet not in r.rule,
+                               self.rules))
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -282,12 +319,13 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         rule_obj = IptablesRule(chain, rule, wrap, top)
-        if rule_obj in self.rules:
+        if rule_obj in self._rule_set:
             LOG.debug("Skipping duplicate iptables rule addition. "
-                      "%(rule)r already in %(rules)r",
-                      {'rule': rule_obj, 'rules': self.rules})
+                      "%r already in the table", rule_obj)
         else:
-            self.rules.append(IptablesRule(chain, rule, wrap, top))
+            self.rules.append(rule_obj)
+            self._rule_set.add(rule_obj)
+            self.dirty_chains.add((chain, wrap))
             self.dirty = True
 
     def _wrap_target_chain(self, s):
@@ -303,10 +341,13 @@ class IptablesTable(object):
         CLI tool.
 
         """
+        rule_obj = IptablesRule(chain, rule, wrap, top)
         try:
-            self.rules.remove(IptablesRule(chain, rule, wrap, top))
+            self.rules.remove(rule_obj)
+            self._rule_set.discard(rule_obj)
             if not wrap:
-                self.remove_rules.append(IptablesRule(chain, rule, wrap, top))
+                self.remove_rules.append(rule_obj)
+            self.dirty_chains.add((chain, wrap))
             self.dirty = True
         except ValueError:
             LOG.warning(_LW('Tried to remove rule that was not there:'
@@ -319,20 +360,24 @@ class IptablesTable(object):
         if isinstance(regex, six.string_types):
             regex = re.compile(regex)
         num_rules = len(self.rules)
-        self.rules = filter(lambda r: not regex.match(str(r)), self.rules)
-        removed = num_rules - len(self.rules)
-        if removed > 0:
+        removed_rules = filter(lambda r: regex.match(str(r)), self.rules)
+        if removed_rules:
+            self._set_rules(filter(lambda r: not regex.match(str(r)),
+                                   self.rules))
+            self.dirty_chains.update((r.chain, r.wrap) for r in removed_rules)
             self.dirty = True
-        return removed
+        return num_rules - len(self.rules)
 
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
         chained_rules = [rule for rule in self.rules
                               if rule.chain == chain and rule.wrap == wrap]
         if chained_rules:
+            self.dirty_chains.add((chain, wrap))
             self.dirty = True
         for rule in chained_rules:
             self.rules.remove(rule)
+            self._rule_set.discard(rule)
 
 
 class IptablesManager(object):
@@ -454,12 +499,19 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        With iptables_incremental_apply, once the tables were applied,
+        only the chains wrapped by this component which changed are
+        rewritten.
+
         """
         s = [('iptables', self.ipv4)]
         if CONF.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            if (CONF.iptables_incremental_apply and
+                    self._apply_incremental(cmd, tables)):
+                continue
             all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
                                                 run_as_root=True,
                                                 attempts=5)
@@ -468,12 +520,77 @@ class IptablesManager(object):
                 start, end = self._find_table(all_lines, table_name)
                 all_lines[start:end] = self._modify_rules(
                         all_lines[start:end], table, table_name)
-                table.dirty = False
             self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
                          process_input='\n'.join(all_lines),
                          attempts=5)
+            for table in six.itervalues(tables):
+                table.dirty = False
+                table.dirty_chains.clear()
+                table.applied = True
         LOG.debug("IPTablesManager.apply completed with success")
 
+    def _apply_incremental(self, cmd, tables):
+        """Rewrites the dirty chains of the tables with a single
+        iptables-restore --noflush, without saving the tables first.
+
+        Declaring a chain flushes it, so each dirty chain is declared and
+        followed by all its rules, and the chains which were removed are
+        deleted once nothing jumps to them anymore.
+
+        Returns False when the tables must be fully applied instead.
+        """
+        if not all(table.can_apply_incrementally()
+                   for table in six.itervalues(tables)):
+            return False
+
+        lines = []
+        dirty_tables = []
+        for table_name, table in sorted(six.iteritems(tables)):
+            if not table.dirty:
+                continue
+            dirty_tables.append(table)
+            lines.extend(self._modify_chains(table, table_name))
+
+        if lines:
+            try:
+                self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                             run_as_root=True,
+                             process_input='\n'.join(lines),
+                             attempts=5)
+            except processutils.ProcessExecutionError:
+                LOG.warning(_LW('Failed to apply the changed iptables '
+                                'chains, applying the whole tables'),
+                            exc_info=True)
+                return False
+        for table in dirty_tables:
+            table.dirty = False
+            table.dirty_chains.clear()
+        return True
+
+    def _modify_chains(self, table, table_name):
+        """Returns the iptables-restore lines rewriting the dirty chains of
+        the table.
+        """
+        chains = set(name for name, _wrap in table.dirty_chains)
+        top_rules = dict((name, []) for name in chains)
+        bottom_rules = dict((name, []) for name in chains)
+        for rule in table.rules:
+            if rule.wrap and rule.chain in chains:
+                if rule.top:
+                    top_rules[rule.chain].append(str(rule))
+                else:
+                    bottom_rules[rule.chain].append(str(rule))
+
+        lines = ['*' + table_name]
+        lines += [':%s-%s - [0:0]' % (binary_name, name)
+                  for name in sorted(chains)]
+        for name in sorted(chains):
+            lines += top_rules[name] + bottom_rules[name]
+        lines += ['-X %s-%s' % (binary_name, name)
+                  for name in sorted(chains - table.chains)]
+        lines.append('COMMIT')
+        return lines
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -596,6 +713,11 @@ class IptablesManager(object):
                 seen_lines.add(line)
                 return True
 
+        # Number of lines to remove by rule, ignoring the [packet:byte]
+        # counts at the beginning of the rules
+        remove_rule_strs = collections.Counter(
+            str(rule).split(' ', 1)[1].strip() for rule in remove_rules)
+
         def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
@@ -604,23 +726,17 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chains:
+                    remove_chains.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
                 # ignore [packet:byte] counts at beginning of lines
                 line = line.split(']', 1)[1]
                 line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                if remove_rule_strs[line] > 0:
+                    remove_rule_strs[line] -= 1
+                    return False
 
             # Leave it alone
             return True
@@ -635,8 +751,7 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
 
@@ -18,6 +18,7 @@
 import copy
 import time
 import uuid
+import weakref
 
 from keystoneclient import auth
 from keystoneclient.auth.identity import v2 as v2_auth
@@ -30,6 +31,7 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
 from oslo_utils import uuidutils
+import requests
 import six
 
 from nova.api.openstack import extensions
@@ -122,10 +124,30 @@ neutron_opts = [
                 default=600,
                 help='Number of seconds before querying neutron for'
                      ' extensions'),
+    cfg.IntOpt('connection_pool_size',
+               default=0,
+               help='Maximum number of connections kept alive to each '
+                    'host serving the neutron and identity APIs, shared by '
+                    'all the requests of the service. Requests wait for a '
+                    'connection to be free when all of them are in use. 0 '
+                    'keeps the default of the HTTP library, which opens '
+                    'extra connections instead of waiting and only keeps '
+                    '10 of them alive.'),
+    cfg.BoolOpt('cache_request_lookups',
+                default=False,
+                help='Memoize the networks available to a tenant, the '
+                     'subnets and the DHCP ports listed while handling a '
+                     'request, so that they are only listed once per '
+                     'request. The lookups are discarded with the context '
+                     'of the request.'),
    ]
 
 NEUTRON_GROUP = 'neutron'
 
+# Maximum number of ids filtered on by a query of the bulk network info
+# refresh, which keeps the query string of the requests reasonably short
+_BULK_QUERY_SIZE = 100
+
 CONF = cfg.CONF
 CONF.register_opts(neutron_opts, NEUTRON_GROUP)
 
@@ -150,6 +172,9 @@ soft_external_network_attach_authorize = extensions.soft_core_authorizer(
 
 _SESSION = None
 _ADMIN_AUTH = None
+# Dicts of the lookups memoized for each request context, see
+# _get_request_cache()
+_REQUEST_CACHES = weakref.WeakKeyDictionary()
 
 
 def list_opts():
@@ -179,6 +204,52 @@ def reset_state():
     _SESSION = None
 
 
+def _load_session(conf):
+    kwargs = {}
+    if conf.neutron.connection_pool_size > 0:
+        requests_session = requests.Session()
+        adapter = session.TCPKeepAliveAdapter(
+            pool_maxsize=conf.neutron.connection_pool_size, pool_block=True)
+        requests_session.mount('http://', adapter)
+        requests_session.mount('https://', adapter)
+        kwargs['session'] = requests_session
+    return session.Session.load_from_conf_options(conf, NEUTRON_GROUP,
+                                                  **kwargs)
+
+
+def get_connection_stats():
+    """Returns the number of connections opened to the neutron and
+    identity APIs, the number of requests sent and an estimate of the
+    number of these requests which reused an open connection.
+
+    The estimate counts all the requests sent on a connection but the first
+    one as reused. The counters of the pools discarded by the HTTP library
+    are lost, so it only covers the pools still open.
+    """
+    stats = {'connections': 0, 'requests': 0, 'reused_estimate': 0}
+    if not _SESSION:
+        return stats
+    for adapter in set(_SESSION.session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats['connections'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+    stats['reused_estimate'] = max(stats['requests'] - stats['connections'],
+                                   0)
+    return stats
+
+
+def _get_request_cache(context, name):
+    """Returns the dict memoizing the name lookups of the request context,
+    or None if CONF.neutron.cache_request_lookups is disabled.
+    """
+    if not CONF.neutron.cache_request_lookups:
+        return None
+    caches = _REQUEST_CACHES.setdefault(context, {})
+    return caches.setdefault(name, {})
+
+
 def _load_auth_plugin(conf):
     auth_plugin = auth.load_from_conf_options(conf, NEUTRON_GROUP)
 
@@ -219,7 +290,7 @@ def get_client(context, admin=False):
     auth_plugin = None
 
     if not _SESSION:
-        _SESSION = session.Session.load_from_conf_options(CONF, NEUTRON_GROUP)
+        _SESSION = _load_session(CONF)
 
     if admin or (context.is_admin and not context.auth_token):
         # NOTE(jamielennox): The theory here is that we maintain one
@@ -271,6 +342,11 @@ class API(base_api.NetworkAPI):
         The list contains networks owned by the tenant and public networks.
         If net_ids specified, it searches networks with requested IDs only.
         """
+        cache = _get_request_cache(context, 'networks')
+        cache_key = (project_id, tuple(net_ids or ()))
+        if cache is not None and cache_key in cache:
+            return copy.deepcopy(cache[cache_key])
+
         if not neutron:
             neutron = get_client(context)
 
@@ -293,6 +369,8 @@ class API(base_api.NetworkAPI):
             nets,
             net_ids)
 
+        if cache is not None:
+            cache[cache_key] = copy.deepcopy(nets)
         return nets
 
     def _create_port(self, port_client, instance, network_id, port_req_body,
@@ -750,6 +828,7 @@ class API(base_api.NetworkAPI):
             self.last_neutron_extension_sync = time.time()
             self.extensions.clear()
             self.extensions = {ext['name']: ext for ext in extensions_list}
+            LOG.debug('Neutron connection stats: %s', get_connection_stats())
 
     def _has_port_binding_extension(self, context, refresh_cache=False,
                                     neutron=None):
@@ -929,8 +1008,111 @@ class API(base_api.NetworkAPI):
                                                  preexisting_port_ids)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances, by instance
+        uuid, and updates their info caches.
+
+        The ports, floating IPs, subnets, DHCP ports and networks of all the
+        instances are queried with a fixed number of requests to Neutron,
+        instead of several requests per port of every instance.
+        """
+        client = get_client(context, admin=True)
+        neutron_data = self._get_neutron_data_for_instances(client,
+                                                            instances)
+        result = {}
+        for instance in instances:
+            with lockutils.lock('refresh_cache-%s' % instance.uuid):
+                compute_utils.refresh_info_cache_for_instance(context,
+                                                              instance)
+                cached_port_ids = set(
+                    vif['id'] for vif in
+                    compute_utils.get_nw_info_for_instance(instance))
+                port_ids = set(port['id'] for port in
+                               neutron_data['ports'].get(instance.uuid, []))
+                if cached_port_ids == port_ids:
+                    nw_info = network_model.NetworkInfo.hydrate(
+                        self._build_network_info_model(
+                            context, instance, admin_client=client,
+                            neutron_data=neutron_data))
+                else:
+                    # NOTE: the ports of the instance changed since they
+                    # were queried, or the info cache is out of date.
+                    # Queries with the lock held handle both cases.
+                    nw_info = self._get_instance_nw_info(
+                        context, instance, admin_client=client)
+                base_api.update_instance_cache_with_nw_info(
+                    self, context, instance, nw_info=nw_info,
+                    update_cells=False)
+            result[instance.uuid] = nw_info
+        return result
+
+    def _get_neutron_data_for_instances(self, client, instances):
+        """Query the ports, floating IPs, subnets, DHCP ports and networks
+        of several instances in bulk.
+
+        :returns: a dict of the ports of the instances by instance uuid, the
+                  floating IPs by port id and fixed IP address, the subnets
+                  by id, the DHCP ports by network id and the networks by id
+        """
+        def _list(resource, key, ids, **search_opts):
+            method = getattr(client, 'list_%s' % resource)
+            ids = list(ids)
+            items = []
+            for i in range(0, len(ids), _BULK_QUERY_SIZE):
+                search_opts[key] = ids[i:i + _BULK_QUERY_SIZE]
+                items.extend(method(**search_opts).get(resource, []))
+            return items
+
+        project_ids = dict((instance.uuid, instance.project_id)
+                           for instance in instances)
+        ports = {}
+        for port in _list('ports', 'device_id', project_ids):
+            if port['tenant_id'] == project_ids[port['device_id']]:
+                ports.setdefault(port['device_id'], []).append(port)
+        all_ports = [port for device_ports in ports.values()
+                     for port in device_ports]
+
+        floatingips = {}
+        try:
+            fips = _list('floatingips', 'port_id',
+                         [port['id'] for port in all_ports])
+        # If a neutron plugin does not implement the L3 API a 404 from
+        # list_floatingips will be raised.
+        except neutron_client_exc.NeutronClientException as e:
+            if e.status_code != 404:
+                raise
+            fips = []
+        for fip in fips:
+            floatingips.setdefault((fip['port_id'], fip['fixed_ip_address']),
+                                   []).append(fip)
+
+        subnet_ids = set(ip['subnet_id'] for port in all_ports
+                         for ip in port['fixed_ips'])
+        subnets = dict((subnet['id'], subnet) for subnet in
+                       _list('subnets', 'id', subnet_ids))
+
+        dhcp_ports = {}
+        for port in _list('ports', 'network_id',
+                          set(subnet['network_id']
+                              for subnet in subnets.values()),
+                          device_owner='network:dhcp'):
+            dhcp_ports.setdefault(port['network_id'], []).append(port)
+
+        net_ids = set()
+        for instance in instances:
+            net_ids.update(vif['network']['id'] for vif in
+                           compute_utils.get_nw_info_for_instance(instance))
+        networks = dict((net['id'], net) for net in
+                        _list('networks', 'id', net_ids))
+
+        return {'ports': ports,
+                'floatingips': floatingips,
+                'subnets': subnets,
+                'dhcp_ports': dhcp_ports,
+                'networks': networks}
+
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
-                                      port_ids=None):
+                                      port_ids=None, neutron_data=None):
         """Return an instance's complete list of port_ids and networks."""
 
         if ((networks is None and port_ids is not None) or
@@ -946,7 +1128,14 @@ class API(base_api.NetworkAPI):
             port_ids = [iface['id'] for iface in ifaces]
             net_ids = [iface['network']['id'] for iface in ifaces]
 
-        if networks is None:
+        if (networks is None and neutron_data is not None and net_ids and
+                all(net_id in neutron_data['networks'] for net_id in net_ids)):
+            networks = []
+            for net_id in net_ids:
+                net = neutron_data['networks'][net_id]
+                if net not in networks:
+                    networks.append(net)
+        elif networks is None:
             networks = self._get_available_networks(context,
                                                     instance.project_id,
                                                     net_ids)
@@ -1547,12 +1736,16 @@ class API(base_api.NetworkAPI):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, client, port, neutron_data=None):
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            if neutron_data is None:
+                floats = self._get_floating_ips_by_fixed_and_port(
+                    client, fixed_ip['ip_address'], port['id'])
+            else:
+                floats = neutron_data['floatingips'].get(
+                    (port['id'], fixed_ip['ip_address']), [])
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -1560,8 +1753,13 @@ class API(base_api.NetworkAPI):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs,
+                             neutron_data=None):
+        if neutron_data is None:
+            subnets = self._get_subnets_from_port(context, port)
+        else:
+            subnets = self._get_prefetched_subnets_from_port(port,
+                                                             neutron_data)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1642,7 +1840,8 @@ class API(base_api.NetworkAPI):
 
     def _build_network_info_model(self, context, instance, networks=None,
                                   port_ids=None, admin_client=None,
-                                  preexisting_port_ids=None):
+                                  preexisting_port_ids=None,
+                                  neutron_data=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1659,6 +1858,10 @@ class API(base_api.NetworkAPI):
         allocate and there shouldn't be deleted when an instance is
         de-allocated. Supplied list will be added to the cached list of
         preexisting port IDs for this instance.
+        :param neutron_data - Ports, floating IPs, subnets, DHCP ports and
+        networks of several instances queried in bulk by
+        _get_neutron_data_for_instances, or None to query those of this
+        instance.
         """
 
         search_opts = {'tenant_id': instance.project_id,
@@ -1668,12 +1871,20 @@ class API(base_api.NetworkAPI):
         else:
             client = admin_client
 
-        data = client.list_ports(**search_opts)
-
-        current_neutron_ports = data.get('ports', [])
+        if neutron_data is None:
+            data = client.list_ports(**search_opts)
+            current_neutron_ports = data.get('ports', [])
+        else:
+            current_neutron_ports = neutron_data['ports'].get(instance.uuid,
+                                                              [])
         nw_info_refresh = networks is None and port_ids is None
-        networks, port_ids = self._gather_port_ids_and_networks(
-                context, instance, networks, port_ids)
+        if neutron_data is None:
+            networks, port_ids = self._gather_port_ids_and_networks(
+                    context, instance, networks, port_ids)
+        else:
+            networks, port_ids = self._gather_port_ids_and_networks(
+                    context, instance, networks, port_ids,
+                    neutron_data=neutron_data)
         nw_info = network_model.NetworkInfo()
 
         if preexisting_port_ids is None:
@@ -1699,11 +1910,18 @@ class API(base_api.NetworkAPI):
                     or current_neutron_port['status'] == 'ACTIVE'):
                     vif_active = True
 
-                network_IPs = self._nw_info_get_ips(client,
-                                                    current_neutron_port)
-                subnets = self._nw_info_get_subnets(context,
-                                                    current_neutron_port,
-                                                    network_IPs)
+                if neutron_data is None:
+                    network_IPs = self._nw_info_get_ips(client,
+                                                        current_neutron_port)
+                    subnets = self._nw_info_get_subnets(context,
+                                                        current_neutron_port,
+                                                        network_IPs)
+                else:
+                    network_IPs = self._nw_info_get_ips(
+                        client, current_neutron_port, neutron_data)
+                    subnets = self._nw_info_get_subnets(
+                        context, current_neutron_port, network_IPs,
+                        neutron_data)
 
                 devname = "tap" + current_neutron_port['id']
                 devname = devname[:network_model.NIC_NAME_LEN]
@@ -1747,44 +1965,77 @@ class API(base_api.NetworkAPI):
         # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
+        subnet_ids = tuple(ip['subnet_id'] for ip in fixed_ips)
+        subnets_cache = _get_request_cache(context, 'subnets')
+        if subnets_cache is not None and subnet_ids in subnets_cache:
+            ipam_subnets = subnets_cache[subnet_ids]
+        else:
+            search_opts = {'id': list(subnet_ids)}
+            data = get_client(context).list_subnets(**search_opts)
+            ipam_subnets = data.get('subnets', [])
+            if subnets_cache is not None:
+                subnets_cache[subnet_ids] = ipam_subnets
         subnets = []
+        # The subnets of a port, such as its IPv4 and IPv6 subnets, usually
+        # share their network and thus their DHCP ports
+        dhcp_ports_by_network = _get_request_cache(context, 'dhcp_ports')
+        if dhcp_ports_by_network is None:
+            dhcp_ports_by_network = {}
 
         for subnet in ipam_subnets:
-            subnet_dict = {'cidr': subnet['cidr'],
-                           'gateway': network_model.IP(
-                                address=subnet['gateway_ip'],
-                                type='gateway'),
-            }
-
             # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
-
-            subnet_object = network_model.Subnet(**subnet_dict)
-            for dns in subnet.get('dns_nameservers', []):
-                subnet_object.add_dns(
-                    network_model.IP(address=dns, type='dns'))
-
-            for route in subnet.get('host_routes', []):
-                subnet_object.add_route(
-                    network_model.Route(cidr=route['destination'],
-                                        gateway=network_model.IP(
-                                            address=route['nexthop'],
-                                            type='gateway')))
-
-            subnets.append(subnet_object)
+            dhcp_ports = dhcp_ports_by_network.get(subnet['network_id'])
+            if dhcp_ports is None:
+                search_opts = {'network_id': subnet['network_id'],
+                               'device_owner': 'network:dhcp'}
+                data = get_client(context).list_ports(**search_opts)
+                dhcp_ports = data.get('ports', [])
+                dhcp_ports_by_network[subnet['network_id']] = dhcp_ports
+            subnets.append(self._nw_info_build_subnet(subnet, dhcp_ports))
         return subnets
 
+    def _get_prefetched_subnets_from_port(self, port, neutron_data):
+        """Return the subnets for a given port from the subnets and DHCP
+        ports queried in bulk.
+        """
+        subnets = []
+        subnet_ids = []
+        for ip in port['fixed_ips']:
+            subnet = neutron_data['subnets'].get(ip['subnet_id'])
+            if subnet is None or subnet['id'] in subnet_ids:
+                continue
+            subnet_ids.append(subnet['id'])
+            dhcp_ports = neutron_data['dhcp_ports'].get(subnet['network_id'],
+                                                        [])
+            subnets.append(self._nw_info_build_subnet(subnet, dhcp_ports))
+        return subnets
+
+    def _nw_info_build_subnet(self, subnet, dhcp_ports):
+        subnet_dict = {'cidr': subnet['cidr'],
+                       'gateway': network_model.IP(
+                            address=subnet['gateway_ip'],
+                            type='gateway'),
+        }
+
+        for p in dhcp_ports:
+            for ip_pair in p['fixed_ips']:
+                if ip_pair['subnet_id'] == subnet['id']:
+                    subnet_dict['dhcp_server'] = ip_pair['ip_address']
+                    break
+
+        subnet_object = network_model.Subnet(**subnet_dict)
+        for dns in subnet.get('dns_nameservers', []):
+            subnet_object.add_dns(
+                network_model.IP(address=dns, type='dns'))
+
+        for route in subnet.get('host_routes', []):
+            subnet_object.add_route(
+                network_model.Route(cidr=route['destination'],
+                                    gateway=network_model.IP(
+                                        address=route['nexthop'],
+                                        type='gateway')))
+        return subnet_object
+
     def get_dns_domains(self, context):
         """Return a list of available dns domains.
 
@@ -364,7 +364,8 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.12 ComputeNode version 1.12
     # Version 1.13 ComputeNode version 1.13
     # Version 1.14 ComputeNode version 1.14
-    VERSION = '1.14'
+    # Version 1.15 Added get_all_updated_since()
+    VERSION = '1.15'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
@@ -374,7 +375,8 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
                     ('1.3', '1.4'), ('1.4', '1.5'), ('1.5', '1.5'),
                     ('1.6', '1.6'), ('1.7', '1.7'), ('1.8', '1.8'),
                     ('1.9', '1.9'), ('1.10', '1.10'), ('1.11', '1.11'),
-                    ('1.12', '1.12'), ('1.13', '1.13'), ('1.14', '1.14')],
+                    ('1.12', '1.12'), ('1.13', '1.13'), ('1.14', '1.14'),
+                    ('1.15', '1.14')],
         }
 
     @base.remotable_classmethod
@@ -383,6 +385,18 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
 
+    @base.remotable_classmethod
+    def get_all_updated_since(cls, context, since):
+        """Return the nodes created, updated or deleted since a time.
+
+        Soft-deleted nodes are included in the result, so callers keeping a
+        local view of the compute nodes can check ComputeNode.deleted and
+        evict them.
+        """
+        db_computes = db.compute_node_get_all_updated_since(context, since)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
     @base.remotable_classmethod
     def get_by_hypervisor(cls, context, hypervisor_match):
         db_computes = db.compute_node_search_by_hypervisor(context,
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
 
 from oslo_config import cfg
@@ -57,6 +58,21 @@ INSTANCE_OPTIONAL_ATTRS = (_INSTANCE_OPTIONAL_JOINED_FIELDS +
 INSTANCE_DEFAULT_FIELDS = ['metadata', 'system_metadata',
                            'info_cache', 'security_groups']
 
+# Number of times the decoding of an instance_extra field has been deferred,
+# and number of times a deferred field has actually been accessed and
+# decoded, by field name.
+_deferred_extra_counts = collections.Counter()
+_decoded_extra_counts = collections.Counter()
+
+
+def get_deferred_extra_stats():
+    """Return, by instance_extra field, the number of times its decoding has
+    been deferred and the number of times it has then been decoded.
+    """
+    return {field: {'deferred': count,
+                    'decoded': _decoded_extra_counts[field]}
+            for field, count in _deferred_extra_counts.items()}
+
 
 def _expected_cols(expected_attrs):
     """Return expected_attrs that are columns needing joining.
@@ -185,9 +201,18 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
     obj_extra_fields = ['name']
 
     def __init__(self, *args, **kwargs):
+        # Maps the instance_extra fields which have not been decoded yet to
+        # their database value, see _load_or_defer_extra().
+        self._deferred_extra = {}
         super(_BaseInstance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
 
+    def obj_attr_is_set(self, attrname):
+        # NOTE: A deferred field is set as far as the callers are concerned,
+        # it is decoded by obj_load_attr() on first access.
+        return (attrname in self._deferred_extra or
+                super(_BaseInstance, self).obj_attr_is_set(attrname))
+
     def _reset_metadata_tracking(self, fields=None):
         if fields is None or 'system_metadata' in fields:
             self._orig_system_metadata = (dict(self.system_metadata) if
@@ -202,7 +227,16 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
         self._reset_metadata_tracking(fields=fields)
 
     def obj_what_changed(self):
-        changes = super(_BaseInstance, self).obj_what_changed()
+        # NOTE: The base implementation gets every set field to look for
+        # changes in the nested objects, which would decode the deferred
+        # fields. They are unchanged until they are decoded, so they are
+        # hidden from it.
+        deferred_extra = self._deferred_extra
+        self._deferred_extra = {}
+        try:
+            changes = super(_BaseInstance, self).obj_what_changed()
+        finally:
+            self._deferred_extra = deferred_extra
         if 'metadata' in self and self.metadata != self._orig_metadata:
             changes.add('metadata')
         if 'system_metadata' in self and (self.system_metadata !=
@@ -230,7 +264,8 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
                 if key == 'name':
                     # NOTE(danms): prevent recursion
                     continue
-                elif not self.obj_attr_is_set(key):
+                elif (not self.obj_attr_is_set(key) or
+                      key in self._deferred_extra):
                     # NOTE(danms): Don't trigger lazy-loads
                     continue
                 info[key] = self[key]
@@ -297,27 +332,28 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
                     context, instance.uuid))
         if 'numa_topology' in expected_attrs:
             if have_extra:
-                instance._load_numa_topology(
-                    db_inst['extra'].get('numa_topology'))
+                instance._load_or_defer_extra(
+                    'numa_topology', db_inst['extra'].get('numa_topology'))
             else:
                 instance.numa_topology = None
         if 'pci_requests' in expected_attrs:
             if have_extra:
-                instance._load_pci_requests(
-                    db_inst['extra'].get('pci_requests'))
+                instance._load_or_defer_extra(
+                    'pci_requests', db_inst['extra'].get('pci_requests'))
             else:
                 instance.pci_requests = None
         if 'vcpu_model' in expected_attrs:
             if have_extra:
-                instance._load_vcpu_model(
-                    db_inst['extra'].get('vcpu_model'))
+                instance._load_or_defer_extra(
+                    'vcpu_model', db_inst['extra'].get('vcpu_model'))
             else:
                 instance.vcpu_model = None
         if 'ec2_ids' in expected_attrs:
             instance._load_ec2_ids()
         if 'migration_context' in expected_attrs:
             if have_extra:
-                instance._load_migration_context(
+                instance._load_or_defer_extra(
+                    'migration_context',
                     db_inst['extra'].get('migration_context'))
             else:
                 instance.migration_context = None
@@ -337,7 +373,7 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
                                               'old_flavor',
                                               'new_flavor')]):
             if have_extra and db_inst['extra'].get('flavor'):
-                instance._flavor_from_db(db_inst['extra']['flavor'])
+                instance._load_or_defer_flavor(db_inst['extra']['flavor'])
 
         # TODO(danms): If we are updating these on a backlevel instance,
         # we'll end up sending back new versions of these objects (see
@@ -709,6 +745,57 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
                     self[field] = current[field]
         self.obj_reset_changes()
 
+    def _load_or_defer_extra(self, attrname, db_value):
+        """Load an instance_extra field from its database value, or keep the
+        value aside to decode it when the field is first accessed.
+
+        Listing instances loads their instance_extra blobs, which are often
+        not used by the caller. The decoding is only deferred if the field
+        is not already set, so that it is refreshed, and if there is a value
+        to decode, as None may mean that the field must be looked up again.
+        """
+        if db_value is None or hasattr(self, base.get_attrname(attrname)):
+            self._deferred_extra.pop(attrname, None)
+            self._load_extra(attrname, db_value)
+        else:
+            self._deferred_extra[attrname] = db_value
+            _deferred_extra_counts[attrname] += 1
+
+    def _load_or_defer_flavor(self, db_flavor):
+        flavor_fields = ['flavor', 'old_flavor', 'new_flavor']
+        if any(hasattr(self, base.get_attrname(field))
+               for field in flavor_fields):
+            for field in flavor_fields:
+                self._deferred_extra.pop(field, None)
+            self._flavor_from_db(db_flavor)
+        else:
+            for field in flavor_fields:
+                self._deferred_extra[field] = db_flavor
+                _deferred_extra_counts[field] += 1
+
+    def _load_extra(self, attrname, db_value):
+        if attrname == 'numa_topology':
+            self._load_numa_topology(db_value)
+        elif attrname == 'pci_requests':
+            self._load_pci_requests(db_value)
+        elif attrname == 'vcpu_model':
+            self._load_vcpu_model(db_value)
+        elif attrname == 'migration_context':
+            self._load_migration_context(db_value)
+        else:
+            flavor_info = jsonutils.loads(db_value)
+            db_flavor = flavor_info[{'flavor': 'cur',
+                                     'old_flavor': 'old',
+                                     'new_flavor': 'new'}[attrname]]
+            if db_flavor:
+                self[attrname] = objects.Flavor.obj_from_primitive(db_flavor)
+            else:
+                self[attrname] = None
+
+    def _load_deferred_extra(self, attrname):
+        _decoded_extra_counts[attrname] += 1
+        self._load_extra(attrname, self._deferred_extra.pop(attrname))
+
     def _load_generic(self, attrname):
         instance = self.__class__.get_by_uuid(self._context,
                                               uuid=self.uuid,
@@ -830,6 +917,15 @@ class _BaseInstance(base.NovaPersistentObject, base.NovaObject,
             self.migration_context = None
 
     def obj_load_attr(self, attrname):
+        if attrname in self._deferred_extra:
+            # NOTE: This only decodes a value we already have, which does
+            # not need a context.
+            self._load_deferred_extra(attrname)
+            # NOTE: The decoded objects are the ones in the database, so
+            # neither the field nor their own fields are changed.
+            self.obj_reset_changes([attrname], recursive=True)
+            return
+
         if attrname not in INSTANCE_OPTIONAL_ATTRS:
             raise exception.ObjectActionError(
                 action='obj_load_attr',
@@ -127,14 +127,16 @@ class MigrationList(base.ObjectListBase, base.NovaObject):
     #              Migration <= 1.1
     # Version 1.1: Added use_slave to get_unconfirmed_by_dest_compute
     # Version 1.2: Migration version 1.2
-    VERSION = '1.2'
+    # Version 1.3: Added get_in_progress_by_host
+    VERSION = '1.3'
 
     fields = {
         'objects': fields.ListOfObjectsField('Migration'),
         }
     # NOTE(danms): Migration was at 1.1 before we added this
     obj_relationships = {
-        'objects': [('1.0', '1.1'), ('1.1', '1.1'), ('1.2', '1.2')],
+        'objects': [('1.0', '1.1'), ('1.1', '1.1'), ('1.2', '1.2'),
+                    ('1.3', '1.2')],
         }
 
     @base.remotable_classmethod
@@ -152,6 +154,12 @@ class MigrationList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Migration,
                                   db_migrations)
 
+    @base.remotable_classmethod
+    def get_in_progress_by_host(cls, context, host):
+        db_migrations = db.migration_get_in_progress_by_host(context, host)
+        return base.obj_make_list(context, cls(context), objects.Migration,
+                                  db_migrations)
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters):
         db_migrations = db.migration_get_all_by_filters(context, filters)
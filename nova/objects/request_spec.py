@@ -26,7 +26,8 @@ class RequestSpec(base.NovaObject):
     # Version 1.2: SchedulerRetries version 1.1
     # Version 1.3: InstanceGroup version 1.10
     # Version 1.4: ImageMeta version 1.7
-    VERSION = '1.4'
+    # Version 1.5: SchedulerRetries version 1.2
+    VERSION = '1.5'
 
     fields = {
         'id': fields.IntegerField(),
@@ -58,7 +59,7 @@ class RequestSpec(base.NovaObject):
         'numa_topology': [('1.0', '1.2')],
         'flavor': [('1.0', '1.1')],
         'pci_requests': [('1.0', '1.1')],
-        'retry': [('1.0', '1.0'), ('1.2', '1.1')],
+        'retry': [('1.0', '1.0'), ('1.2', '1.1'), ('1.5', '1.2')],
         'limits': [('1.0', '1.0')],
         'instance_group': [('1.0', '1.9'), ('1.3', '1.10')],
     }
@@ -306,7 +307,8 @@ class RequestSpec(base.NovaObject):
 class SchedulerRetries(base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: ComputeNodeList version 1.14
-    VERSION = '1.1'
+    # Version 1.2: ComputeNodeList version 1.15
+    VERSION = '1.2'
 
     fields = {
         'num_attempts': fields.IntegerField(),
@@ -316,7 +318,7 @@ class SchedulerRetries(base.NovaObject):
     }
 
     obj_relationships = {
-        'hosts': [('1.0', '1.13'), ('1.1', '1.14')],
+        'hosts': [('1.0', '1.13'), ('1.1', '1.14'), ('1.2', '1.15')],
     }
 
     @classmethod
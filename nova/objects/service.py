@@ -27,7 +27,7 @@ LOG = logging.getLogger(__name__)
 
 
 # NOTE(danms): This is the global service version counter
-SERVICE_VERSION = 2
+SERVICE_VERSION = 3
 
 
 # NOTE(danms): This is our SERVICE_VERSION history. The idea is that any
@@ -55,6 +55,8 @@ SERVICE_VERSION_HISTORY = (
     {'compute_rpc': '4.4'},
     # Version 2: Changes to rebuild_instance signature in the compute_rpc
     {'compute_rpc': '4.5'},
+    # Version 3: Add prefetch_images to the compute_rpc
+    {'compute_rpc': '4.6'},
 )
 
 
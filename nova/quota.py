@@ -18,6 +18,8 @@
 
 import datetime
 
+from eventlet import event
+from eventlet import greenthread
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
@@ -96,6 +98,14 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.FloatOpt('quota_reserve_coalesce_window',
+                 default=0,
+                 help='Number of seconds during which the concurrent '
+                      'reservations of a project and user are collected '
+                      'before being checked and reserved in a single '
+                      'database transaction. With 0, only the calls made '
+                      'while the first one yields are coalesced. Only used '
+                      'by nova.quota.CoalescingDbQuotaDriver.'),
     ]
 
 CONF = cfg.CONF
@@ -577,8 +587,14 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
-        return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
+        return self._reserve(context, resources, quotas, user_quotas, deltas,
+                             expire, project_id, user_id)
+
+    def _reserve(self, context, resources, project_quotas, user_quotas,
+                 deltas, expire, project_id, user_id):
+        """Check the quotas and reserve the deltas in the database."""
+        return db.quota_reserve(context, resources, project_quotas,
+                                user_quotas, deltas, expire,
                                 CONF.until_refresh, CONF.max_age,
                                 project_id=project_id, user_id=user_id)
 
@@ -690,6 +706,96 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+# Sent to the calls waiting for a batch which could not be reserved, so
+# that they reserve on their own
+_RESERVE_ALONE = object()
+
+
+class CoalescingDbQuotaDriver(DbQuotaDriver):
+    """Database quota driver coalescing the concurrent reservations made by
+    the greenthreads of this process for the same project and user.
+
+    The first reserve() call for a project and user waits for
+    quota_reserve_coalesce_window seconds for other calls to join it, then
+    all of them are checked and reserved in a single transaction, in their
+    arrival order, locking the quota usages of the project only once. Each
+    call gets its own reservations or OverQuota exception, exactly as if
+    the reservations had been made one after the other.
+
+    The calls are only coalesced with the calls made with an equivalent
+    context, as the batch is reserved with the context of its first call.
+    If that call is interrupted before reserving the batch, the other calls
+    reserve on their own.
+    """
+
+    def __init__(self):
+        # Maps (project_id, user_id) and the context of the calls to the
+        # list of (request, event) tuples waiting for the next flush.
+        self._pending = {}
+
+    def _reserve(self, context, resources, project_quotas, user_quotas,
+                 deltas, expire, project_id, user_id):
+        # NOTE: The whole batch is reserved with the context of its first
+        # call, so only the calls made with equivalent contexts are
+        # coalesced.
+        key = (project_id, user_id, context.project_id, context.user_id,
+               context.is_admin, context.read_deleted)
+        request = {'project_quotas': project_quotas,
+                   'user_quotas': user_quotas,
+                   'deltas': deltas,
+                   'expire': expire}
+        batch = self._pending.get(key)
+        if batch is not None:
+            # Another greenthread is collecting the reservations of this
+            # project and user, it will send us our result.
+            done = event.Event()
+            batch.append((request, done))
+            result = done.wait()
+            if result is _RESERVE_ALONE:
+                # The greenthread collecting the batch was interrupted
+                # before reserving it.
+                return super(CoalescingDbQuotaDriver, self)._reserve(
+                    context, resources, project_quotas, user_quotas, deltas,
+                    expire, project_id, user_id)
+        else:
+            batch = self._pending[key] = [(request, None)]
+            results = None
+            try:
+                greenthread.sleep(CONF.quota_reserve_coalesce_window)
+                del self._pending[key]
+                results = self._flush(context, resources, batch, project_id,
+                                      user_id)
+            finally:
+                # Whatever interrupted us, no call may keep waiting for its
+                # result.
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+                for i, (_request, done) in enumerate(batch[1:], 1):
+                    if not done.ready():
+                        done.send(results[i] if results is not None
+                                  else _RESERVE_ALONE)
+            result = results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _flush(self, context, resources, batch, project_id, user_id):
+        """Reserve a batch of requests and return the list of their
+        results, reservations or exceptions, in the order of the batch.
+        """
+        LOG.debug('Reserving %(count)d coalesced requests for project '
+                  '%(project_id)s and user %(user_id)s',
+                  {'count': len(batch), 'project_id': project_id,
+                   'user_id': user_id})
+        try:
+            return db.quota_reserve_multi(
+                context, resources, [request for request, _done in batch],
+                CONF.until_refresh, CONF.max_age, project_id=project_id,
+                user_id=user_id)
+        except Exception as exc:
+            return [exc] * len(batch)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
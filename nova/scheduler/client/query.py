@@ -74,9 +74,10 @@ class SchedulerQueryClient(object):
 
     def sync_instance_info(self, context, host_name, instance_uuids):
         """Notifies the HostManager of the current instances on a host by
-        sending a list of the uuids for those instances. The HostManager can
-        then compare that with its in-memory view of the instances to detect
-        when they are out of sync.
+        sending a digest of the uuids for those instances (or the uuids
+        themselves to older schedulers). The HostManager can then compare that
+        with its in-memory view of the instances to detect when they are out
+        of sync.
 
         :param context: local context
         :param host_name: name of host sending the update
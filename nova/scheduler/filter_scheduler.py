@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo_config import cfg
@@ -46,7 +47,17 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_incremental_multi_instance',
+                default=False,
+                help='When scheduling several instances in one request, '
+                     'filter and weigh all the hosts only once and then only '
+                     'filter and weigh again the host chosen for the '
+                     'previous instance, instead of all the hosts for each '
+                     'instance. Only enable this if all the weighers in use '
+                     'weigh each host independently of the other hosts. '
+                     'Requests updating the hosts of a server group are '
+                     'always scheduled one instance at a time.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -141,6 +152,12 @@ class FilterScheduler(driver.Scheduler):
 
         selected_hosts = []
         num_instances = request_spec.get('num_instances', 1)
+        if (CONF.scheduler_incremental_multi_instance and num_instances > 1
+                and not update_group_hosts):
+            return self._schedule_incrementally(hosts, filter_properties,
+                                                instance_properties,
+                                                num_instances)
+
         for num in range(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -156,11 +173,8 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
+            scheduler_host_subset_size = self._get_subset_size(
+                len(weighed_hosts))
 
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
@@ -180,6 +194,79 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    def _get_subset_size(self, num_hosts):
+        scheduler_host_subset_size = CONF.scheduler_host_subset_size
+        if scheduler_host_subset_size > num_hosts:
+            scheduler_host_subset_size = num_hosts
+        if scheduler_host_subset_size < 1:
+            scheduler_host_subset_size = 1
+        return scheduler_host_subset_size
+
+    def _schedule_incrementally(self, hosts, filter_properties,
+                                instance_properties, num_instances):
+        """Returns a list of hosts for num_instances instances, filtering and
+        weighing all the hosts only once.
+
+        Only the chosen host has its resources consumed for each instance, so
+        it is the only host which needs to be filtered and weighed again
+        before selecting the host of the next instance. The weighed hosts are
+        kept in a heap ordered by weight, then by their position in the list
+        of filtered hosts, which gives the same order as sorting them.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                filter_properties)
+        # Remember the position of each host for breaking ties
+        positions = {id(host): pos for pos, host in enumerate(hosts)}
+
+        def _build_heap(weighed_hosts):
+            heap = [(-weighed.weight, positions[id(weighed.obj)], weighed)
+                    for weighed in weighed_hosts]
+            heapq.heapify(heap)
+            return heap
+
+        heap = _build_heap(weighed_hosts)
+        selected_hosts = []
+        for num in range(num_instances):
+            if not heap:
+                # Can't get any more locally.
+                break
+
+            subset = [heapq.heappop(heap)
+                      for _i in range(self._get_subset_size(len(heap)))]
+            chosen = random.choice(subset)
+            for entry in subset:
+                if entry is not chosen:
+                    heapq.heappush(heap, entry)
+            chosen_host = chosen[2]
+            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources of the chosen host and check whether
+            # it can still be used for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            if num == num_instances - 1:
+                break
+            if not self.host_manager.get_filtered_hosts([chosen_host.obj],
+                    filter_properties, index=num + 1):
+                continue
+            weighed = self.host_manager.get_weighed_host(chosen_host.obj,
+                                                         filter_properties)
+            if weighed is None:
+                # The range of a weigher changed, so the weights of all the
+                # remaining hosts need to be normalized again.
+                remaining = [entry[2].obj for entry in heap]
+                remaining.append(chosen_host.obj)
+                remaining.sort(key=lambda host: positions[id(host)])
+                heap = _build_heap(self.host_manager.get_weighed_hosts(
+                    remaining, filter_properties))
+            else:
+                heapq.heappush(heap, (-weighed.weight, chosen[1], weighed))
+        return selected_hosts
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
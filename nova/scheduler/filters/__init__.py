@@ -18,14 +18,117 @@ Scheduler host filters
 """
 
 from nova import filters
+from nova.scheduler.filters import utils
 
 
 class BaseHostFilter(filters.BaseFilter):
     """Base class for host filters."""
+
+    # Dict of host_passes() results keyed by (request key, host key), only
+    # set when enable_result_cache() has been called
+    _result_cache = None
+    _result_cache_size = 0
+    # Set by enable_array_filtering()
+    _array_filtering = False
+
     def _filter_one(self, obj, filter_properties):
         """Return True if the object passes the filter, otherwise False."""
         return self.host_passes(obj, filter_properties)
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts that pass the filter.
+
+        When array filtering is enabled, NumPy is available and the filter
+        supports it for the request, the hosts are filtered at once by
+        filter_all_array().
+
+        When the result cache is enabled and the filter provides cache keys
+        for the request, the results of host_passes() are reused for all the
+        hosts (and later requests) sharing the same keys.
+        """
+        if self._array_filtering:
+            filter_obj_list = list(filter_obj_list)
+            host_states = self._filter_all_array(filter_obj_list,
+                                                 filter_properties)
+            if host_states is not None:
+                return host_states
+        request_key = None
+        if self._result_cache is not None:
+            request_key = self.get_request_cache_key(filter_properties)
+        if request_key is None:
+            return super(BaseHostFilter, self).filter_all(filter_obj_list,
+                                                          filter_properties)
+        return self._filter_all_cached(filter_obj_list, filter_properties,
+                                       request_key)
+
+    def _filter_all_cached(self, filter_obj_list, filter_properties,
+                           request_key):
+        cache = self._result_cache
+        for host_state in filter_obj_list:
+            host_key = self.get_host_cache_key(host_state)
+            if host_key is None:
+                passes = self.host_passes(host_state, filter_properties)
+            else:
+                key = (request_key, host_key)
+                passes = cache.get(key)
+                if passes is None:
+                    passes = self.host_passes(host_state, filter_properties)
+                    if len(cache) >= self._result_cache_size:
+                        cache.clear()
+                    cache[key] = passes
+            if passes:
+                yield host_state
+
+    def _filter_all_array(self, host_states, filter_properties):
+        if not self._array_filtering or utils.numpy is None:
+            return None
+        return self.filter_all_array(host_states, filter_properties)
+
+    def filter_all_array(self, host_states, filter_properties):
+        """Return the list of the host_states which pass the filter, or None
+        if the filter can't evaluate them at once for the request.
+
+        Override this in a subclass whose host_passes() only compares the
+        numeric attributes of the hosts with the request, using NumPy arrays
+        of these attributes (see utils.host_state_array()) instead of
+        calling host_passes() for each host. It is only called when NumPy is
+        available.
+        """
+        return None
+
+    def enable_array_filtering(self):
+        """Evaluate the filter with filter_all_array() when possible."""
+        self._array_filtering = True
+
+    def supports_array_filtering(self):
+        """Return whether the filter overrides filter_all_array()."""
+        return utils.overrides_any(self, BaseHostFilter, ['filter_all_array'])
+
+    def get_request_cache_key(self, filter_properties):
+        """Return a hashable key identifying the request inputs the filter
+        depends on, or None if the results can't be cached for the request.
+
+        Override this, along with get_host_cache_key(), in a subclass whose
+        host_passes() result only depends on the inputs identified by both
+        keys and which has no side effect.
+        """
+        return None
+
+    def get_host_cache_key(self, host_state):
+        """Return a hashable key identifying the HostState inputs the filter
+        depends on, or None if the result can't be cached for the host.
+        """
+        return None
+
+    def enable_result_cache(self, size):
+        """Memoize up to size results of host_passes(), see filter_all()."""
+        self._result_cache = {}
+        self._result_cache_size = size
+
+    def clear_result_cache(self):
+        if self._result_cache:
+            self._result_cache.clear()
+
     def host_passes(self, host_state, filter_properties):
         """Return True if the HostState passes the filter, otherwise False.
         Override this in a subclass.
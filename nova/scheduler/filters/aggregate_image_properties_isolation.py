@@ -40,6 +40,14 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def get_request_cache_key(self, filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        image_props = spec.get('image', {}).get('properties', {})
+        return utils.make_hashable(image_props)
+
+    def get_host_cache_key(self, host_state):
+        return utils.aggregates_cache_key(host_state)
+
     def host_passes(self, host_state, filter_properties):
         """Checks a host in an aggregate that metadata key/value match
         with image properties.
@@ -33,6 +33,15 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    def get_request_cache_key(self, filter_properties):
+        instance_type = filter_properties.get('instance_type')
+        if 'extra_specs' not in instance_type:
+            return None
+        return utils.make_hashable(instance_type['extra_specs'])
+
+    def get_host_cache_key(self, host_state):
+        return utils.aggregates_cache_key(host_state)
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
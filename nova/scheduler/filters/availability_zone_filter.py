@@ -36,6 +36,15 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
     # Availability zones do not change within a request
     run_filter_once_per_request = True
 
+    def get_request_cache_key(self, filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        props = spec.get('instance_properties', {})
+        # No need to cache anything when no availability zone is requested
+        return props.get('availability_zone') or None
+
+    def get_host_cache_key(self, host_state):
+        return utils.aggregates_cache_key(host_state)
+
     def host_passes(self, host_state, filter_properties):
         spec = filter_properties.get('request_spec', {})
         props = spec.get('instance_properties', {})
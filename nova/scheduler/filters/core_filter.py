@@ -79,6 +79,33 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return host_state.cpu_allocation_ratio
 
+    def filter_all_array(self, host_states, filter_properties):
+        """Return the hosts with sufficient CPU cores, unless a subclass
+        overrides how they are checked.
+        """
+        if utils.overrides_any(self, CoreFilter,
+                               ['host_passes', '_get_cpu_allocation_ratio']):
+            return None
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return host_states
+
+        instance_vcpus = instance_type['vcpus']
+        host_vcpus = utils.host_state_array(host_states, 'vcpus_total')
+        # Fail safe
+        unknown = host_vcpus == 0
+        if unknown.any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+        vcpus_total = host_vcpus * utils.host_state_array(
+            host_states, 'cpu_allocation_ratio')
+        has_limit = ~unknown & (vcpus_total > 0)
+        free_vcpus = vcpus_total - utils.host_state_array(host_states,
+                                                          'vcpus_used')
+        passes = unknown | (~(has_limit & (instance_vcpus > host_vcpus)) &
+                            (free_vcpus >= instance_vcpus))
+        limits = utils.numpy.where(has_limit, vcpus_total, utils.numpy.nan)
+        return utils.array_survivors(host_states, passes, 'vcpu', limits)
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -35,19 +35,17 @@ class DiskFilter(filters.BaseHostFilter):
     def _get_disk_allocation_ratio(self, host_state, filter_properties):
         return CONF.disk_allocation_ratio
 
-    def host_passes(self, host_state, filter_properties):
-        """Filter based on disk usage."""
+    @staticmethod
+    def _get_requested_disk(filter_properties):
         instance_type = filter_properties.get('instance_type')
-        requested_disk = (1024 * (instance_type['root_gb'] +
-                                 instance_type['ephemeral_gb']) +
-                         instance_type['swap'])
+        return (1024 * (instance_type['root_gb'] +
+                        instance_type['ephemeral_gb']) +
+                instance_type['swap'])
 
+    def _disk_passes(self, host_state, requested_disk, disk_allocation_ratio):
         free_disk_mb = host_state.free_disk_mb
         total_usable_disk_mb = host_state.total_usable_disk_gb * 1024
 
-        disk_allocation_ratio = self._get_disk_allocation_ratio(
-            host_state, filter_properties)
-
         disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
         used_disk_mb = total_usable_disk_mb - free_disk_mb
         usable_disk_mb = disk_mb_limit - used_disk_mb
@@ -64,6 +62,53 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def host_passes(self, host_state, filter_properties):
+        """Filter based on disk usage."""
+        requested_disk = self._get_requested_disk(filter_properties)
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            host_state, filter_properties)
+        return self._disk_passes(host_state, requested_disk,
+                                 disk_allocation_ratio)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with enough usable disk.
+
+        Neither the requested disk nor the allocation ratio depend on the
+        host, so they are only looked up once for all the hosts, unless a
+        subclass overrides how they are checked or the hosts are filtered
+        by filter_all_array().
+        """
+        if (utils.overrides_any(self, DiskFilter,
+                                ['host_passes', '_get_disk_allocation_ratio'])
+                or (self._array_filtering and utils.numpy is not None)):
+            return super(DiskFilter, self).filter_all(filter_obj_list,
+                                                      filter_properties)
+        requested_disk = self._get_requested_disk(filter_properties)
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            None, filter_properties)
+        return (host_state for host_state in filter_obj_list
+                if self._disk_passes(host_state, requested_disk,
+                                     disk_allocation_ratio))
+
+    def filter_all_array(self, host_states, filter_properties):
+        """Return the hosts with enough usable disk, unless a subclass
+        overrides how they are checked.
+        """
+        if utils.overrides_any(self, DiskFilter,
+                               ['host_passes', '_get_disk_allocation_ratio']):
+            return None
+        requested_disk = self._get_requested_disk(filter_properties)
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            None, filter_properties)
+        total_usable_disk_mb = utils.host_state_array(
+            host_states, 'total_usable_disk_gb') * 1024
+        free_disk_mb = utils.host_state_array(host_states, 'free_disk_mb')
+        disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
+        usable_disk_mb = disk_mb_limit - (total_usable_disk_mb - free_disk_mb)
+        return utils.array_survivors(host_states,
+                                     usable_disk_mb >= requested_disk,
+                                     'disk_gb', disk_mb_limit / 1024)
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -22,6 +22,7 @@ from nova.compute import arch
 from nova.compute import hv_type
 from nova.compute import vm_mode
 from nova.scheduler import filters
+from nova.scheduler.filters import utils as filters_utils
 from nova import utils
 
 
@@ -41,6 +42,15 @@ class ImagePropertiesFilter(filters.BaseHostFilter):
     # a request
     run_filter_once_per_request = True
 
+    def get_request_cache_key(self, filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        image_props = spec.get('image', {}).get('properties', {})
+        return filters_utils.make_hashable(image_props)
+
+    def get_host_cache_key(self, host_state):
+        return (filters_utils.make_hashable(host_state.supported_instances),
+                host_state.hypervisor_version)
+
     def _instance_supported(self, host_state, image_props,
                             hypervisor_version):
         img_arch = image_props.get('architecture', None)
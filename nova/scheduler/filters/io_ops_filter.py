@@ -39,14 +39,8 @@ class IoOpsFilter(filters.BaseHostFilter):
     def _get_max_io_ops_per_host(self, host_state, filter_properties):
         return CONF.max_io_ops_per_host
 
-    def host_passes(self, host_state, filter_properties):
-        """Use information about current vm and task states collected from
-        compute node statistics to decide whether to filter.
-        """
-        num_io_ops = host_state.num_io_ops
-        max_io_ops = self._get_max_io_ops_per_host(
-            host_state, filter_properties)
-        passes = num_io_ops < max_io_ops
+    def _io_ops_passes(self, host_state, max_io_ops):
+        passes = host_state.num_io_ops < max_io_ops
         if not passes:
             LOG.debug("%(host_state)s fails I/O ops check: Max IOs per host "
                         "is set to %(max_io_ops)s",
@@ -54,6 +48,41 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def host_passes(self, host_state, filter_properties):
+        """Use information about current vm and task states collected from
+        compute node statistics to decide whether to filter.
+        """
+        max_io_ops = self._get_max_io_ops_per_host(
+            host_state, filter_properties)
+        return self._io_ops_passes(host_state, max_io_ops)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts below the maximum number of I/O operations.
+
+        The maximum does not depend on the host, so it is only looked up once
+        for all the hosts, unless a subclass overrides how it is checked or
+        the hosts are filtered by filter_all_array().
+        """
+        if (utils.overrides_any(self, IoOpsFilter,
+                                ['host_passes', '_get_max_io_ops_per_host'])
+                or (self._array_filtering and utils.numpy is not None)):
+            return super(IoOpsFilter, self).filter_all(filter_obj_list,
+                                                       filter_properties)
+        max_io_ops = self._get_max_io_ops_per_host(None, filter_properties)
+        return (host_state for host_state in filter_obj_list
+                if self._io_ops_passes(host_state, max_io_ops))
+
+    def filter_all_array(self, host_states, filter_properties):
+        """Return the hosts below the maximum number of I/O operations,
+        unless a subclass overrides how they are checked.
+        """
+        if utils.overrides_any(self, IoOpsFilter,
+                               ['host_passes', '_get_max_io_ops_per_host']):
+            return None
+        max_io_ops = self._get_max_io_ops_per_host(None, filter_properties)
+        num_io_ops = utils.host_state_array(host_states, 'num_io_ops')
+        return utils.array_survivors(host_states, num_io_ops < max_io_ops)
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
@@ -71,6 +71,25 @@ class RamFilter(BaseRamFilter):
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         return host_state.ram_allocation_ratio
 
+    def filter_all_array(self, host_states, filter_properties):
+        """Return the hosts with enough usable RAM, unless a subclass
+        overrides how they are checked.
+        """
+        if utils.overrides_any(self, RamFilter,
+                               ['host_passes', '_get_ram_allocation_ratio']):
+            return None
+        requested_ram = filter_properties.get('instance_type')['memory_mb']
+        total_usable_ram_mb = utils.host_state_array(host_states,
+                                                     'total_usable_ram_mb')
+        free_ram_mb = utils.host_state_array(host_states, 'free_ram_mb')
+        memory_mb_limit = total_usable_ram_mb * utils.host_state_array(
+            host_states, 'ram_allocation_ratio')
+        usable_ram = memory_mb_limit - (total_usable_ram_mb - free_ram_mb)
+        passes = ((total_usable_ram_mb >= requested_ram) &
+                  (usable_ram >= requested_ram))
+        return utils.array_survivors(host_states, passes, 'memory_mb',
+                                     memory_mb_limit)
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
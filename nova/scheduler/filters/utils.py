@@ -21,6 +21,11 @@ import six
 
 from nova.i18n import _LI
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 LOG = logging.getLogger(__name__)
 
 
@@ -46,6 +51,25 @@ def aggregate_metadata_get_by_host(host_state, key=None):
     return metadata
 
 
+def aggregates_cache_key(host_state):
+    """Returns a hashable key identifying the aggregates of a host, for the
+    filters only depending on the aggregate metadata of the hosts.
+    """
+    return frozenset(aggr.id for aggr in host_state.aggregates)
+
+
+def make_hashable(value):
+    """Returns a hashable copy of a value made of dicts, lists and sets."""
+    if isinstance(value, dict):
+        return frozenset((k, make_hashable(v))
+                         for k, v in six.iteritems(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(make_hashable(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(make_hashable(v) for v in value)
+    return value
+
+
 def validate_num_values(vals, default=None, cast_to=int, based_on=min):
     """Returns a correctly casted value based on a set of values.
 
@@ -67,6 +91,35 @@ def validate_num_values(vals, default=None, cast_to=int, based_on=min):
     return based_on([cast_to(val) for val in vals])
 
 
+def overrides_any(obj, base_class, names):
+    """Returns whether the class of obj overrides any of the methods of
+    base_class named.
+    """
+    return any(six.get_unbound_function(getattr(type(obj), name)) is not
+               six.get_unbound_function(getattr(base_class, name))
+               for name in names)
+
+
+def host_state_array(host_states, key_name):
+    """Returns a NumPy array of the values of an attribute of host_states."""
+    return numpy.array([getattr(host_state, key_name)
+                        for host_state in host_states], dtype=float)
+
+
+def array_survivors(host_states, passes, limit_key=None, limits=None):
+    """Returns the host_states whose value in the passes boolean array is
+    True. If limit_key is set, the limit of each of these hosts is set to
+    its value in the limits array, unless it is NaN.
+    """
+    survivors = []
+    for index in numpy.flatnonzero(passes):
+        host_state = host_states[index]
+        if limit_key is not None and not numpy.isnan(limits[index]):
+            host_state.limits[limit_key] = float(limits[index])
+        survivors.append(host_state)
+    return survivors
+
+
 def instance_uuids_overlap(host_state, uuids):
     """Tests for overlap between a host_state and a list of uuids.
 
@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import functools
 import time
 try:
@@ -70,6 +71,36 @@ host_manager_opts = [
                default=True,
                help='Determines if the Scheduler tracks changes to instances '
                     'to help with its filtering decisions.'),
+    cfg.IntOpt('scheduler_host_state_full_sync_interval',
+               default=0,
+               help='Number of seconds between two full reloads of the '
+                    'compute nodes by the scheduler. In between, only the '
+                    'compute nodes which were created, updated or deleted '
+                    'since the previous request are loaded from the '
+                    'database. Set to 0 to reload all the compute nodes '
+                    'on every request.'),
+    cfg.IntOpt('scheduler_filter_cache_size',
+               default=0,
+               help='Maximum number of results memoized by each of the '
+                    'filters which only depend on the aggregates, flavor '
+                    'or image of a request (for example '
+                    'AggregateInstanceExtraSpecsFilter or '
+                    'ImagePropertiesFilter), so that they are evaluated '
+                    'once for all the hosts sharing the same aggregates '
+                    'and reused by the following requests. The results '
+                    'are discarded whenever an aggregate changes. Set to 0 '
+                    'to evaluate the filters for every host on every '
+                    'request.'),
+    cfg.BoolOpt('scheduler_use_array_filters',
+                default=False,
+                help='Evaluate the RamFilter, CoreFilter, DiskFilter and '
+                     'IoOpsFilter filters, and the RAMWeigher and '
+                     'IoOpsWeigher weighers, on NumPy arrays of the host '
+                     'resources instead of host by host. These filters run '
+                     'before the other filters, so that the other filters '
+                     'only run on the hosts which passed them. NumPy is '
+                     'optional: when it is not installed, the filters and '
+                     'weighers are evaluated host by host.'),
 ]
 
 CONF = cfg.CONF
@@ -77,6 +108,13 @@ CONF.register_opts(host_manager_opts)
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# Number of hosts whose instances are loaded by each query when the scheduler
+# builds its initial view of the instances
+INSTANCE_INFO_BATCH_SIZE = 100
+# NOTE: Compute node records are written with the clock of the
+# conductor and may be committed a little after their updated_at value, so
+# incremental syncs look back a bit further than the previous sync.
+HOST_STATE_SYNC_OVERLAP = datetime.timedelta(seconds=5)
 
 
 class ReadOnlyDict(IterableUserDict):
@@ -317,6 +355,8 @@ class HostManager(object):
         self.filter_obj_map = {}
         self.default_filters = self._choose_host_filters(self._load_filters())
         self.weight_handler = weights.HostWeightHandler()
+        if CONF.scheduler_use_array_filters:
+            self.weight_handler.enable_array_weighing()
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
@@ -331,6 +371,11 @@ class HostManager(object):
         self._instance_info = {}
         if self.tracks_instance_changes:
             self._init_instance_info()
+        # Dict of ComputeNode objects keyed by (host, node), used when only
+        # the compute nodes changed since the last sync are loaded
+        self._compute_nodes = {}
+        self._last_full_sync = None
+        self._last_sync = None
 
     def _load_filters(self):
         return CONF.scheduler_default_filters
@@ -350,6 +395,7 @@ class HostManager(object):
                 self._update_aggregate(agg)
         else:
             self._update_aggregate(aggregates)
+        self._clear_filter_result_caches()
 
     def _update_aggregate(self, aggregate):
         self.aggs_by_id[aggregate.id] = aggregate
@@ -370,6 +416,13 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self._clear_filter_result_caches()
+
+    def _clear_filter_result_caches(self):
+        # The memoized filter results are keyed by aggregate IDs, not by
+        # aggregate metadata
+        for filter_obj in self.filter_obj_map.values():
+            filter_obj.clear_result_cache()
 
     def _init_instance_info(self):
         """Creates the initial view of instances for all hosts.
@@ -386,22 +439,19 @@ class HostManager(object):
             self._instance_info = {}
             compute_nodes = objects.ComputeNodeList.get_all(context).objects
             LOG.debug("Total number of compute nodes: %s", len(compute_nodes))
-            # Break the queries into batches of 10 to reduce the total number
-            # of calls to the DB.
-            batch_size = 10
-            start_node = 0
-            end_node = batch_size
-            while start_node <= len(compute_nodes):
-                curr_nodes = compute_nodes[start_node:end_node]
-                start_node += batch_size
-                end_node += batch_size
-                filters = {"host": [curr_node.host
-                                    for curr_node in curr_nodes]}
+            # A host can have many nodes (e.g. Ironic), only query it once
+            host_names = sorted(set(node.host for node in compute_nodes))
+            # Break the queries into batches of hosts to reduce the total
+            # number of calls to the DB.
+            batch_size = INSTANCE_INFO_BATCH_SIZE
+            for start_host in range(0, len(host_names), batch_size):
+                end_host = start_host + batch_size
+                filters = {"host": host_names[start_host:end_host]}
                 result = objects.InstanceList.get_by_filters(context,
                                                              filters)
                 instances = result.objects
                 LOG.debug("Adding %s instances for hosts %s-%s",
-                          len(instances), start_node, end_node)
+                          len(instances), start_host, end_host)
                 for instance in instances:
                     host = instance.host
                     if host not in self._instance_info:
@@ -433,11 +483,22 @@ class HostManager(object):
                     bad_filters.append(filter_name)
                     continue
                 filter_cls = self.filter_cls_map[filter_name]
-                self.filter_obj_map[filter_name] = filter_cls()
+                filter_obj = filter_cls()
+                if CONF.scheduler_filter_cache_size > 0:
+                    filter_obj.enable_result_cache(
+                        CONF.scheduler_filter_cache_size)
+                if CONF.scheduler_use_array_filters:
+                    filter_obj.enable_array_filtering()
+                self.filter_obj_map[filter_name] = filter_obj
             good_filters.append(self.filter_obj_map[filter_name])
         if bad_filters:
             msg = ", ".join(bad_filters)
             raise exception.SchedulerHostFilterNotFound(filter_name=msg)
+        if CONF.scheduler_use_array_filters:
+            # NOTE: the sort is stable, the filters keep their order
+            # otherwise.
+            good_filters.sort(
+                key=lambda f: not f.supports_array_filtering())
         return good_filters
 
     def get_filtered_hosts(self, hosts, filter_properties,
@@ -521,6 +582,54 @@ class HostManager(object):
         return self.weight_handler.get_weighed_objects(self.weighers,
                 hosts, weight_properties)
 
+    def get_weighed_host(self, host, weight_properties):
+        """Weigh a single host against the hosts weighed before it.
+
+        Returns None if the weights of all the hosts need to be computed
+        again.
+        """
+        return self.weight_handler.get_weighed_object(self.weighers,
+                host, weight_properties)
+
+    def _get_compute_nodes(self, context):
+        """Returns the ComputeNode objects to use for the current request
+        along with the set of (host, node) keys which have been refreshed
+        from the database since the previous call.
+
+        When scheduler_host_state_full_sync_interval is set, only the compute
+        nodes created, updated or deleted since the last sync are loaded from
+        the database, the others being served from the local cache until the
+        next full sync.
+        """
+        interval = CONF.scheduler_host_state_full_sync_interval
+        now = timeutils.utcnow()
+        if (interval <= 0 or self._last_full_sync is None or
+                timeutils.is_older_than(self._last_full_sync, interval)):
+            compute_nodes = objects.ComputeNodeList.get_all(context)
+            self._compute_nodes = {(cn.host, cn.hypervisor_hostname): cn
+                                   for cn in compute_nodes}
+            if interval > 0:
+                self._last_full_sync = now
+                self._last_sync = now
+            return list(self._compute_nodes.values()), None
+
+        since = self._last_sync - HOST_STATE_SYNC_OVERLAP
+        changed = objects.ComputeNodeList.get_all_updated_since(context, since)
+        self._last_sync = now
+        changed_keys = set()
+        for compute in changed:
+            state_key = (compute.host, compute.hypervisor_hostname)
+            if compute.deleted:
+                self._compute_nodes.pop(state_key, None)
+            else:
+                self._compute_nodes[state_key] = compute
+                changed_keys.add(state_key)
+        LOG.debug("Loaded %(changed)d changed compute nodes out of %(total)d "
+                  "since %(since)s",
+                  {'changed': len(changed_keys),
+                   'total': len(self._compute_nodes), 'since': since})
+        return list(self._compute_nodes.values()), changed_keys
+
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
@@ -531,7 +640,7 @@ class HostManager(object):
                         for service in objects.ServiceList.get_by_binary(
                             context, 'nova-compute')}
         # Get resource usage across the available compute nodes:
-        compute_nodes = objects.ComputeNodeList.get_all(context)
+        compute_nodes, changed_keys = self._get_compute_nodes(context)
         seen_nodes = set()
         for compute in compute_nodes:
             service = service_refs.get(compute.host)
@@ -546,7 +655,12 @@ class HostManager(object):
             state_key = (host, node)
             host_state = self.host_state_map.get(state_key)
             if host_state:
-                host_state.update_from_compute_node(compute)
+                # NOTE: A HostState whose updated time was reset
+                # after a failed schedule needs to be refreshed even if its
+                # compute node record did not change.
+                if (changed_keys is None or state_key in changed_keys or
+                        host_state.updated is None):
+                    host_state.update_from_compute_node(compute)
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
@@ -648,19 +762,24 @@ class HostManager(object):
                          "Re-created its InstanceList."), host_name)
 
     @utils.synchronized(HOST_INSTANCE_SEMAPHORE)
-    def sync_instance_info(self, context, host_name, instance_uuids):
+    def sync_instance_info(self, context, host_name, instance_uuids,
+                           instance_digest=None):
         """Receives the uuids of the instances on a host.
 
-        This method is periodically called by the compute nodes, which send a
-        list of all the UUID values for the instances on that node. This is
-        used by the scheduler's HostManager to detect when its view of the
-        compute node's instances is out of sync.
+        This method is periodically called by the compute nodes, which send
+        either a list of all the UUID values for the instances on that node or
+        a digest of them (see nova.utils.get_uuids_digest()). This is used by
+        the scheduler's HostManager to detect when its view of the compute
+        node's instances is out of sync.
         """
         host_info = self._instance_info.get(host_name)
         if host_info:
-            local_set = set(host_info["instances"].keys())
-            compute_set = set(instance_uuids)
-            if not local_set == compute_set:
+            if instance_digest is not None:
+                in_sync = instance_digest == utils.get_uuids_digest(
+                    host_info["instances"])
+            else:
+                in_sync = set(host_info["instances"]) == set(instance_uuids)
+            if not in_sync:
                 self._recreate_instance_info(context, host_name)
                 LOG.info(_LI("The instance sync for host '%s' did not match. "
                              "Re-created its InstanceList."), host_name)
@@ -54,7 +54,7 @@ QUOTAS = quota.QUOTAS
 class SchedulerManager(manager.Manager):
     """Chooses a host to run instances on."""
 
-    target = messaging.Target(version='4.2')
+    target = messaging.Target(version='4.3')
 
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         if not scheduler_driver:
@@ -117,9 +117,13 @@ class SchedulerManager(manager.Manager):
         self.driver.host_manager.delete_instance_info(context, host_name,
                                                       instance_uuid)
 
-    def sync_instance_info(self, context, host_name, instance_uuids):
+    def sync_instance_info(self, context, host_name, instance_uuids=None,
+                           instance_digest=None):
         """Receives a sync request from a host, and passes it on to the
         driver's HostManager.
         """
-        self.driver.host_manager.sync_instance_info(context, host_name,
-                                                    instance_uuids)
+        # NOTE: Compute nodes send a digest of their instance UUIDs since
+        # 4.3, older ones send the UUIDs themselves.
+        self.driver.host_manager.sync_instance_info(
+            context, host_name, instance_uuids,
+            instance_digest=instance_digest)
@@ -21,6 +21,7 @@ import oslo_messaging as messaging
 
 from nova.objects import base as objects_base
 from nova import rpc
+from nova import utils
 
 rpcapi_opts = [
     cfg.StrOpt('scheduler_topic',
@@ -95,6 +96,9 @@ class SchedulerAPI(object):
         methods in 4.x after that point should be done such that they can
         handle the version_cap being set to 4.2.
 
+        * 4.3 - Changed sync_instance_info() to send a digest of the instance
+                UUIDs instead of the UUIDs
+
     '''
 
     VERSION_ALIASES = {
@@ -140,6 +144,13 @@ class SchedulerAPI(object):
                           instance_uuid=instance_uuid)
 
     def sync_instance_info(self, ctxt, host_name, instance_uuids):
-        cctxt = self.client.prepare(version='4.2', fanout=True)
-        return cctxt.cast(ctxt, 'sync_instance_info', host_name=host_name,
-                          instance_uuids=instance_uuids)
+        version = '4.3'
+        msg_args = {'host_name': host_name}
+        if self.client.can_send_version(version):
+            msg_args['instance_digest'] = utils.get_uuids_digest(
+                instance_uuids)
+        else:
+            version = '4.2'
+            msg_args['instance_uuids'] = instance_uuids
+        cctxt = self.client.prepare(version=version, fanout=True)
+        return cctxt.cast(ctxt, 'sync_instance_info', **msg_args)
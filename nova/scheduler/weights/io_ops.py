@@ -23,6 +23,7 @@ default.
 
 from oslo_config import cfg
 
+from nova.scheduler.filters import utils
 from nova.scheduler import weights
 
 io_ops_weight_opts = [
@@ -49,3 +50,8 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def weigh_objects_array(self, host_states, weight_properties):
+        if utils.overrides_any(self, IoOpsWeigher, ['_weigh_object']):
+            return None
+        return self._weigh_attribute_array(host_states, 'num_io_ops')
@@ -22,6 +22,7 @@ number and the weighing has the opposite effect of the default.
 
 from oslo_config import cfg
 
+from nova.scheduler.filters import utils
 from nova.scheduler import weights
 
 ram_weight_opts = [
@@ -45,3 +46,8 @@ class RAMWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         return host_state.free_ram_mb
+
+    def weigh_objects_array(self, host_states, weight_properties):
+        if utils.overrides_any(self, RAMWeigher, ['_weigh_object']):
+            return None
+        return self._weigh_attribute_array(host_states, 'free_ram_mb')
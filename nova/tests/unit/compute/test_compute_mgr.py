@@ -13,6 +13,7 @@
 """Unit tests for ComputeManager()."""
 
 import contextlib
+import datetime
 import time
 import uuid
 
@@ -211,6 +212,38 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             else:
                 self.assertFalse(db_node.destroy.called)
 
+    @mock.patch('nova.compute.resource_tracker.HostAuditData')
+    @mock.patch.object(manager.ComputeManager, '_get_resource_tracker')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db')
+    def test_update_available_resource_concurrent(self, get_db_nodes,
+                                                  get_avail_nodes, get_rt,
+                                                  audit_data_cls):
+        self.flags(resource_audit_concurrency=2)
+        rts = {}
+
+        def _get_rt_side_effect(nodename):
+            rt = mock.Mock(spec_set=['update_available_resource'])
+            if nodename == 'node2':
+                exc = exception.ComputeHostNotFound(host='fake')
+                rt.update_available_resource.side_effect = exc
+            rts[nodename] = rt
+            return rt
+
+        ctxt = mock.Mock()
+        get_db_nodes.return_value = []
+        get_avail_nodes.return_value = set(['node1', 'node2', 'node3'])
+        get_rt.side_effect = _get_rt_side_effect
+
+        self.compute.update_available_resource(ctxt)
+
+        audit_data_cls.assert_called_once_with(ctxt, self.compute.host)
+        for rt in rts.values():
+            rt.update_available_resource.assert_called_once_with(
+                ctxt, audit_data=audit_data_cls.return_value)
+        self.assertEqual({'node1': rts['node1'], 'node3': rts['node3']},
+                         self.compute._resource_tracker_dict)
+
     def test_delete_instance_without_info_cache(self):
         instance = fake_instance.fake_instance_obj(
                 self.context,
@@ -1480,6 +1513,59 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                           power_state.NOSTATE,
                                                           use_slave=True)
 
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_bulk_states(
+            self, mock_sync_power_state):
+        with mock.patch.object(self.compute.driver,
+                               'get_info') as mock_get_info:
+            db_instance = objects.Instance(uuid='fake-uuid', task_state=None,
+                                           power_state=power_state.RUNNING)
+            self.compute._query_driver_power_state_and_sync(
+                self.context, db_instance,
+                vm_power_states={'fake-uuid': power_state.RUNNING})
+            self.assertFalse(mock_get_info.called)
+            mock_sync_power_state.assert_called_once_with(self.context,
+                                                          db_instance,
+                                                          power_state.RUNNING,
+                                                          use_slave=True)
+
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_bulk_states_changed(
+            self, mock_sync_power_state):
+        info = hardware.InstanceInfo(state=power_state.SHUTDOWN)
+        with mock.patch.object(self.compute.driver, 'get_info',
+                               return_value=info) as mock_get_info:
+            db_instance = objects.Instance(uuid='fake-uuid', task_state=None,
+                                           power_state=power_state.RUNNING)
+            self.compute._query_driver_power_state_and_sync(
+                self.context, db_instance, vm_power_states={})
+            mock_get_info.assert_called_once_with(db_instance)
+            mock_sync_power_state.assert_called_once_with(self.context,
+                                                          db_instance,
+                                                          power_state.SHUTDOWN,
+                                                          use_slave=True)
+
+    @mock.patch.object(manager.ComputeManager,
+                       '_query_driver_power_state_and_sync')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk_states(self, mock_get, mock_query):
+        db_instance = objects.Instance(uuid='fake-uuid')
+        mock_get.return_value = [db_instance]
+        states = {'fake-uuid': power_state.RUNNING}
+        with contextlib.nested(
+                mock.patch.object(self.compute.driver, 'get_num_instances',
+                                  return_value=1),
+                mock.patch.object(self.compute.driver, 'get_power_states',
+                                  return_value=states),
+                mock.patch.object(self.compute._sync_power_pool, 'spawn_n',
+                                  side_effect=lambda f, *a: f(*a)),
+        ):
+            self.compute._sync_power_states(self.context)
+        mock_query.assert_called_once_with(self.context, db_instance,
+                                           vm_power_states=states)
+
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
 
@@ -2043,6 +2129,29 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                             events[2])
         do_test()
 
+    @mock.patch.object(network_api.API, 'get_instance_nw_info',
+                       side_effect=exception.NovaException())
+    def test_external_instance_event_heal_first(self, mock_get_nw_info):
+        instances = [objects.Instance(id=1, uuid='uuid1')]
+        events = [objects.InstanceExternalEvent(name='network-changed',
+                                                tag='tag1',
+                                                instance_uuid='uuid1')]
+        # Only the batch heal task uses and clears the set
+        self.compute.external_instance_event(self.context, instances, events)
+        self.assertEqual(set(), self.compute._instance_uuids_heal_first)
+
+        self.flags(heal_instance_info_cache_batch_size=2)
+        self.compute.external_instance_event(self.context, instances, events)
+        self.assertEqual(set(['uuid1']),
+                         self.compute._instance_uuids_heal_first)
+
+        # The instances which are gone are not healed again
+        mock_get_nw_info.side_effect = exception.InstanceInfoCacheNotFound(
+            instance_uuid='uuid1')
+        self.compute._instance_uuids_heal_first.clear()
+        self.compute.external_instance_event(self.context, instances, events)
+        self.assertEqual(set(), self.compute._instance_uuids_heal_first)
+
     def test_cancel_all_events(self):
         inst = objects.Instance(uuid='uuid')
         fake_eventlet_event = mock.MagicMock()
@@ -2834,6 +2943,104 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
             self.assertIsInstance(mock_r.call_args_list[0][0][0],
                                   objects.Instance)
 
+    @mock.patch.object(fake_driver.FakeDriver, 'prefetch_images',
+                       side_effect=NotImplementedError())
+    def test_prefetch_images(self, mock_prefetch):
+        self.compute.prefetch_images(self.context, ['fake_image_id'])
+        mock_prefetch.assert_called_once_with(self.context,
+                                              ['fake_image_id'])
+
+    def _make_heal_instance(self, uuid, updated_at):
+        info_cache = objects.InstanceInfoCache(
+            instance_uuid=uuid, created_at=datetime.datetime(2015, 1, 1),
+            updated_at=updated_at)
+        instance = fake_instance.fake_instance_obj(
+            self.context, uuid=uuid, host=self.compute.host,
+            vm_state=vm_states.ACTIVE, task_state=None)
+        instance.info_cache = info_cache
+        return instance
+
+    @mock.patch.object(network_api.API, 'get_instances_nw_info')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch(self, mock_get_by_host,
+                                            mock_get_by_filters,
+                                            mock_get_nw_info):
+        self.flags(heal_instance_info_cache_batch_size=2)
+        instances = [
+            self._make_heal_instance('uuid1', datetime.datetime(2015, 1, 3)),
+            self._make_heal_instance('uuid2', None),
+            self._make_heal_instance('uuid3', datetime.datetime(2015, 1, 2)),
+            self._make_heal_instance('uuid4', datetime.datetime(2015, 1, 4))]
+        instances[3].vm_state = vm_states.BUILDING
+        mock_get_by_host.return_value = instances
+        # The instances whose info_cache failed to update go first
+        self.compute._instance_uuids_heal_first.add('uuid1')
+
+        def _get_by_filters(context, filters, **kwargs):
+            return [inst for inst in instances
+                    if inst.uuid in filters['uuid']]
+        mock_get_by_filters.side_effect = _get_by_filters
+
+        self.compute._heal_instance_info_cache(self.context)
+        mock_get_nw_info.assert_called_once_with(
+            self.context, [instances[0], instances[1]])
+        self.assertEqual(['uuid3'], self.compute._instance_uuids_to_heal)
+
+        mock_get_nw_info.reset_mock()
+        self.compute._heal_instance_info_cache(self.context)
+        mock_get_nw_info.assert_called_once_with(self.context,
+                                                 [instances[2]])
+        self.assertEqual(1, mock_get_by_host.call_count)
+        self.assertEqual(3, self.compute.heal_stats['healed'])
+        self.assertFalse(self.compute._instance_uuids_heal_first)
+
+    @mock.patch.object(network_api.API, 'get_instance_nw_info')
+    @mock.patch.object(network_api.API, 'get_instances_nw_info',
+                       side_effect=exception.NovaException())
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_heal_instance_info_cache_batch_fallback(self,
+                                                     mock_get_by_filters,
+                                                     mock_get_nw_infos,
+                                                     mock_get_nw_info):
+        self.flags(heal_instance_info_cache_batch_size=2)
+        instances = [self._make_heal_instance('uuid1', None),
+                     self._make_heal_instance('uuid2', None)]
+        mock_get_by_filters.return_value = instances
+        mock_get_nw_info.side_effect = [None, exception.NovaException()]
+        self.compute._instance_uuids_to_heal = ['uuid1', 'uuid2']
+
+        self.compute._heal_instance_info_cache(self.context)
+        mock_get_nw_info.assert_has_calls(
+            [mock.call(self.context, instances[0]),
+             mock.call(self.context, instances[1])])
+        self.assertEqual(1, self.compute.heal_stats['healed'])
+        self.assertEqual(1, self.compute.heal_stats['failed'])
+        self.assertEqual(set(['uuid2']),
+                         self.compute._instance_uuids_heal_first)
+
+    @mock.patch.object(network_api.API, 'get_instances_nw_info')
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_heal_instance_info_cache_batch_heal_first_mid_cycle(
+            self, mock_get_by_filters, mock_get_nw_info):
+        self.flags(heal_instance_info_cache_batch_size=1)
+        instances = dict((uuid, self._make_heal_instance(uuid, None))
+                         for uuid in ('uuid1', 'uuid2', 'uuid3'))
+
+        def _get_by_filters(context, filters, **kwargs):
+            return [instances[uuid] for uuid in filters['uuid']]
+        mock_get_by_filters.side_effect = _get_by_filters
+        self.compute._instance_uuids_to_heal = ['uuid2', 'uuid3']
+        # uuid1 was already healed during this cycle, uuid3 is yet to be
+        self.compute._instance_uuids_heal_first.update(['uuid1', 'uuid3'])
+
+        self.compute._heal_instance_info_cache(self.context)
+        mock_get_nw_info.assert_called_once_with(self.context,
+                                                 [instances['uuid1']])
+        self.assertEqual(['uuid3', 'uuid2'],
+                         self.compute._instance_uuids_to_heal)
+        self.assertFalse(self.compute._instance_uuids_heal_first)
+
     def test_set_instance_obj_error_state_with_clean_task_state(self):
         instance = fake_instance.fake_instance_obj(self.context,
             vm_state=vm_states.BUILDING, task_state=task_states.SPAWNING)
@@ -223,6 +223,21 @@ class ComputeRpcAPITestCase(test.NoDBTestCase):
                 instance=self.fake_instance_obj, console_type='webmks',
                 version='4.3')
 
+    def test_prefetch_images(self):
+        self._test_compute_api('prefetch_images', 'cast', host='host',
+                image_ids=['fake_image_id'], version='4.6')
+
+    def test_prefetch_images_old_compute(self):
+        rpcapi = compute_rpcapi.ComputeAPI()
+        with contextlib.nested(
+            mock.patch.object(rpcapi.client, 'can_send_version',
+                              return_value=False),
+            mock.patch.object(rpcapi.client, 'prepare'),
+        ) as (csv_mock, prepare_mock):
+            rpcapi.prefetch_images(self.context, 'host', ['fake_image_id'])
+        csv_mock.assert_called_once_with('4.6')
+        self.assertFalse(prepare_mock.called)
+
     def test_validate_console_port(self):
         self._test_compute_api('validate_console_port', 'call',
                 instance=self.fake_instance_obj, port="5900",
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
 import copy
 
@@ -487,6 +488,146 @@ class TestUpdateAvailableResources(BaseTestCase):
         self.assertTrue(obj_base.obj_equal_prims(expected_resources,
                                                  self.rt.compute_node))
 
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_audit_data(self, get_mock, migr_mock, get_cn_mock):
+        self._setup_rt()
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+        audit_data = mock.Mock(spec_set=['get'])
+        audit_data.get.return_value = (objects.InstanceList(objects=[]),
+                                       objects.MigrationList(objects=[]))
+
+        with mock.patch.object(self.rt, '_update'):
+            self.rt.update_available_resource(mock.sentinel.ctx,
+                                              audit_data=audit_data)
+
+        audit_data.get.assert_called_once_with(mock.sentinel.ctx, 'fake-node')
+        self.assertFalse(get_mock.called)
+        self.assertFalse(migr_mock.called)
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_audit_data_claimed_node(self, get_mock, migr_mock, get_cn_mock):
+        self._setup_rt()
+        get_cn_mock.return_value = _COMPUTE_NODE_FIXTURES[0]
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        audit_data = mock.Mock(spec_set=['get'])
+        audit_data.get.return_value = (None, None)
+
+        with mock.patch.object(self.rt, '_update'):
+            self.rt.update_available_resource(mock.sentinel.ctx,
+                                              audit_data=audit_data)
+
+        get_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host',
+                                         'fake-node', expected_attrs=[
+                                             'system_metadata',
+                                             'numa_topology'])
+        migr_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host',
+                                          'fake-node')
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_partial_audit_keeps_tracked_usage(self, get_mock, migr_mock,
+                                               get_cn_mock):
+        self.flags(reserved_host_disk_mb=0, reserved_host_memory_mb=0,
+                   resource_tracker_full_audit_interval=600)
+        self._setup_rt()
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        self.driver_mock.get_per_instance_usage.return_value = {}
+        self.driver_mock.list_instance_uuids_on_node.return_value = []
+
+        self._update_available_resources()
+        # Usage tracked from a claim, and memory added to the host
+        self.rt.compute_node.memory_mb_used = 128
+        self.driver_mock.get_available_resource.return_value['memory_mb'] = (
+            1024)
+        self._update_available_resources()
+
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(1, migr_mock.call_count)
+        self.assertEqual(1024, self.rt.compute_node.memory_mb)
+        self.assertEqual(128, self.rt.compute_node.memory_mb_used)
+        self.assertEqual(896, self.rt.compute_node.free_ram_mb)
+        self.assertEqual({'full': 1, 'partial': 1, 'drifted': 0},
+                         self.rt.audit_stats)
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_partial_audit_untracked_instance(self, get_mock, migr_mock,
+                                              get_cn_mock):
+        self.flags(resource_tracker_full_audit_interval=600)
+        self._setup_rt()
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        self.driver_mock.get_per_instance_usage.return_value = {}
+        self.driver_mock.list_instance_uuids_on_node.return_value = [
+            'fake-uuid']
+
+        self._update_available_resources()
+        self._update_available_resources()
+
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual({'full': 2, 'partial': 0, 'drifted': 0},
+                         self.rt.audit_stats)
+
+    @mock.patch('nova.objects.PciDeviceList.get_by_compute_node',
+                return_value=objects.PciDeviceList(objects=[]))
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_partial_audit_pci_devices_changed(self, get_mock, migr_mock,
+                                               get_cn_mock, pci_mock):
+        self.flags(resource_tracker_full_audit_interval=600)
+        self._setup_rt()
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        self.driver_mock.get_per_instance_usage.return_value = {}
+        self.driver_mock.list_instance_uuids_on_node.return_value = []
+        resources = self.driver_mock.get_available_resource.return_value
+
+        self._update_available_resources()
+        # The full audit pops the devices from the resources, as the driver
+        # returns new resources at each update
+        resources['pci_passthrough_devices'] = '[]'
+        self._update_available_resources()
+        resources['pci_passthrough_devices'] = '[]'
+        self._update_available_resources()
+
+        self.assertEqual(2, get_mock.call_count)
+        self.assertIsNotNone(self.rt.pci_tracker)
+        self.assertEqual({'full': 2, 'partial': 1, 'drifted': 0},
+                         self.rt.audit_stats)
+
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_full_audit_records_drift(self, get_mock, migr_mock, get_cn_mock):
+        self._setup_rt()
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        self.driver_mock.get_per_instance_usage.return_value = {}
+
+        self._update_available_resources()
+        self.assertEqual({}, self.rt.last_drift)
+        # Usage tracked from a claim which was never aborted nor dropped
+        self.rt.compute_node.memory_mb_used += 64
+        self._update_available_resources()
+
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual({'memory_mb_used': -64}, self.rt.last_drift)
+        self.assertEqual({'full': 2, 'partial': 0, 'drifted': 1},
+                         self.rt.audit_stats)
+
     @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
     @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
     @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
@@ -906,6 +1047,63 @@ class TestUpdateAvailableResources(BaseTestCase):
                                                  self.rt.compute_node))
 
 
+@mock.patch.object(resource_tracker, '_claim_generations',
+                   collections.Counter())
+@mock.patch('nova.objects.MigrationList.get_in_progress_by_host')
+@mock.patch('nova.objects.InstanceList.get_by_host')
+class TestHostAuditData(test.NoDBTestCase):
+
+    def _migration(self, source_compute, source_node, dest_compute,
+                   dest_node):
+        return objects.Migration(source_compute=source_compute,
+                                 source_node=source_node,
+                                 dest_compute=dest_compute,
+                                 dest_node=dest_node)
+
+    def test_get(self, get_mock, migr_mock):
+        inst1 = objects.Instance(uuid='uuid1', node='node1')
+        inst2 = objects.Instance(uuid='uuid2', node='node2')
+        inst3 = objects.Instance(uuid='uuid3', node='node1')
+        get_mock.return_value = [inst1, inst2, inst3]
+        mig_in = self._migration('other-host', 'other-node',
+                                 'fake-host', 'node1')
+        mig_out = self._migration('fake-host', 'node2',
+                                  'other-host', 'other-node')
+        mig_local = self._migration('fake-host', 'node1',
+                                    'fake-host', 'node2')
+        migr_mock.return_value = [mig_in, mig_out, mig_local]
+
+        audit_data = resource_tracker.HostAuditData(mock.sentinel.ctx,
+                                                    'fake-host')
+
+        get_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host',
+                                         expected_attrs=['system_metadata',
+                                                         'numa_topology'])
+        migr_mock.assert_called_once_with(mock.sentinel.ctx, 'fake-host')
+        instances, migrations = audit_data.get(mock.sentinel.ctx, 'node1')
+        self.assertEqual([inst1, inst3], instances.objects)
+        self.assertEqual([mig_in, mig_local], migrations.objects)
+        instances, migrations = audit_data.get(mock.sentinel.ctx, 'node2')
+        self.assertEqual([inst2], instances.objects)
+        self.assertEqual([mig_out, mig_local], migrations.objects)
+        instances, migrations = audit_data.get(mock.sentinel.ctx, 'node3')
+        self.assertEqual([], instances.objects)
+        self.assertEqual([], migrations.objects)
+
+    def test_get_claimed_node(self, get_mock, migr_mock):
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        audit_data = resource_tracker.HostAuditData(mock.sentinel.ctx,
+                                                    'fake-host')
+
+        resource_tracker._claim_generations['node1'] += 1
+
+        self.assertEqual((None, None),
+                         audit_data.get(mock.sentinel.ctx, 'node1'))
+        instances, migrations = audit_data.get(mock.sentinel.ctx, 'node2')
+        self.assertEqual([], instances.objects)
+
+
 class TestInitComputeNode(BaseTestCase):
 
     @mock.patch('nova.objects.ComputeNode.create')
@@ -1061,7 +1259,7 @@ class TestUpdateComputeNode(BaseTestCase):
         self.assertFalse(service_mock.called)
 
         # The above call to _update() will populate the
-        # RT.old_resources collection with the resources. Here, we check that
+        # RT.old_field_digests with the resources. Here, we check that
         # if we call _update() again with the same resources, that
         # the scheduler client won't be called again to update those
         # (unchanged) resources for the compute node
@@ -1120,6 +1318,30 @@ class TestUpdateComputeNode(BaseTestCase):
         urs_mock = self.sched_client_mock.update_resource_stats
         urs_mock.assert_called_once_with(self.rt.compute_node)
 
+    def test_update_only_changed_fields(self):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        self.rt._update(mock.sentinel.ctx)
+        first_bytes = self.rt.update_bytes_total
+        self.assertGreater(first_bytes, 0)
+        # What ComputeNode.save() would have done
+        self.rt.compute_node.obj_reset_changes()
+
+        changes = []
+        urs_mock = self.sched_client_mock.update_resource_stats
+        urs_mock.reset_mock()
+        urs_mock.side_effect = lambda compute_node: changes.append(
+            compute_node.obj_what_changed())
+
+        # Setting a field to the same value does not make it dirty
+        self.rt.compute_node.vcpus = self.rt.compute_node.vcpus
+        self.rt.compute_node.metrics = self.rt.compute_node.metrics
+        self.rt.compute_node.memory_mb_used += 1
+        self.rt._update(mock.sentinel.ctx)
+
+        self.assertEqual([set(['memory_mb_used'])], changes)
+        self.assertGreater(self.rt.update_bytes_total, first_bytes)
+
 
 class TestInstanceClaim(BaseTestCase):
 
@@ -1171,6 +1393,21 @@ class TestInstanceClaim(BaseTestCase):
         self.assertEqual(self.rt.nodename, self.instance.node)
         self.assertIsInstance(claim, claims.NopClaim)
 
+    @mock.patch.object(resource_tracker.ResourceTracker, '_update')
+    @mock.patch.object(resource_tracker.ResourceTracker,
+                       '_update_usage_from_instance')
+    @mock.patch.object(resource_tracker, '_claim_generations',
+                       collections.Counter())
+    def test_usage_changes_bump_claim_generation(self, update_usage_mock,
+                                                 update_mock):
+        # The instances and migrations loaded for the audits of the nodes of
+        # the host are stale once the usage of the instances changed
+        self.rt.abort_instance_claim(self.ctx, self.instance)
+        self.rt.drop_move_claim(self.ctx, self.instance)
+        self.rt.update_usage(self.ctx, self.instance)
+        self.assertEqual(3,
+                         resource_tracker._claim_generations[self.rt.nodename])
+
     @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
     @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
     def test_update_usage_with_claim(self, migr_mock, pci_mock):
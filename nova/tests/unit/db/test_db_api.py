@@ -1008,7 +1008,7 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
                 CONF.api_database)
         mock_facade.get_session.assert_called_once_with()
 
-    @mock.patch.object(sqlalchemy_api, '_instance_get_by_uuid')
+    @mock.patch.object(sqlalchemy_api, '_instance_get_marker')
     @mock.patch.object(sqlalchemy_api, '_instances_fill_metadata')
     @mock.patch('oslo_db.sqlalchemy.utils.paginate_query')
     def test_instance_get_all_by_filters_paginated_allows_deleted_marker(
@@ -1017,9 +1017,25 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
         ctxt.elevated.return_value = mock.sentinel.elevated
         sqlalchemy_api.instance_get_all_by_filters_sort(ctxt, {}, marker='foo')
         mock_get.assert_called_once_with(mock.sentinel.elevated,
-                                         'foo', session=mock.ANY)
+                                         'foo', ['created_at', 'id'],
+                                         session=mock.ANY)
         ctxt.elevated.assert_called_once_with(read_deleted='yes')
 
+    def test_instance_keyset_filter(self):
+        query = mock.Mock()
+        marker = mock.Mock(created_at=datetime.datetime(2015, 1, 1))
+        self.assertEqual(query.filter.return_value,
+                         sqlalchemy_api._instance_keyset_filter(
+                             query, marker, 'created_at', 'desc'))
+        self.assertEqual(1, query.filter.call_count)
+
+    def test_instance_keyset_filter_no_value(self):
+        query = mock.Mock()
+        marker = mock.Mock(created_at=None)
+        self.assertEqual(query, sqlalchemy_api._instance_keyset_filter(
+            query, marker, 'created_at', 'asc'))
+        self.assertFalse(query.filter.called)
+
 
 class SqlAlchemyDbApiTestCase(DbTestCase):
     def test_instance_get_all_by_host(self):
@@ -1305,6 +1321,12 @@ class MigrationTestCase(test.TestCase):
         self.assertEqual(3, len(migrations))
         self._assert_in_progress(migrations)
 
+    def test_in_progress_host2(self):
+        migrations = db.migration_get_in_progress_by_host(self.ctxt, 'host2')
+        # 2 as dest, 2 as source
+        self.assertEqual(4, len(migrations))
+        self._assert_in_progress(migrations)
+
     def test_instance_join(self):
         migrations = db.migration_get_in_progress_by_host_and_node(self.ctxt,
                 'host2', 'b')
@@ -2092,6 +2114,72 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         filtered_instances = db.instance_get_all_by_filters(self.ctxt, {})
         self._assertEqualListsOfInstances(instances, filtered_instances)
 
+    def _get_joined_columns_by_uuid(self, join_batch_size):
+        self.flags(instance_list_join_batch_size=join_batch_size)
+        result = db.instance_get_all_by_filters(self.ctxt, {})
+        return {inst['uuid']: (
+                    utils.metadata_to_dict(inst['metadata']),
+                    inst['info_cache']['id'],
+                    sorted(secgroup['id']
+                           for secgroup in inst['security_groups']))
+                for inst in result}
+
+    def test_instance_get_all_by_filters_join_batches(self):
+        instances = [self.create_instance_with_args() for i in range(3)]
+        self._create_security_group({'name': 'fake-secgroup1',
+                                     'instances': instances[:2]})
+        self._create_security_group({'name': 'fake-secgroup2',
+                                     'instances': instances[1:]})
+        deleted_secgroup = self._create_security_group(
+            {'name': 'fake-secgroup3', 'instances': instances})
+        db.security_group_destroy(self.ctxt, deleted_secgroup['id'])
+
+        expected = self._get_joined_columns_by_uuid(0)
+        with mock.patch.object(
+                sqlalchemy_api, '_instance_security_groups_get_multi',
+                wraps=sqlalchemy_api._instance_security_groups_get_multi
+                ) as mock_get_secgroups:
+            self.assertEqual(expected, self._get_joined_columns_by_uuid(2))
+        self.assertEqual(2, mock_get_secgroups.call_count)
+        self.assertEqual([1, 1, 2],
+                         sorted(len(columns[2])
+                                for columns in expected.values()))
+
+    def _get_all_pages(self, limit):
+        uuids = []
+        marker = None
+        while True:
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, limit=limit, marker=marker)
+            if not result:
+                return uuids
+            uuids.extend(inst['uuid'] for inst in result)
+            marker = result[-1]['uuid']
+
+    def test_instance_get_all_by_filters_paginate_same_created_at(self):
+        created_at = datetime.datetime(2015, 1, 1)
+        instances = [self.create_instance_with_args(created_at=created_at)
+                     for i in range(5)]
+        expected = [inst['uuid']
+                    for inst in sorted(instances, key=lambda inst: inst['id'],
+                                       reverse=True)]
+        self.assertEqual(expected, self._get_all_pages(2))
+        self.flags(instance_list_keyset_pagination=False)
+        self.assertEqual(expected, self._get_all_pages(2))
+
+    def test_instance_get_marker(self):
+        instance = self.create_instance_with_args()
+        marker = sqlalchemy_api._instance_get_marker(
+            self.ctxt, instance['uuid'], ['created_at', 'id'])
+        self.assertEqual((instance['created_at'], instance['id']),
+                         tuple(marker))
+        self.assertEqual(instance['id'], marker.id)
+
+    def test_instance_get_marker_not_found(self):
+        self.assertRaises(exception.InstanceNotFound,
+                          sqlalchemy_api._instance_get_marker,
+                          self.ctxt, 'fake-uuid', ['created_at', 'id'])
+
     def test_instance_get_all_by_filters_zero_limit(self):
         self.create_instance_with_args()
         instances = db.instance_get_all_by_filters(self.ctxt, {}, limit=0)
@@ -6684,6 +6772,28 @@ class QuotaTestCase(test.TestCase, ModelsObjectComparatorMixin):
             resources_names.remove(reservation.resource)
         self.assertEqual(len(resources_names), 0)
 
+    def test_quota_reserve_multi(self):
+        resources = {'instances': quota.ReservableResource(
+            'instances', '_sync_instances', 'quota_instances')}
+        quotas = {'instances': 5}
+        requests = [{'project_quotas': quotas, 'user_quotas': quotas,
+                     'deltas': {'instances': delta},
+                     'expire': timeutils.utcnow()}
+                    for delta in (3, 3, 2)]
+        results = db.quota_reserve_multi(self.ctxt, resources, requests,
+                                         None, None, 'project1', 'user1')
+        self.assertEqual(3, len(results))
+        self.assertEqual(1, len(results[0]))
+        self.assertIsInstance(results[1], exception.OverQuota)
+        self.assertEqual(1, len(results[2]))
+        usage = db.quota_usage_get(self.ctxt, 'project1', 'instances',
+                                   'user1')
+        self.assertEqual(0, usage.in_use)
+        self.assertEqual(5, usage.reserved)
+        for reservation_uuid in results[0] + results[2]:
+            self.assertEqual('instances', _reservation_get(
+                self.ctxt, reservation_uuid).resource)
+
     def test_quota_destroy_all_by_project(self):
         reservations = _quota_reserve(self.ctxt, 'project1', 'user1')
         db.quota_destroy_all_by_project(self.ctxt, 'project1')
@@ -7227,6 +7337,25 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         nodes = db.compute_node_get_all(self.ctxt)
         self.assertEqual(len(nodes), 0)
 
+    def test_compute_node_get_all_updated_since(self):
+        since = self.item['created_at'] + datetime.timedelta(seconds=1)
+        self.assertEqual([], db.compute_node_get_all_updated_since(
+            self.ctxt, since))
+
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=since):
+            db.compute_node_update(self.ctxt, self.item['id'],
+                                   {'vcpus_used': 1})
+        nodes = db.compute_node_get_all_updated_since(self.ctxt, since)
+        self.assertEqual([self.item['id']], [n['id'] for n in nodes])
+
+    def test_compute_node_get_all_updated_since_returns_deleted(self):
+        since = self.item['created_at']
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes = db.compute_node_get_all_updated_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertTrue(nodes[0]['deleted'])
+
     def test_compute_node_search_by_hypervisor(self):
         nodes_created = []
         new_service = copy.copy(self.service_dict)
@@ -8111,6 +8240,24 @@ class ArchiveTestCase(test.TestCase):
         self._assert_shadow_tables_empty_except(
             'shadow_instance_id_mappings')
 
+    @mock.patch.object(sqlalchemy_api, 'archive_deleted_rows_for_table',
+                       return_value=0)
+    def test_archive_deleted_rows_foreign_keys_order(self, mock_archive):
+        db.archive_deleted_rows(self.context)
+        tablenames = [call[0][1] for call in mock_archive.call_args_list]
+        self.assertLess(tablenames.index('consoles'),
+                        tablenames.index('console_pools'))
+        self.assertLess(tablenames.index('instance_extra'),
+                        tablenames.index('instances'))
+        self.assertEqual(len(models.BASE.metadata.tables), len(tablenames))
+
+    @mock.patch.object(sqlalchemy_api, 'archive_deleted_rows_for_table',
+                       return_value=2)
+    def test_archive_deleted_rows_max_rows(self, mock_archive):
+        self.assertEqual(4, db.archive_deleted_rows(self.context, max_rows=3))
+        self.assertEqual([3, 1], [call[1]['max_rows']
+                                  for call in mock_archive.call_args_list])
+
     def test_archive_deleted_rows_for_every_uuid_table(self):
         tablenames = []
         for model_class in six.itervalues(models.__dict__):
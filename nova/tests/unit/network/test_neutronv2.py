@@ -30,6 +30,7 @@ import six
 from six.moves import range
 
 from nova.compute import flavors
+from nova.compute import utils as compute_utils
 from nova import context
 from nova import exception
 from nova.network import model
@@ -127,6 +128,28 @@ class TestNeutronClient(test.NoDBTestCase):
                          cl.httpclient.auth.auth_token)
         self.assertEqual(CONF.neutron.timeout, cl.httpclient.session.timeout)
 
+    def test_connection_pool(self):
+        self.flags(url='http://anyhost/', group='neutron')
+        self.flags(connection_pool_size=5, group='neutron')
+        my_context = context.RequestContext('userid',
+                                            'my_tenantid',
+                                            auth_token='token')
+        self.assertEqual({'connections': 0, 'requests': 0,
+                          'reused_estimate': 0},
+                         neutronapi.get_connection_stats())
+
+        cl = neutronapi.get_client(my_context)
+
+        adapter = cl.httpclient.session.session.adapters['http://']
+        self.assertEqual(5, adapter._pool_maxsize)
+        self.assertTrue(adapter._pool_block)
+        pool = adapter.poolmanager.connection_from_url('http://anyhost/')
+        pool.num_connections = 2
+        pool.num_requests = 10
+        self.assertEqual({'connections': 2, 'requests': 10,
+                          'reused_estimate': 8},
+                         neutronapi.get_connection_stats())
+
     def test_withouttoken(self):
         my_context = context.RequestContext('userid', 'my_tenantid')
         self.assertRaises(exceptions.Unauthorized,
@@ -2829,6 +2852,40 @@ class TestNeutronv2(TestNeutronv2Base):
         self.assertEqual(expected_results, has_pci_request_id)
 
 
+class FakeNeutronClientForBulkQueries(object):
+    """Neutron client answering list requests from canned data and
+    recording them.
+    """
+
+    def __init__(self, **data):
+        self.data = data
+        self.requests = []
+
+    def _list(self, resource, **search_opts):
+        self.requests.append((resource, search_opts))
+        items = []
+        for item in self.data.get(resource, []):
+            for key, value in search_opts.items():
+                values = value if isinstance(value, list) else [value]
+                if item.get(key) not in values:
+                    break
+            else:
+                items.append(item)
+        return {resource: items}
+
+    def list_ports(self, **search_opts):
+        return self._list('ports', **search_opts)
+
+    def list_floatingips(self, **search_opts):
+        return self._list('floatingips', **search_opts)
+
+    def list_subnets(self, **search_opts):
+        return self._list('subnets', **search_opts)
+
+    def list_networks(self, **search_opts):
+        return self._list('networks', **search_opts)
+
+
 class TestNeutronv2WithMock(test.TestCase):
     """Used to test Neutron V2 API with mock."""
 
@@ -2839,6 +2896,41 @@ class TestNeutronv2WithMock(test.TestCase):
             'fake-user', 'fake-project',
             auth_token='bff4a5a6b9eb4ea2a6efec6eefb77936')
 
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_request_lookups_cached(self, mock_get_client):
+        self.flags(cache_request_lookups=True, group='neutron')
+        mocked_client = mock.Mock()
+        mock_get_client.return_value = mocked_client
+        mocked_client.list_networks.return_value = {
+            'networks': [{'id': 'net-id'}]}
+        mocked_client.list_subnets.return_value = {
+            'subnets': [{'id': 'subnet-id', 'network_id': 'net-id',
+                         'cidr': '10.0.0.0/24', 'gateway_ip': '10.0.0.1'}]}
+        mocked_client.list_ports.return_value = {'ports': []}
+        port = {'fixed_ips': [{'subnet_id': 'subnet-id',
+                               'ip_address': '10.0.0.2'}]}
+
+        for i in range(2):
+            nets = self.api._get_available_networks(
+                self.context, 'fake-project', ['net-id'])
+            self.assertEqual([{'id': 'net-id'}], nets)
+            # The callers get copies of the memoized networks
+            nets[0]['name'] = 'changed'
+            subnets = self.api._get_subnets_from_port(self.context, port)
+            self.assertEqual(1, len(subnets))
+
+        mocked_client.list_networks.assert_called_once_with(id=['net-id'])
+        mocked_client.list_subnets.assert_called_once_with(id=['subnet-id'])
+        mocked_client.list_ports.assert_called_once_with(
+            network_id='net-id', device_owner='network:dhcp')
+
+        # The lookups are not shared between requests
+        other_context = context.RequestContext(
+            'fake-user', 'fake-project', auth_token='token')
+        self.api._get_available_networks(other_context, 'fake-project',
+                                         ['net-id'])
+        self.assertEqual(2, mocked_client.list_networks.call_count)
+
     @mock.patch('oslo_concurrency.lockutils.lock')
     def test_get_instance_nw_info_locks_per_instance(self, mock_lock):
         instance = objects.Instance(uuid=uuid.uuid4())
@@ -2848,6 +2940,68 @@ class TestNeutronv2WithMock(test.TestCase):
                           api.get_instance_nw_info, 'context', instance)
         mock_lock.assert_called_once_with('refresh_cache-%s' % instance.uuid)
 
+    @mock.patch('nova.network.base_api.update_instance_cache_with_nw_info')
+    @mock.patch.object(compute_utils, 'refresh_info_cache_for_instance')
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_get_instances_nw_info(self, mock_get_client, mock_refresh,
+                                   mock_update):
+        instances = []
+        ports = []
+        for i in range(3):
+            port_id = 'port%d' % i
+            vif = model.VIF(id=port_id, network=model.Network(id='net-id'))
+            instances.append(objects.Instance(
+                uuid=str(uuid.uuid4()), project_id='fake-project',
+                info_cache=objects.InstanceInfoCache(
+                    network_info=model.NetworkInfo([vif]))))
+            ports.append({'id': port_id,
+                          'device_id': instances[-1].uuid,
+                          'device_owner': 'compute:nova',
+                          'tenant_id': 'fake-project',
+                          'network_id': 'net-id',
+                          'admin_state_up': True,
+                          'status': 'ACTIVE',
+                          'mac_address': 'de:ad:be:ef:00:0%d' % i,
+                          'fixed_ips': [{'ip_address': '10.0.0.1%d' % i,
+                                         'subnet_id': 'subnet-id'}],
+                          'binding:vif_type': model.VIF_TYPE_OVS})
+        ports.append({'id': 'dhcp-port',
+                      'device_id': 'dhcp-device',
+                      'device_owner': 'network:dhcp',
+                      'network_id': 'net-id',
+                      'fixed_ips': [{'ip_address': '10.0.0.2',
+                                     'subnet_id': 'subnet-id'}]})
+        client = FakeNeutronClientForBulkQueries(
+            ports=ports,
+            floatingips=[{'port_id': 'port0',
+                          'fixed_ip_address': '10.0.0.10',
+                          'floating_ip_address': '172.24.4.10'}],
+            subnets=[{'id': 'subnet-id', 'network_id': 'net-id',
+                      'cidr': '10.0.0.0/24', 'gateway_ip': '10.0.0.1'}],
+            networks=[{'id': 'net-id', 'name': 'private',
+                       'tenant_id': 'fake-project'}])
+        mock_get_client.return_value = client
+
+        result = self.api.get_instances_nw_info(self.context, instances)
+
+        # One request per resource, whatever the number of instances
+        self.assertEqual(['ports', 'floatingips', 'subnets', 'ports',
+                          'networks'],
+                         [resource for resource, _opts in client.requests])
+        self.assertEqual(3, mock_update.call_count)
+        for i, instance in enumerate(instances):
+            nw_info = result[instance.uuid]
+            self.assertEqual(['port%d' % i], [vif['id'] for vif in nw_info])
+            network = nw_info[0]['network']
+            self.assertEqual('private', network['label'])
+            self.assertEqual('10.0.0.2',
+                             network['subnets'][0]['meta']['dhcp_server'])
+            self.assertEqual(['10.0.0.1%d' % i],
+                             [ip['address'] for ip in nw_info.fixed_ips()])
+        self.assertEqual(['172.24.4.10'],
+                         [ip['address'] for ip in
+                          result[instances[0].uuid].floating_ips()])
+
     @mock.patch('oslo_concurrency.lockutils.lock')
     @mock.patch.object(neutronapi.API, '_get_instance_nw_info')
     @mock.patch('nova.network.base_api.update_instance_cache_with_nw_info')
@@ -1056,6 +1056,58 @@ class _TestInstanceObject(object):
                              expected_attrs=['security_groups'])
         self.assertEqual([], inst.security_groups.objects)
 
+    def test_from_db_object_defers_extra(self):
+        fake_flavor = jsonutils.dumps(
+            {'cur': objects.Flavor(name='cur').obj_to_primitive(),
+             'old': None, 'new': None})
+        fake_vcpu_model = jsonutils.dumps(
+            test_vcpu_model.fake_vcpumodel.obj_to_primitive())
+        db_inst = dict(self.fake_instance,
+                       extra={'flavor': fake_flavor,
+                              'vcpu_model': fake_vcpu_model,
+                              'migration_context': None})
+        stats = instance.get_deferred_extra_stats()
+        inst = instance.Instance._from_db_object(
+            self.context, objects.Instance(), db_inst,
+            expected_attrs=['flavor', 'vcpu_model', 'migration_context'])
+
+        for field in ('flavor', 'old_flavor', 'new_flavor', 'vcpu_model'):
+            self.assertTrue(inst.obj_attr_is_set(field))
+            self.assertIn(field, inst._deferred_extra)
+        self.assertNotIn('migration_context', inst._deferred_extra)
+        self.assertIsNone(inst.migration_context)
+
+        self.assertEqual('fake-model', inst.vcpu_model.model)
+        self.assertEqual('cur', inst.flavor.name)
+        self.assertIsNone(inst.new_flavor)
+        self.assertEqual({'old_flavor': fake_flavor}, inst._deferred_extra)
+        self.assertEqual(set(), inst.obj_what_changed())
+
+        new_stats = instance.get_deferred_extra_stats()
+        for field in ('flavor', 'old_flavor', 'new_flavor', 'vcpu_model'):
+            old = stats.get(field, {'deferred': 0, 'decoded': 0})
+            self.assertEqual(old['deferred'] + 1,
+                             new_stats[field]['deferred'])
+        self.assertEqual(stats.get('old_flavor', {}).get('decoded', 0),
+                         new_stats['old_flavor']['decoded'])
+        self.assertEqual(stats.get('vcpu_model', {}).get('decoded', 0) + 1,
+                         new_stats['vcpu_model']['decoded'])
+
+        # The deferred fields are serialized like the other ones
+        primitive = inst.obj_to_primitive()['nova_object.data']
+        self.assertIsNone(primitive['old_flavor'])
+        self.assertEqual({}, inst._deferred_extra)
+
+    def test_from_db_object_refreshes_set_extra(self):
+        inst = objects.Instance(vcpu_model=objects.VirtCPUModel(model='old'))
+        db_inst = dict(self.fake_instance,
+                       extra={'vcpu_model': jsonutils.dumps(
+                           test_vcpu_model.fake_vcpumodel.obj_to_primitive())})
+        instance.Instance._from_db_object(self.context, inst, db_inst,
+                                          expected_attrs=['vcpu_model'])
+        self.assertEqual({}, inst._deferred_extra)
+        self.assertEqual('fake-model', inst.vcpu_model.model)
+
     @mock.patch('nova.objects.InstancePCIRequests.get_by_instance_uuid')
     def test_get_with_pci_requests(self, mock_get):
         mock_get.return_value = objects.InstancePCIRequests()
@@ -12,6 +12,7 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import availability_zone_filter
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -52,3 +53,23 @@ class TestAvailabilityZoneFilter(test.NoDBTestCase):
         request = self._make_zone_request('bad')
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertFalse(self.filt_cls.host_passes(host, request))
+
+    def test_availability_zone_filter_result_cache(self, agg_mock):
+        agg_mock.return_value = {'availability_zone': 'nova'}
+        self.filt_cls.enable_result_cache(10)
+        request = self._make_zone_request('nova')
+        aggs = [objects.Aggregate(id=1)]
+        hosts = [fakes.FakeHostState('host%d' % i, 'node1',
+                                     {'aggregates': aggs})
+                 for i in range(3)]
+        self.assertEqual(hosts, list(self.filt_cls.filter_all(hosts,
+                                                              request)))
+        self.assertEqual(1, agg_mock.call_count)
+
+    def test_availability_zone_filter_result_cache_no_zone(self, agg_mock):
+        self.filt_cls.enable_result_cache(10)
+        request = self._make_zone_request(None)
+        host = fakes.FakeHostState('host1', 'node1', {'aggregates': []})
+        self.assertEqual([host], list(self.filt_cls.filter_all([host],
+                                                               request)))
+        self.assertEqual({}, self.filt_cls._result_cache)
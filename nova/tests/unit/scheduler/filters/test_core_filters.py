@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -49,6 +51,27 @@ class TestCoreFilter(test.NoDBTestCase):
                  'cpu_allocation_ratio': 2})
         self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
 
+    @testtools.skipIf(utils.numpy is None, 'NumPy is not installed')
+    def test_core_filter_all_array(self):
+        self.filt_cls = core_filter.CoreFilter()
+        self.filt_cls.enable_array_filtering()
+        filter_properties = {'instance_type': {'vcpus': 2}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'vcpus_total': 4, 'vcpus_used': 6,
+                 'cpu_allocation_ratio': 2})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'vcpus_total': 4, 'vcpus_used': 7,
+                 'cpu_allocation_ratio': 2})
+        host3 = fakes.FakeHostState('host3', 'node3', {})
+        host4 = fakes.FakeHostState('host4', 'node4',
+                {'vcpus_total': 1, 'vcpus_used': 0,
+                 'cpu_allocation_ratio': 2})
+        self.assertEqual([host1, host3],
+                         list(self.filt_cls.filter_all(
+                             [host1, host2, host3, host4], filter_properties)))
+        self.assertEqual(8, host1.limits['vcpu'])
+        self.assertNotIn('vcpu', host3.limits)
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_aggregate_core_filter_value_error(self, agg_mock):
         self.filt_cls = core_filter.AggregateCoreFilter()
@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -40,6 +42,53 @@ class TestDiskFilter(test.NoDBTestCase):
                 {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 13})
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_disk_filter_all(self):
+        self.flags(disk_allocation_ratio=1.0)
+        filt_cls = disk_filter.DiskFilter()
+        filter_properties = {'instance_type': {'root_gb': 1,
+            'ephemeral_gb': 1, 'swap': 512}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 13})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_disk_mb': 2 * 1024, 'total_usable_disk_gb': 13})
+        self.assertEqual([host1], list(filt_cls.filter_all([host1, host2],
+                                                           filter_properties)))
+        self.assertEqual(13, host1.limits['disk_gb'])
+
+    def test_disk_filter_all_overridden_ratio(self):
+        self.flags(disk_allocation_ratio=1.0)
+
+        class HostRatioDiskFilter(disk_filter.DiskFilter):
+            def _get_disk_allocation_ratio(self, host_state,
+                                           filter_properties):
+                return 2.0 if host_state.host == 'host2' else 1.0
+
+        filt_cls = HostRatioDiskFilter()
+        filter_properties = {'instance_type': {'root_gb': 1,
+            'ephemeral_gb': 1, 'swap': 512}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 2 * 1024, 'total_usable_disk_gb': 13})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_disk_mb': 2 * 1024, 'total_usable_disk_gb': 13})
+        self.assertEqual([host2], list(filt_cls.filter_all([host1, host2],
+                                                           filter_properties)))
+        self.assertEqual(26, host2.limits['disk_gb'])
+
+    @testtools.skipIf(utils.numpy is None, 'NumPy is not installed')
+    def test_disk_filter_all_array(self):
+        self.flags(disk_allocation_ratio=2.0)
+        filt_cls = disk_filter.DiskFilter()
+        filt_cls.enable_array_filtering()
+        filter_properties = {'instance_type': {'root_gb': 3,
+            'ephemeral_gb': 3, 'swap': 1024}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 1 * 1024, 'total_usable_disk_gb': 6})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_disk_mb': 0, 'total_usable_disk_gb': 6})
+        self.assertEqual([host1], list(filt_cls.filter_all([host1, host2],
+                                                           filter_properties)))
+        self.assertEqual(12, host1.limits['disk_gb'])
+
     def test_disk_filter_oversubscribe(self):
         self.flags(disk_allocation_ratio=10.0)
         filt_cls = disk_filter.DiskFilter()
@@ -187,3 +187,20 @@ class TestImagePropsFilter(test.NoDBTestCase):
                         'hypervisor_version': hypervisor_version}
         host = fakes.FakeHostState('host1', 'node1', capabilities)
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_image_properties_filter_result_cache(self):
+        self.filt_cls.enable_result_cache(10)
+        img_props = {'properties': {'architecture': arch.X86_64,
+                                    'hypervisor_type': hv_type.KVM,
+                                    'hypervisor_version_requires': '>=6.0'}}
+        filter_properties = {'request_spec': {'image': img_props}}
+        hosts = []
+        for version in ('6.0.0', '6.0.0', '5.0.0'):
+            capabilities = {'supported_instances':
+                            [[arch.X86_64, hv_type.KVM, vm_mode.HVM]],
+                            'hypervisor_version':
+                                utils.convert_version_to_int(version)}
+            hosts.append(fakes.FakeHostState('host1', 'node1', capabilities))
+        result = list(self.filt_cls.filter_all(hosts, filter_properties))
+        self.assertEqual(hosts[:2], result)
+        self.assertEqual(2, len(self.filt_cls._result_cache))
@@ -12,8 +12,10 @@
 
 
 import mock
+import testtools
 
 from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -36,6 +38,50 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         filter_properties = {}
         self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
 
+    def test_filter_all_num_iops(self):
+        self.flags(max_io_ops_per_host=8)
+        self.filt_cls = io_ops_filter.IoOpsFilter()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_io_ops': 8})
+        self.assertEqual([host1],
+                         list(self.filt_cls.filter_all([host1, host2], {})))
+
+    @testtools.skipIf(utils.numpy is None, 'NumPy is not installed')
+    def test_filter_all_array_num_iops(self):
+        self.flags(max_io_ops_per_host=8)
+        self.filt_cls = io_ops_filter.IoOpsFilter()
+        self.filt_cls.enable_array_filtering()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_io_ops': 8})
+        with mock.patch.object(self.filt_cls, 'host_passes') as mock_passes:
+            self.assertEqual([host1], self.filt_cls.filter_all([host1, host2],
+                                                               {}))
+        self.assertFalse(mock_passes.called)
+
+    @mock.patch.object(utils, 'numpy', None)
+    def test_filter_all_array_num_iops_without_numpy(self):
+        self.flags(max_io_ops_per_host=8)
+        self.filt_cls = io_ops_filter.IoOpsFilter()
+        self.filt_cls.enable_array_filtering()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_io_ops': 8})
+        self.assertEqual([host1],
+                         list(self.filt_cls.filter_all([host1, host2], {})))
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_aggregate_filter_all_num_iops_value(self, agg_mock):
+        self.flags(max_io_ops_per_host=7)
+        self.filt_cls = io_ops_filter.AggregateIoOpsFilter()
+        host1 = fakes.FakeHostState('host1', 'node1', {'num_io_ops': 7})
+        host2 = fakes.FakeHostState('host2', 'node2', {'num_io_ops': 7})
+        agg_mock.side_effect = [set(['8']), set([])]
+        filter_properties = {'context': mock.sentinel.ctx}
+        self.assertEqual([host1],
+                         list(self.filt_cls.filter_all([host1, host2],
+                                                       filter_properties)))
+        agg_mock.assert_has_calls([mock.call(host1, 'max_io_ops_per_host'),
+                                   mock.call(host2, 'max_io_ops_per_host')])
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_aggregate_filter_num_iops_value(self, agg_mock):
         self.flags(max_io_ops_per_host=7)
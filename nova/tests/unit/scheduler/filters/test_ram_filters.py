@@ -11,8 +11,10 @@
 #    under the License.
 
 import mock
+import testtools
 
 from nova.scheduler.filters import ram_filter
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -52,6 +54,24 @@ class TestRamFilter(test.NoDBTestCase):
                  'ram_allocation_ratio': 2.0})
         self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
 
+    @testtools.skipIf(utils.numpy is None, 'NumPy is not installed')
+    def test_ram_filter_all_array(self):
+        self.filt_cls.enable_array_filtering()
+        filter_properties = {'instance_type': {'memory_mb': 1024}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024,
+                 'ram_allocation_ratio': 1.0})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_ram_mb': -1024, 'total_usable_ram_mb': 2048,
+                 'ram_allocation_ratio': 2.0})
+        host3 = fakes.FakeHostState('host3', 'node3',
+                {'free_ram_mb': 512, 'total_usable_ram_mb': 512,
+                 'ram_allocation_ratio': 2.0})
+        self.assertEqual([host2],
+                         list(self.filt_cls.filter_all([host1, host2, host3],
+                                                       filter_properties)))
+        self.assertEqual(2048 * 2.0, host2.limits['memory_mb'])
+
 
 @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
 class TestAggregateRamFilter(test.NoDBTestCase):
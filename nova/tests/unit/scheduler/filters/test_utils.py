@@ -88,6 +88,28 @@ class TestUtils(test.NoDBTestCase):
 
         self.assertEqual({}, metadata)
 
+    def test_aggregates_cache_key(self):
+        host_state = fakes.FakeHostState(
+            'fake', 'node', {'aggregates': _AGGREGATE_FIXTURES})
+        other_host_state = fakes.FakeHostState(
+            'other', 'node', {'aggregates': _AGGREGATE_FIXTURES[::-1]})
+
+        key = utils.aggregates_cache_key(host_state)
+
+        self.assertEqual(frozenset([1, 2, 3]), key)
+        self.assertEqual(key, utils.aggregates_cache_key(other_host_state))
+
+    def test_make_hashable(self):
+        value = {'a': ['1', {'b': set(['2'])}], 'c': None}
+
+        key = utils.make_hashable(value)
+
+        self.assertEqual(hash(key), hash(utils.make_hashable(dict(value))))
+        self.assertEqual(
+            frozenset([('a', ('1', frozenset([('b', frozenset(['2']))]))),
+                       ('c', None)]), key)
+        self.assertNotEqual(key, utils.make_hashable({'a': ['1']}))
+
     def test_validate_num_values(self):
         f = utils.validate_num_values
 
@@ -348,3 +348,65 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that the consumed hosts have chance to be reverted.
                 for host in consumed_hosts:
                     self.assertIsNone(host.obj.updated)
+
+    def _schedule_ram_hosts(self, num_instances, free_ram_mbs):
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                     {'free_ram_mb': free_ram_mb})
+                 for i, free_ram_mb in enumerate(free_ram_mbs)]
+        self.driver.host_manager.weighers = [weights.ram.RAMWeigher()]
+
+        def _fake_consume(host_state, instance):
+            host_state.free_ram_mb -= instance['memory_mb']
+
+        def _fake_get_filtered_hosts(hosts, filter_properties, index):
+            return [host for host in hosts if host.free_ram_mb >= 512]
+
+        instance_properties = {'project_id': 1,
+                               'root_gb': 1,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux',
+                               'uuid': 'fake-uuid'}
+        request_spec = dict(instance_properties=instance_properties,
+                            instance_type={}, num_instances=num_instances)
+        with test.nested(
+                mock.patch.object(self.driver, '_get_all_host_states',
+                                  return_value=hosts),
+                mock.patch.object(self.driver.host_manager,
+                                  'get_filtered_hosts',
+                                  side_effect=_fake_get_filtered_hosts),
+                mock.patch.object(host_manager.HostState,
+                                  'consume_from_instance', autospec=True,
+                                  side_effect=_fake_consume)
+        ) as (_get_all, mock_filter, _consume):
+            selected = self.driver._schedule(self.context, request_spec, {})
+        return [weighed.obj.host for weighed in selected], mock_filter
+
+    def test_schedule_incremental_multi_instance_same_hosts(self):
+        free_ram_mbs = [2048, 1024, 4096, 1536, 1024]
+        legacy, _filter = self._schedule_ram_hosts(8, free_ram_mbs)
+
+        self.flags(scheduler_incremental_multi_instance=True)
+        incremental, mock_filter = self._schedule_ram_hosts(8, free_ram_mbs)
+
+        self.assertEqual(legacy, incremental)
+        self.assertEqual(8, len(incremental))
+        # All the hosts are only filtered once, then only the chosen one
+        self.assertEqual(5, len(mock_filter.call_args_list[0][0][0]))
+        for call in mock_filter.call_args_list[1:]:
+            self.assertEqual(1, len(call[0][0]))
+
+    def test_schedule_incremental_multi_instance_not_enough_hosts(self):
+        self.flags(scheduler_incremental_multi_instance=True)
+        selected, _filter = self._schedule_ram_hosts(5, [1024, 512])
+
+        self.assertEqual(['host0', 'host0', 'host1'], selected)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler,
+                       '_schedule_incrementally')
+    def test_schedule_incremental_single_instance(self, mock_incr):
+        self.flags(scheduler_incremental_multi_instance=True)
+        selected, _filter = self._schedule_ram_hosts(1, [1024])
+        self.assertEqual(['host0'], selected)
+        self.assertFalse(mock_incr.called)
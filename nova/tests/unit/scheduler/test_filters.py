@@ -277,3 +277,27 @@ class FiltersTestCase(test.NoDBTestCase):
             self.assertIn("with reservation ID '%s'" % fake_res_id, cargs)
             self.assertIn("and instance ID '%s'" % fake_uuid, cargs)
             self.assertIn(exp_output, cargs)
+
+    def test_get_filtered_objects_no_full_results_without_debug(self):
+        LOG = filters.LOG
+
+        class FilterA(filters.BaseFilter):
+            def filter_all(self, list_objs, filter_properties):
+                # return all but the first object
+                return list_objs[1:]
+
+        class FilterB(filters.BaseFilter):
+            def filter_all(self, list_objs, filter_properties):
+                # return an empty list
+                return []
+
+        all_filters = [FilterA(), FilterB()]
+        hosts = ["Host0", "Host1", "Host2"]
+        with mock.patch.object(LOG, "isEnabledFor", return_value=False):
+            with mock.patch.object(LOG, "debug") as mock_log:
+                result = self.filter_handler.get_filtered_objects(
+                        all_filters, hosts, {})
+        self.assertFalse(result)
+        # Only the filter which removed all the hosts is recorded
+        cargs = mock_log.call_args[0][0]
+        self.assertIn("[('FilterB', None)]", cargs)
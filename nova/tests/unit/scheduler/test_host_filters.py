@@ -15,6 +15,8 @@
 Tests For Scheduler Host Filters.
 """
 
+import mock
+
 from nova.scheduler import filters
 from nova.scheduler.filters import all_hosts_filter
 from nova.scheduler.filters import compute_filter
@@ -22,6 +24,17 @@ from nova import test
 from nova.tests.unit.scheduler import fakes
 
 
+class FakeCachedFilter(filters.BaseHostFilter):
+    def get_request_cache_key(self, filter_properties):
+        return filter_properties.get('key')
+
+    def get_host_cache_key(self, host_state):
+        return host_state.service.get('key')
+
+    def host_passes(self, host_state, filter_properties):
+        return host_state.host != 'host2'
+
+
 class HostFiltersTestCase(test.NoDBTestCase):
 
     def test_filter_handler(self):
@@ -36,3 +49,53 @@ class HostFiltersTestCase(test.NoDBTestCase):
         filt_cls = all_hosts_filter.AllHostsFilter()
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertTrue(filt_cls.host_passes(host, {}))
+
+    def _get_cached_filter_hosts(self):
+        return [fakes.FakeHostState('host%d' % i, 'node', {'service': {
+                    'key': key}})
+                for i, key in enumerate(['a', 'a', 'b', None])]
+
+    def test_filter_all_result_cache_disabled(self):
+        filt_cls = FakeCachedFilter()
+        hosts = self._get_cached_filter_hosts()
+        with mock.patch.object(filt_cls, 'host_passes',
+                               return_value=True) as mock_passes:
+            result = list(filt_cls.filter_all(hosts, {'key': 'x'}))
+        self.assertEqual(hosts, result)
+        self.assertEqual(4, mock_passes.call_count)
+
+    def test_filter_all_result_cache(self):
+        filt_cls = FakeCachedFilter()
+        filt_cls.enable_result_cache(10)
+        hosts = self._get_cached_filter_hosts()
+        with mock.patch.object(filt_cls, 'host_passes',
+                               side_effect=[True, False, True,
+                                            True]) as mock_passes:
+            result = list(filt_cls.filter_all(hosts, {'key': 'x'}))
+            # host1 reuses the result of host0, host3 has no host key
+            self.assertEqual([hosts[0], hosts[1], hosts[3]], result)
+            self.assertEqual([mock.call(hosts[i], {'key': 'x'})
+                              for i in (0, 2, 3)],
+                             mock_passes.call_args_list)
+
+            # Another request with the same key only evaluates host3
+            result = list(filt_cls.filter_all(hosts, {'key': 'x'}))
+            self.assertEqual([hosts[0], hosts[1], hosts[3]], result)
+            self.assertEqual(4, mock_passes.call_count)
+
+    def test_filter_all_result_cache_no_request_key(self):
+        filt_cls = FakeCachedFilter()
+        filt_cls.enable_result_cache(10)
+        hosts = self._get_cached_filter_hosts()
+        result = list(filt_cls.filter_all(hosts, {}))
+        self.assertEqual([hosts[0], hosts[1], hosts[3]], result)
+        self.assertEqual({}, filt_cls._result_cache)
+
+    def test_filter_all_result_cache_full(self):
+        filt_cls = FakeCachedFilter()
+        filt_cls.enable_result_cache(1)
+        hosts = self._get_cached_filter_hosts()
+        list(filt_cls.filter_all(hosts, {'key': 'x'}))
+        self.assertEqual({('x', 'b'): False}, filt_cls._result_cache)
+        filt_cls.clear_result_cache()
+        self.assertEqual({}, filt_cls._result_cache)
@@ -83,13 +83,29 @@ class HostManagerTestCase(test.NoDBTestCase):
                                         mock_get_by_filters):
         mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
         cn_list = objects.ComputeNodeList()
-        for num in range(22):
+        for num in range(220):
             host_name = 'host_%s' % num
             cn_list.objects.append(objects.ComputeNode(host=host_name))
         mock_get_all.return_value = cn_list
         self.host_manager._init_instance_info()
         self.assertEqual(mock_get_by_filters.call_count, 3)
 
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
+    @mock.patch('nova.utils.spawn_n')
+    def test_init_instance_info_batches_by_host(self, mock_spawn,
+                                                mock_get_all,
+                                                mock_get_by_filters):
+        mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
+        cn_list = objects.ComputeNodeList(objects=[
+            objects.ComputeNode(host='host1', hypervisor_hostname='node%s' % i)
+            for i in range(150)])
+        mock_get_all.return_value = cn_list
+        mock_get_by_filters.return_value = objects.InstanceList(objects=[])
+        self.host_manager._init_instance_info()
+        mock_get_by_filters.assert_called_once_with(mock.ANY,
+                                                    {'host': ['host1']})
+
     @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
     @mock.patch('nova.utils.spawn_n')
@@ -188,6 +204,39 @@ class HostManagerTestCase(test.NoDBTestCase):
                 ['FakeFilterClass2'])
         self.assertEqual(1, len(host_filters))
         self.assertIsInstance(host_filters[0], FakeFilterClass2)
+        self.assertIsNone(host_filters[0]._result_cache)
+
+    def test_choose_host_filters_result_cache(self):
+        self.flags(scheduler_filter_cache_size=100)
+        host_filters = self.host_manager._choose_host_filters(
+                ['FakeFilterClass2'])
+        self.assertEqual({}, host_filters[0]._result_cache)
+        self.assertEqual(100, host_filters[0]._result_cache_size)
+
+    @mock.patch.object(FakeFilterClass2, 'supports_array_filtering',
+                       return_value=True)
+    def test_choose_host_filters_array(self, mock_supports):
+        self.flags(scheduler_use_array_filters=True)
+        host_filters = self.host_manager._choose_host_filters(
+                ['FakeFilterClass1', 'FakeFilterClass2'])
+        # The filters evaluated on arrays run first
+        self.assertIsInstance(host_filters[0], FakeFilterClass2)
+        self.assertIsInstance(host_filters[1], FakeFilterClass1)
+        self.assertTrue(host_filters[0]._array_filtering)
+
+    @mock.patch.object(filters.BaseHostFilter, 'clear_result_cache')
+    def test_update_aggregates_clears_filter_result_caches(self, mock_clear):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'])
+        self.host_manager.update_aggregates([fake_agg])
+        self.assertEqual(len(self.host_manager.filter_obj_map),
+                         mock_clear.call_count)
+
+    @mock.patch.object(filters.BaseHostFilter, 'clear_result_cache')
+    def test_delete_aggregate_clears_filter_result_caches(self, mock_clear):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'])
+        self.host_manager.delete_aggregate(fake_agg)
+        self.assertEqual(len(self.host_manager.filter_obj_map),
+                         mock_clear.call_count)
 
     def _mock_get_filtered_hosts(self, info):
         info['got_objs'] = []
@@ -484,6 +533,96 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([], host_state.aggregates)
 
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_updated_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    @mock.patch.object(objects.ServiceList, 'get_by_binary')
+    def test_get_all_host_states_incremental(self, svc_get_by_binary,
+                                             cn_get_all, cn_get_updated,
+                                             update_from_cn,
+                                             mock_get_by_host):
+        self.flags(scheduler_host_state_full_sync_interval=600)
+        svc_get_by_binary.return_value = [objects.Service(host='fake'),
+                                          objects.Service(host='other')]
+        cn_fake = objects.ComputeNode(host='fake', hypervisor_hostname='fake',
+                                      deleted=False)
+        cn_other = objects.ComputeNode(host='other',
+                                       hypervisor_hostname='other',
+                                       deleted=False)
+        cn_get_all.return_value = [cn_fake, cn_other]
+        mock_get_by_host.return_value = objects.InstanceList()
+        hm = self.host_manager
+
+        hm.get_all_host_states('fake-context')
+        cn_get_all.assert_called_once_with('fake-context')
+        self.assertEqual(2, len(hm.host_state_map))
+        last_sync = hm._last_sync
+
+        # Only the node which changed is refreshed from the DB
+        for host_state in hm.host_state_map.values():
+            host_state.updated = last_sync
+        cn_other_updated = objects.ComputeNode(host='other',
+                                               hypervisor_hostname='other',
+                                               deleted=False)
+        cn_get_updated.return_value = [cn_other_updated]
+        update_from_cn.reset_mock()
+
+        hm.get_all_host_states('fake-context')
+        self.assertEqual(1, cn_get_all.call_count)
+        cn_get_updated.assert_called_once_with(
+            'fake-context', last_sync - host_manager.HOST_STATE_SYNC_OVERLAP)
+        update_from_cn.assert_called_once_with(cn_other_updated)
+        self.assertEqual(2, len(hm.host_state_map))
+
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_updated_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    @mock.patch.object(objects.ServiceList, 'get_by_binary')
+    def test_get_all_host_states_incremental_deleted_and_reset(
+            self, svc_get_by_binary, cn_get_all, cn_get_updated,
+            update_from_cn, mock_get_by_host):
+        self.flags(scheduler_host_state_full_sync_interval=600)
+        svc_get_by_binary.return_value = [objects.Service(host='fake'),
+                                          objects.Service(host='other')]
+        cn_fake = objects.ComputeNode(host='fake', hypervisor_hostname='fake',
+                                      deleted=False)
+        cn_other = objects.ComputeNode(host='other',
+                                       hypervisor_hostname='other',
+                                       deleted=False)
+        cn_get_all.return_value = [cn_fake, cn_other]
+        mock_get_by_host.return_value = objects.InstanceList()
+        hm = self.host_manager
+        hm.get_all_host_states('fake-context')
+
+        # A failed schedule resets the updated time of the HostState, which
+        # needs to be refreshed from the cached compute node.
+        hm.host_state_map[('fake', 'fake')].updated = None
+        cn_get_updated.return_value = [
+            objects.ComputeNode(host='other', hypervisor_hostname='other',
+                                deleted=True)]
+        update_from_cn.reset_mock()
+
+        hm.get_all_host_states('fake-context')
+        update_from_cn.assert_called_once_with(cn_fake)
+        self.assertEqual([('fake', 'fake')], list(hm.host_state_map.keys()))
+
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_updated_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    def test_get_compute_nodes_full_sync_after_interval(self, cn_get_all,
+                                                        cn_get_updated):
+        self.flags(scheduler_host_state_full_sync_interval=600)
+        cn_get_all.return_value = []
+        hm = self.host_manager
+        hm._get_compute_nodes('fake-context')
+        hm._last_full_sync -= datetime.timedelta(seconds=601)
+
+        compute_nodes, changed_keys = hm._get_compute_nodes('fake-context')
+        self.assertEqual(2, cn_get_all.call_count)
+        self.assertFalse(cn_get_updated.called)
+        self.assertIsNone(changed_keys)
+
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
     @mock.patch('nova.objects.InstanceList.get_by_host')
@@ -674,6 +813,34 @@ class HostManagerTestCase(test.NoDBTestCase):
                 'fake_context', host_name)
         self.assertFalse(new_info['updated'])
 
+    def _test_sync_instance_info_digest(self, compute_uuids):
+        self.host_manager._recreate_instance_info = mock.MagicMock()
+        host_name = 'fake_host'
+        inst1 = fake_instance.fake_instance_obj('fake_context', uuid='aaa',
+                                                host=host_name)
+        inst2 = fake_instance.fake_instance_obj('fake_context', uuid='bbb',
+                                                host=host_name)
+        self.host_manager._instance_info = {
+                host_name: {
+                    'instances': {inst1.uuid: inst1, inst2.uuid: inst2},
+                    'updated': False,
+                }}
+        self.host_manager.sync_instance_info(
+            'fake_context', host_name, None,
+            instance_digest=utils.get_uuids_digest(compute_uuids))
+        return self.host_manager._instance_info[host_name]
+
+    def test_sync_instance_info_digest(self):
+        new_info = self._test_sync_instance_info_digest(['bbb', 'aaa'])
+        self.assertFalse(self.host_manager._recreate_instance_info.called)
+        self.assertTrue(new_info['updated'])
+
+    def test_sync_instance_info_digest_fail(self):
+        new_info = self._test_sync_instance_info_digest(['bbb', 'aaa', 'new'])
+        self.host_manager._recreate_instance_info.assert_called_once_with(
+                'fake_context', 'fake_host')
+        self.assertFalse(new_info['updated'])
+
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
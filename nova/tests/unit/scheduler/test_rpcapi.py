@@ -16,12 +16,14 @@
 Unit Tests for nova.scheduler.rpcapi
 """
 
+import mock
 from mox3 import mox
 from oslo_config import cfg
 
 from nova import context
 from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova import test
+from nova import utils
 
 CONF = cfg.CONF
 
@@ -95,9 +97,24 @@ class SchedulerRpcAPITestCase(test.NoDBTestCase):
                 fanout=True,
                 version='4.2')
 
+    def _test_sync_instance_info(self, can_send_version, expected_version,
+                                 **expected_kwargs):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = scheduler_rpcapi.SchedulerAPI()
+        with mock.patch.object(rpcapi, 'client') as mock_client:
+            mock_client.can_send_version.return_value = can_send_version
+            rpcapi.sync_instance_info(ctxt, 'fake_host', ['fake1', 'fake2'])
+        mock_client.prepare.assert_called_once_with(version=expected_version,
+                                                    fanout=True)
+        mock_client.prepare.return_value.cast.assert_called_once_with(
+            ctxt, 'sync_instance_info', host_name='fake_host',
+            **expected_kwargs)
+
     def test_sync_instance_info(self):
-        self._test_scheduler_api('sync_instance_info', rpc_method='cast',
-                host_name='fake_host',
-                instance_uuids=['fake1', 'fake2'],
-                fanout=True,
-                version='4.2')
+        self._test_sync_instance_info(
+            True, '4.3',
+            instance_digest=utils.get_uuids_digest(['fake1', 'fake2']))
+
+    def test_sync_instance_info_old_scheduler(self):
+        self._test_sync_instance_info(
+            False, '4.2', instance_uuids=['fake1', 'fake2'])
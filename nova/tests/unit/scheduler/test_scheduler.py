@@ -102,7 +102,18 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                             mock.sentinel.instance_uuids)
             mock_sync.assert_called_once_with(mock.sentinel.context,
                                               mock.sentinel.host_name,
-                                              mock.sentinel.instance_uuids)
+                                              mock.sentinel.instance_uuids,
+                                              instance_digest=None)
+
+    def test_sync_instance_info_digest(self):
+        with mock.patch.object(self.manager.driver.host_manager,
+                               'sync_instance_info') as mock_sync:
+            self.manager.sync_instance_info(
+                mock.sentinel.context, mock.sentinel.host_name,
+                instance_digest=mock.sentinel.instance_digest)
+            mock_sync.assert_called_once_with(
+                mock.sentinel.context, mock.sentinel.host_name, None,
+                instance_digest=mock.sentinel.instance_digest)
 
 
 class SchedulerTestCase(test.NoDBTestCase):
@@ -16,7 +16,11 @@
 Tests For Scheduler RAM weights.
 """
 
+import testtools
+
+from nova.scheduler.filters import utils
 from nova.scheduler import weights
+from nova.scheduler.weights import io_ops
 from nova.scheduler.weights import ram
 from nova import test
 from nova.tests.unit.scheduler import fakes
@@ -109,3 +113,33 @@ class RamWeigherTestCase(test.NoDBTestCase):
         weighed_host = weights[-1]
         self.assertEqual(0, weighed_host.weight)
         self.assertEqual('negative', weighed_host.obj.host)
+
+    @testtools.skipIf(utils.numpy is None, 'NumPy is not installed')
+    def test_array_weighing(self):
+        class DiskWeigher(weights.BaseHostWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return host_state.free_disk_mb
+
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512, 'num_io_ops': 2,
+                                'free_disk_mb': 4096}),
+            ('host2', 'node2', {'free_ram_mb': 1024, 'num_io_ops': 0,
+                                'free_disk_mb': 1024}),
+            ('host3', 'node3', {'free_ram_mb': 1024, 'num_io_ops': 0,
+                                'free_disk_mb': 1024}),
+            ('host4', 'node4', {'free_ram_mb': 8192, 'num_io_ops': 4,
+                                'free_disk_mb': 0})
+        ]
+        hostinfo_list = [fakes.FakeHostState(host, node, values)
+                         for host, node, values in host_values]
+
+        def _weigh(weight_handler):
+            weighers = [ram.RAMWeigher(), io_ops.IoOpsWeigher(),
+                        DiskWeigher()]
+            return [(weighed_host.obj.host, weighed_host.weight)
+                    for weighed_host in weight_handler.get_weighed_objects(
+                        weighers, hostinfo_list, {})]
+
+        array_handler = weights.HostWeightHandler()
+        array_handler.enable_array_weighing()
+        self.assertEqual(_weigh(self.weight_handler), _weigh(array_handler))
@@ -275,3 +275,63 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.executed.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def test_apply_incremental(self):
+        self.executed = []
+        self.manager.execute = self._fake_execute
+        tables = self.manager.ipv4
+        table = tables['filter']
+
+        # The tables must be fully applied first
+        self.assertFalse(self.manager._apply_incremental('iptables', tables))
+        for t in six.itervalues(tables):
+            t.dirty = False
+            t.dirty_chains.clear()
+            t.applied = True
+
+        table.add_chain('sg')
+        table.add_rule('sg', '-s 1.2.3.4/32 -j ACCEPT')
+        table.add_rule('FORWARD', '-j $sg')
+        self.assertTrue(self.manager._apply_incremental('iptables', tables))
+        self.assertEqual(1, len(self.executed))
+        cmd, process_input = self.executed[0]
+        self.assertEqual(('iptables-restore', '-c', '--noflush'), cmd)
+        self.assertEqual(['*filter',
+                          ':%s-FORWARD - [0:0]' % self.binary_name,
+                          ':%s-sg - [0:0]' % self.binary_name,
+                          '[0:0] -A %s-FORWARD -j %s-sg' % (
+                              self.binary_name, self.binary_name),
+                          '[0:0] -A %s-sg -s 1.2.3.4/32 -j ACCEPT' % (
+                              self.binary_name),
+                          'COMMIT'], process_input.split('\n'))
+        self.assertFalse(table.dirty)
+
+        self.executed = []
+        table.remove_chain('sg')
+        self.assertTrue(self.manager._apply_incremental('iptables', tables))
+        cmd, process_input = self.executed[0]
+        self.assertEqual(['*filter',
+                          ':%s-FORWARD - [0:0]' % self.binary_name,
+                          ':%s-sg - [0:0]' % self.binary_name,
+                          '-X %s-sg' % self.binary_name,
+                          'COMMIT'], process_input.split('\n'))
+
+        # Changes to the unwrapped chains need the whole tables applied
+        self.executed = []
+        table.add_rule('FORWARD', '-j ACCEPT', wrap=False)
+        self.assertFalse(self.manager._apply_incremental('iptables', tables))
+        self.assertEqual([], self.executed)
+
+    def test_remove_rules_hash_based(self):
+        current_lines = list(self.sample_filter)
+        current_lines[12:12] = ['[5:10] -A FORWARD -j ACCEPT'] * 2
+        table = self.manager.ipv4['filter']
+        table.add_rule('FORWARD', '-j ACCEPT', wrap=False)
+        table.remove_rule('FORWARD', '-j ACCEPT', wrap=False)
+        new_lines = self.manager._modify_rules(current_lines, table, 'filter')
+        self.assertNotIn('[5:10] -A FORWARD -j ACCEPT', new_lines)
+        self.assertEqual([], table.remove_rules)
@@ -383,6 +383,27 @@ class DBCommandsTestCase(test.TestCase):
     def test_archive_deleted_rows_negative(self):
         self.assertEqual(1, self.commands.archive_deleted_rows(-1))
 
+    @mock.patch.object(db, 'archive_deleted_rows', return_value=10)
+    def test_archive_deleted_rows(self, mock_archive):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        self.commands.archive_deleted_rows('10')
+        mock_archive.assert_called_once_with(mock.ANY, 10)
+        self.assertIn('Archived 10 rows', sys.stdout.getvalue())
+
+    @mock.patch('time.sleep')
+    @mock.patch.object(db, 'archive_deleted_rows', side_effect=[10, 10, 3, 0])
+    def test_archive_deleted_rows_until_complete(self, mock_archive,
+                                                 mock_sleep):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        self.commands.archive_deleted_rows(10, until_complete=True,
+                                           sleep='0.5')
+        self.assertEqual([mock.call(mock.ANY, 10)] * 4,
+                         mock_archive.call_args_list)
+        self.assertEqual([mock.call(0.5)] * 3, mock_sleep.call_args_list)
+        output = sys.stdout.getvalue()
+        self.assertIn('Archived 20 rows so far', output)
+        self.assertIn('Archived 23 rows in', output)
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
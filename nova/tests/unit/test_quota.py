@@ -16,6 +16,8 @@
 
 import datetime
 
+import eventlet
+import mock
 from oslo_config import cfg
 from oslo_utils import timeutils
 from six.moves import range
@@ -2347,6 +2349,92 @@ class DbQuotaDriverTestCase(test.TestCase):
         self.assertEqual(calls, exemplar)
 
 
+class CoalescingDbQuotaDriverTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CoalescingDbQuotaDriverTestCase, self).setUp()
+        self.flags(quota_reserve_coalesce_window=0)
+        self.driver = quota.CoalescingDbQuotaDriver()
+        self.context = FakeContext('test_project', 'test_class')
+
+    def _reserve(self, deltas):
+        return self.driver._reserve(self.context, 'resources', 'quotas',
+                                    'user_quotas', deltas, 'expire',
+                                    'test_project', 'fake_user')
+
+    def _request(self, deltas):
+        return {'project_quotas': 'quotas', 'user_quotas': 'user_quotas',
+                'deltas': deltas, 'expire': 'expire'}
+
+    @mock.patch.object(db, 'quota_reserve_multi')
+    def test_reserve_coalesced(self, mock_reserve):
+        overquota = exception.OverQuota(overs=['instances'], quotas={},
+                                        usages={})
+        mock_reserve.return_value = [['resv-1'], overquota, ['resv-3']]
+        threads = [eventlet.spawn(self._reserve, dict(instances=i))
+                   for i in range(3)]
+
+        self.assertEqual(['resv-1'], threads[0].wait())
+        self.assertRaises(exception.OverQuota, threads[1].wait)
+        self.assertEqual(['resv-3'], threads[2].wait())
+        mock_reserve.assert_called_once_with(
+            self.context, 'resources',
+            [self._request(dict(instances=i)) for i in range(3)], 0, 0,
+            project_id='test_project', user_id='fake_user')
+        self.assertEqual({}, self.driver._pending)
+
+    @mock.patch.object(db, 'quota_reserve_multi',
+                       side_effect=[[['resv-1']], [['resv-2']]])
+    def test_reserve_sequential(self, mock_reserve):
+        self.assertEqual(['resv-1'], self._reserve(dict(instances=1)))
+        self.assertEqual(['resv-2'], self._reserve(dict(instances=1)))
+        self.assertEqual(2, mock_reserve.call_count)
+
+    @mock.patch.object(db, 'quota_reserve_multi',
+                       side_effect=exception.QuotaResourceUnknown(
+                           unknown=['foo']))
+    def test_reserve_coalesced_failure(self, mock_reserve):
+        threads = [eventlet.spawn(self._reserve, dict(instances=i))
+                   for i in range(2)]
+
+        for thread in threads:
+            self.assertRaises(exception.QuotaResourceUnknown, thread.wait)
+        self.assertEqual(1, mock_reserve.call_count)
+        self.assertEqual({}, self.driver._pending)
+
+    @mock.patch.object(db, 'quota_reserve', return_value=['resv-2'])
+    @mock.patch.object(db, 'quota_reserve_multi')
+    def test_reserve_leader_interrupted(self, mock_reserve_multi,
+                                        mock_reserve):
+        self.flags(quota_reserve_coalesce_window=10)
+        leader = eventlet.spawn(self._reserve, dict(instances=1))
+        eventlet.sleep(0)
+        follower = eventlet.spawn(self._reserve, dict(instances=2))
+        eventlet.sleep(0)
+
+        leader.kill()
+        self.assertEqual(['resv-2'], follower.wait())
+        self.assertFalse(mock_reserve_multi.called)
+        mock_reserve.assert_called_once_with(
+            self.context, 'resources', 'quotas', 'user_quotas',
+            dict(instances=2), 'expire', 0, 0, project_id='test_project',
+            user_id='fake_user')
+        self.assertEqual({}, self.driver._pending)
+
+    @mock.patch.object(db, 'quota_reserve_multi',
+                       side_effect=[[['resv-1']], [['resv-2']]])
+    def test_reserve_other_context_not_coalesced(self, mock_reserve):
+        admin_context = self.context.elevated()
+        threads = [
+            eventlet.spawn(self._reserve, dict(instances=1)),
+            eventlet.spawn(self.driver._reserve, admin_context, 'resources',
+                           'quotas', 'user_quotas', dict(instances=1),
+                           'expire', 'test_project', 'fake_user')]
+
+        self.assertEqual(['resv-1'], threads[0].wait())
+        self.assertEqual(['resv-2'], threads[1].wait())
+        self.assertEqual(2, mock_reserve.call_count)
+
+
 class FakeSession(object):
     def begin(self):
         return self
@@ -220,6 +220,15 @@ class GenericUtilsTestCase(test.NoDBTestCase):
         self.assertEqual(
             value, utils.get_hash_str(base_unicode))
 
+    def test_get_uuids_digest(self):
+        digest = utils.get_uuids_digest(['fake1', u'fake2'])
+        self.assertEqual(digest, utils.get_uuids_digest(['fake2', 'fake1']))
+        self.assertTrue(digest.startswith('2-'))
+        self.assertNotEqual(digest, utils.get_uuids_digest(['fake1']))
+        self.assertNotEqual(digest,
+                            utils.get_uuids_digest(['fake1', 'fake3']))
+        self.assertEqual('0-%032x' % 0, utils.get_uuids_digest([]))
+
     def test_use_rootwrap(self):
         self.flags(disable_rootwrap=False, group='workarounds')
         self.flags(rootwrap_config='foo')
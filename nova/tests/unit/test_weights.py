@@ -71,3 +71,59 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_weigh_objects_records_min_and_max(self):
+        class FakeWeigher(weights.BaseWeigher):
+            minval = 0
+
+            def _weigh_object(self, obj, weight_properties):
+                return obj
+
+        weigher = FakeWeigher()
+        weighed_objs = [weights.WeighedObject(obj, 0.0)
+                        for obj in (20.0, -5.0, 50.0)]
+        self.assertEqual([20.0, -5.0, 50.0],
+                         weigher.weigh_objects(weighed_objs, {}))
+        self.assertEqual(-5.0, weigher.minval)
+        self.assertEqual(50.0, weigher.maxval)
+
+    def test_weight_multiplier_looked_up_once(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 1024}),
+            ('host3', 'node3', {'free_ram_mb': 2048}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weigher = scheduler_weights.ram.RAMWeigher()
+        with mock.patch.object(weigher, 'weight_multiplier',
+                               return_value=2.0) as mock_multiplier:
+            weighed_hosts = weight_handler.get_weighed_objects(
+                [weigher], hostinfo, {})
+        self.assertEqual(1, mock_multiplier.call_count)
+        self.assertEqual(['host3', 'host2', 'host1'],
+                         [weighed.obj.host for weighed in weighed_hosts])
+        self.assertEqual(2.0, weighed_hosts[0].weight)
+
+    def test_get_weighed_object(self):
+        host_values = [
+            ('host1', 'node1', {'free_ram_mb': 512}),
+            ('host2', 'node2', {'free_ram_mb': 1024}),
+        ]
+        hostinfo = [fakes.FakeHostState(host, node, values)
+                    for host, node, values in host_values]
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [scheduler_weights.ram.RAMWeigher()]
+        weight_handler.get_weighed_objects(weighers, hostinfo, {})
+
+        hostinfo[1].free_ram_mb = 256
+        weighed_host = weight_handler.get_weighed_object(weighers,
+                                                         hostinfo[1], {})
+        self.assertEqual(0.25, weighed_host.weight)
+
+        # The range of the weigher changes, all the hosts need to be weighed
+        hostinfo[1].free_ram_mb = 2048
+        self.assertIsNone(weight_handler.get_weighed_object(weighers,
+                                                            hostinfo[1], {}))
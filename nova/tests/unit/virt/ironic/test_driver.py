@@ -563,6 +563,20 @@ class IronicDriverTestCase(test.NoDBTestCase):
         expected = [n.instance_uuid for n in nodes]
         self.assertEqual(sorted(expected), sorted(uuids))
 
+    def test_list_instance_uuids_on_node(self):
+        instance_uuid = uuidutils.generate_uuid()
+        node = ironic_utils.get_test_node(instance_uuid=instance_uuid)
+        free_node = ironic_utils.get_test_node(
+            uuid=uuidutils.generate_uuid(), instance_uuid=None)
+        self.driver.node_cache = {node.uuid: node,
+                                  free_node.uuid: free_node}
+        self.assertEqual([instance_uuid],
+                         self.driver.list_instance_uuids_on_node(node.uuid))
+        self.assertEqual([], self.driver.list_instance_uuids_on_node(
+            free_node.uuid))
+        self.assertEqual([], self.driver.list_instance_uuids_on_node(
+            'unknown-node'))
+
     @mock.patch.object(FAKE_CLIENT.node, 'list')
     @mock.patch.object(FAKE_CLIENT.node, 'get')
     def test_node_is_available_empty_cache_empty_list(self, mock_get,
@@ -687,6 +701,47 @@ class IronicDriverTestCase(test.NoDBTestCase):
         expected_uuids = [n['uuid'] for n in node_dicts]
         self.assertEqual(sorted(expected_uuids), sorted(available_nodes))
 
+    @mock.patch.object(FAKE_CLIENT.node, 'get')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    def test_get_available_nodes_incremental_refresh(self, mock_list,
+                                                     mock_get):
+        self.flags(node_cache_full_refresh_interval=600, group='ironic')
+        node1 = ironic_utils.get_test_node(
+            uuid=uuidutils.generate_uuid(),
+            updated_at='2015-10-01T10:00:00+00:00')
+        node2 = ironic_utils.get_test_node(
+            uuid=uuidutils.generate_uuid(),
+            updated_at='2015-10-01T11:00:00+00:00')
+        node1_updated = ironic_utils.get_test_node(
+            uuid=node1.uuid, power_state=ironic_states.POWER_ON,
+            updated_at='2015-10-01T12:00:00+00:00')
+        new_node = ironic_utils.get_test_node(uuid=uuidutils.generate_uuid())
+
+        def fake_list(detail=False, limit=None, **kwargs):
+            if not detail:
+                # node2 was deleted
+                return [node1_updated, new_node]
+            if 'sort_key' in kwargs:
+                return [node1_updated, node2]
+            return [node1, node2]
+
+        mock_list.side_effect = fake_list
+        mock_get.return_value = new_node
+        self.driver.get_available_nodes()
+        available_nodes = self.driver.get_available_nodes()
+
+        self.assertEqual(sorted([node1.uuid, new_node.uuid]),
+                         sorted(available_nodes))
+        self.assertEqual(node1_updated, self.driver.node_cache[node1.uuid])
+        mock_get.assert_called_once_with(new_node.uuid)
+        mock_list.assert_any_call(
+            detail=True, limit=ironic_driver._NODE_CACHE_PAGE_SIZE,
+            marker=None, sort_key='updated_at', sort_dir='desc')
+        stats = self.driver._get_node_cache_stats()
+        self.assertEqual(1, stats['full_refreshes'])
+        self.assertEqual(1, stats['incremental_refreshes'])
+        self.assertEqual(5, stats['nodes_fetched'])
+
     @mock.patch.object(FAKE_CLIENT.node, 'get')
     @mock.patch.object(FAKE_CLIENT.node, 'list')
     @mock.patch.object(ironic_driver.IronicDriver, '_node_resource')
@@ -745,6 +800,56 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                                num_cpu=properties['cpus']),
                          result)
 
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    def test_get_info_from_cache(self, mock_gbiu, mock_list):
+        self.flags(node_cache_max_age=600, group='ironic')
+        properties = {'memory_mb': 512, 'cpus': 2}
+        node = ironic_utils.get_test_node(instance_uuid=self.instance_uuid,
+                                          properties=properties,
+                                          power_state=ironic_states.POWER_ON)
+        mock_list.return_value = [node]
+        # populate the cache
+        self.driver.get_available_nodes()
+
+        instance = fake_instance.fake_instance_obj('fake-context',
+                                                   uuid=self.instance_uuid,
+                                                   node=node.uuid)
+        result = self.driver.get_info(instance)
+
+        self.assertEqual(nova_states.RUNNING, result.state)
+        self.assertTrue(self.driver.instance_exists(instance))
+        self.assertFalse(mock_gbiu.called)
+        self.assertEqual(2, self.driver._get_node_cache_stats()['hits'])
+
+    @mock.patch.object(loopingcall, 'FixedIntervalLoopingCall')
+    @mock.patch.object(FAKE_CLIENT.node, 'set_power_state')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    def test_get_info_after_power_off(self, mock_gbiu, mock_list, mock_sp,
+                                      mock_looping):
+        self.flags(node_cache_max_age=600, group='ironic')
+        node = ironic_utils.get_test_node(instance_uuid=self.instance_uuid,
+                                          power_state=ironic_states.POWER_ON)
+        node_off = ironic_utils.get_test_node(
+            uuid=node.uuid, instance_uuid=self.instance_uuid,
+            power_state=ironic_states.POWER_OFF)
+        mock_list.return_value = [node]
+        mock_gbiu.return_value = node_off
+        mock_looping.return_value = FakeLoopingCall()
+        # populate the cache
+        self.driver.get_available_nodes()
+
+        instance = fake_instance.fake_instance_obj('fake-context',
+                                                   uuid=self.instance_uuid,
+                                                   node=node.uuid)
+        self.driver.power_off(instance)
+        result = self.driver.get_info(instance)
+
+        self.assertEqual(nova_states.SHUTDOWN, result.state)
+        self.assertNotIn(node.uuid, self.driver.node_cache)
+        self.assertEqual(2, mock_gbiu.call_count)
+
     @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
     def test_get_info_http_not_found(self, mock_gbiu):
         mock_gbiu.side_effect = ironic_exception.NotFound()
@@ -46,8 +46,8 @@ def get_test_node(**kw):
                 'reservation': kw.get('reservation'),
                 'maintenance': kw.get('maintenance', False),
                 'extra': kw.get('extra', {}),
-                'updated_at': kw.get('created_at'),
-                'created_at': kw.get('updated_at')})()
+                'updated_at': kw.get('updated_at'),
+                'created_at': kw.get('created_at')})()
 
 
 def get_test_port(**kw):
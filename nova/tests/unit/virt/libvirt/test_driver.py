@@ -644,6 +644,15 @@ class LibvirtConnTestCase(test.NoDBTestCase):
         drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
         drvr.init_host("dummyhost")
 
+    @mock.patch.object(utils, 'spawn_n')
+    @mock.patch.object(host.Host, "has_min_version", return_value=True)
+    def test_init_host_prefetch_images(self, mock_version, mock_spawn):
+        self.flags(prefetch_image_ids=['image1', 'image2'], group='libvirt')
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        drvr.init_host("dummyhost")
+        mock_spawn.assert_called_once_with(drvr.prefetch_images, mock.ANY,
+                                           ['image1', 'image2'])
+
     @mock.patch.object(host.Host, "has_min_version")
     def test_min_version_start_abort(self, mock_version):
         mock_version.return_value = False
@@ -12338,6 +12347,28 @@ class HostStateTestCase(test.NoDBTestCase):
                         matchers.DictMatches(
                                 HostStateTestCase.numa_topology._to_dict()))
 
+    @mock.patch.object(fakelibvirt, "openAuth")
+    def test_update_status_cached_inventory(self, mock_open):
+        self.flags(inventory_cache_max_age=600, group='libvirt')
+        mock_open.return_value = fakelibvirt.Connection("qemu:///system")
+        drvr = HostStateTestCase.FakeConnection()
+
+        with contextlib.nested(
+                mock.patch.object(drvr._host, 'get_domain_generation',
+                                  side_effect=[1, 1, 2]),
+                mock.patch.object(drvr, '_get_disk_over_committed_size_total',
+                                  return_value=0),
+                mock.patch.object(drvr, '_get_pci_passthrough_devices',
+                                  return_value='[]'),
+        ) as (mock_generation, mock_disk, mock_pci):
+            for _i in range(3):
+                drvr.get_available_resource("compute1")
+
+        # Recomputed when the domain generation changed
+        self.assertEqual(2, mock_disk.call_count)
+        # Without node device events, only expires with its age
+        self.assertEqual(1, mock_pci.call_count)
+
 
 class LibvirtDriverTestCase(test.NoDBTestCase):
     """Test for nova.virt.libvirt.libvirt_driver.LibvirtDriver."""
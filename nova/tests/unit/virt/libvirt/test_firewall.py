@@ -420,6 +420,50 @@ class IptablesFirewallTestCase(test.NoDBTestCase):
                                                    any_order=True)
             self.assertEqual(0, mock_filter.add_chain.call_count)
 
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_refresh_security_group_coalesced(self, mock_spawn_after):
+        self.flags(firewall_refresh_delay=2)
+        with test.nested(
+            mock.patch.object(self.fw, 'do_refresh_security_group_rules'),
+            mock.patch.object(self.fw.iptables, 'apply')
+        ) as (mock_refresh, mock_apply):
+            self.fw.refresh_security_group_members('sg1')
+            self.fw.refresh_security_group_rules('sg2')
+            self.fw.refresh_security_group_members('sg1')
+            mock_spawn_after.assert_called_once_with(
+                2, self.fw._do_pending_refreshes)
+            self.assertFalse(mock_refresh.called)
+
+            self.fw._do_pending_refreshes()
+            mock_refresh.assert_called_once_with(set(['sg1', 'sg2']))
+            mock_apply.assert_called_once_with()
+
+        self.assertIsNone(self.fw._member_ips)
+        self.assertEqual({'requests': 3, 'refreshes': 1,
+                          'coalescing_ratio': 3.0},
+                         self.fw.get_refresh_stats())
+
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_refresh_security_group_failed_retried(self, mock_spawn_after):
+        self.flags(firewall_refresh_delay=2)
+        with mock.patch.object(self.fw, 'do_refresh_security_group_rules',
+                               side_effect=test.TestingException()):
+            self.fw.refresh_security_group_members('sg1')
+            self.fw._do_pending_refreshes()
+
+        self.assertEqual(set(['sg1']), self.fw._pending_refreshes)
+        self.assertEqual([mock.call(2, self.fw._do_pending_refreshes)] * 2,
+                         mock_spawn_after.call_args_list)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_security_group',
+                       return_value=[])
+    def test_get_member_ips_cached(self, mock_get_by_security_group):
+        secgroup = objects.SecurityGroup(id=1)
+        self.fw._member_ips = {}
+        for _i in range(2):
+            self.assertEqual([], self.fw._get_member_ips(None, secgroup, 4))
+        mock_get_by_security_group.assert_called_once_with(None, secgroup)
+
     @mock.patch.object(fakelibvirt.virConnect, "nwfilterLookupByName")
     @mock.patch.object(fakelibvirt.virConnect, "nwfilterDefineXML")
     @mock.patch.object(objects.InstanceList, "get_by_security_group_id")
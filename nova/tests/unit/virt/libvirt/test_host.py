@@ -164,6 +164,51 @@ class HostTestCase(test.NoDBTestCase):
         mock_spawn_after.assert_called_once_with(
             hostimpl._lifecycle_delay, hostimpl._event_emit, event4)
 
+    @mock.patch.object(greenthread, 'spawn_after')
+    def test_event_dispatch_storm_coalesced(self, mock_spawn_after):
+        got_events = []
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=got_events.append,
+                             coalesce_events=True)
+        hostimpl._init_events_pipe()
+
+        # Replay a storm of events on 20 domains, which end up paused
+        uuids = [str(uuid.uuid4()) for _i in range(20)]
+        for transition in (event.EVENT_LIFECYCLE_STARTED,
+                           event.EVENT_LIFECYCLE_PAUSED,
+                           event.EVENT_LIFECYCLE_RESUMED,
+                           event.EVENT_LIFECYCLE_PAUSED):
+            for instance_uuid in uuids:
+                hostimpl._queue_event(event.LifecycleEvent(instance_uuid,
+                                                           transition))
+        hostimpl._dispatch_events()
+
+        self.assertEqual(uuids, [ev.uuid for ev in got_events])
+        self.assertEqual(set([event.EVENT_LIFECYCLE_PAUSED]),
+                         set(ev.transition for ev in got_events))
+        self.assertFalse(mock_spawn_after.called)
+        stats = hostimpl.get_event_stats()
+        self.assertEqual(20, stats['dispatched'])
+        self.assertEqual(60, stats['coalesced'])
+        self.assertEqual(80, stats['max_queue_depth'])
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertTrue(stats['dispatch_latency_max'] >= 0)
+
+    def test_queue_event_notifies_once(self):
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=lambda e: None)
+        hostimpl._init_events_pipe()
+        hostimpl._event_notify_send = mock.Mock()
+
+        for transition in (event.EVENT_LIFECYCLE_STARTED,
+                           event.EVENT_LIFECYCLE_PAUSED):
+            hostimpl._queue_event(event.LifecycleEvent(
+                "cef19ce0-0ca2-11df-855d-b19fbce37686", transition))
+
+        hostimpl._event_notify_send.write.assert_called_once_with(
+            ' '.encode())
+        self.assertEqual(2, hostimpl.get_event_stats()['queue_depth'])
+
     def test_event_lifecycle(self):
         got_events = []
 
@@ -203,6 +248,25 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(got_events[0].transition,
                          event.EVENT_LIFECYCLE_STOPPED)
 
+    def test_event_lifecycle_domain_generation(self):
+        hostimpl = host.Host("qemu:///system",
+                             lifecycle_event_handler=lambda e: None)
+        self.assertIsNone(hostimpl.get_domain_generation())
+        conn = hostimpl.get_connection()
+        generation = hostimpl.get_domain_generation()
+        self.assertIsNotNone(generation)
+        # fakelibvirt does not send node device events
+        self.assertIsNone(hostimpl.get_device_generation())
+
+        dom = fakelibvirt.Domain(conn, """
+                <domain type='kvm'>
+                  <uuid>cef19ce0-0ca2-11df-855d-b19fbce37686</uuid>
+                </domain>
+            """, False)
+        hostimpl._event_lifecycle_callback(
+            conn, dom, fakelibvirt.VIR_DOMAIN_EVENT_DEFINED, 0, hostimpl)
+        self.assertEqual(generation + 1, hostimpl.get_domain_generation())
+
     def test_event_emit_delayed_call_delayed(self):
         ev = event.LifecycleEvent(
             "cef19ce0-0ca2-11df-855d-b19fbce37686",
@@ -606,6 +670,33 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(doms[2].name(), vm2.name())
         mock_list.assert_called_with(True)
 
+    @mock.patch.object(fakelibvirt, "VIR_DOMAIN_STATS_STATE", 1, create=True)
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats",
+                       create=True)
+    def test_get_domain_states(self, mock_stats):
+        vm0 = FakeVirtDomain(id=0, name="Domain-0")  # Xen dom-0
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        mock_stats.return_value = [(vm0, {'state.state': 1}),
+                                   (vm1, {'state.state': 1}),
+                                   (vm2, {'state.state': 5})]
+
+        states = self.host.get_domain_states()
+
+        mock_stats.assert_called_once_with(1)
+        self.assertEqual({vm1.UUIDString(): 1, vm2.UUIDString(): 5}, states)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    def test_get_domain_states_fallback(self, mock_list):
+        vm1 = mock.Mock(**{'UUIDString.return_value': 'uuid1',
+                           'info.return_value': [1, 2048, 2048, 1, 0]})
+        mock_list.return_value = [vm1]
+
+        # fakelibvirt does not implement getAllDomainStats
+        self.assertEqual({'uuid1': 1}, self.host.get_domain_states())
+        self.assertTrue(self.host._skip_all_domain_stats)
+        mock_list.assert_called_once_with(only_running=False)
+
     def test_cpu_features_bug_1217630(self):
         self.host.get_connection()
 
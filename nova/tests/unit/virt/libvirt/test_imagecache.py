@@ -268,6 +268,50 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         self.assertRaises(processutils.ProcessExecutionError,
                           image_cache_manager._list_backing_images)
 
+    @mock.patch.object(libvirt_utils, 'get_disk_backing_file')
+    def test_list_backing_images_index(self, mock_backing):
+        backing = 'e97222e91fc4241f49a7f520d1dcf446751129b3_sm'
+        mock_backing.return_value = backing
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            index_filename = os.path.join(tmpdir, 'image_cache_index.json')
+            self.flags(image_cache_index_filename=index_filename,
+                       group='libvirt')
+            for instance_name in ('instance-00000001', 'instance-00000002'):
+                os.mkdir(os.path.join(tmpdir, instance_name))
+                with open(os.path.join(tmpdir, instance_name, 'disk'),
+                          'w') as f:
+                    f.write('disk')
+            found = os.path.join(tmpdir, CONF.image_cache_subdirectory_name,
+                                 backing)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.instance_names = self.stock_instance_names
+            self.assertEqual([found],
+                             image_cache_manager._list_backing_images())
+            self.assertEqual(2, mock_backing.call_count)
+            image_cache_manager._save_index()
+
+            # The next run reads the backing files of the same disks from
+            # the persisted index
+            os.remove(os.path.join(tmpdir, 'instance-00000002', 'disk'))
+            mock_backing.reset_mock()
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.instance_names = self.stock_instance_names
+            self.assertEqual([found],
+                             image_cache_manager._list_backing_images())
+            self.assertFalse(mock_backing.called)
+            self.assertEqual(
+                set(['instance-00000001']),
+                image_cache_manager.base_file_users[found])
+            image_cache_manager._save_index()
+
+            with open(index_filename) as f:
+                index = jsonutils.loads(f.read())
+            self.assertEqual(
+                [os.path.join(tmpdir, 'instance-00000001', 'disk')],
+                list(index['disks']))
+
     def test_find_base_file_nothing(self):
         self.stubs.Set(os.path, 'exists', lambda x: False)
 
@@ -942,6 +986,17 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             res = image_cache_manager._verify_checksum(self.img, fname)
             self.assertTrue(res)
 
+    @mock.patch.object(time, 'sleep')
+    def test_hash_file_max_rate(self, mock_sleep):
+        self.flags(checksum_base_images_max_rate=1, group='libvirt')
+        with utils.tempdir() as tmpdir:
+            fname = os.path.join(tmpdir, 'aaa')
+            with open(fname, 'w') as f:
+                f.write('x' * 65536)
+            self.assertEqual(hashlib.sha1('x' * 65536).hexdigest(),
+                             imagecache._hash_file(fname))
+        self.assertEqual(2, mock_sleep.call_count)
+
     def test_verify_checksum_disabled(self):
         self.flags(checksum_base_images=False, group='libvirt')
         with utils.tempdir() as tmpdir:
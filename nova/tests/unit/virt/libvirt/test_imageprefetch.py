@@ -0,0 +1,80 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import mock
+
+from nova import context
+from nova import exception
+from nova import test
+from nova import utils
+from nova.virt.libvirt import imageprefetch
+from nova.virt.libvirt import utils as libvirt_utils
+
+
+class ImagePrefetcherTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ImagePrefetcherTestCase, self).setUp()
+        self.context = context.RequestContext('fake-user', 'fake-project')
+        self.prefetcher = imageprefetch.ImagePrefetcher(2)
+
+    def _fake_fetch_image(self, context, target, image_id, user_id,
+                          project_id):
+        with open(target, 'w') as f:
+            f.write(image_id)
+
+    @mock.patch.object(libvirt_utils, 'fetch_image')
+    def test_prefetch(self, mock_fetch):
+        mock_fetch.side_effect = self._fake_fetch_image
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.assertFalse(self.prefetcher.is_ready('image1'))
+
+            # The second request is deduplicated
+            self.prefetcher.prefetch(self.context, ['image1', 'image2'])
+            self.prefetcher.prefetch(self.context, ['image1'])
+            self.assertEqual(imageprefetch.STATUS_FETCHING,
+                             self.prefetcher.get_status('image1'))
+            self.prefetcher._pool.waitall()
+
+            self.assertEqual(2, mock_fetch.call_count)
+            for image_id in ('image1', 'image2'):
+                self.assertTrue(self.prefetcher.is_ready(image_id))
+                self.assertEqual(imageprefetch.STATUS_READY,
+                                 self.prefetcher.get_status(image_id))
+            target = mock_fetch.call_args_list[0][0][1]
+            self.assertEqual(os.path.join(tmpdir, '_base'),
+                             os.path.dirname(target))
+            mock_fetch.assert_any_call(self.context, target, 'image1',
+                                       'fake-user', 'fake-project')
+
+            # The images in the cache are not fetched again
+            self.prefetcher.prefetch(self.context, ['image1'])
+            self.prefetcher._pool.waitall()
+            self.assertEqual(2, mock_fetch.call_count)
+
+    @mock.patch.object(libvirt_utils, 'fetch_image',
+                       side_effect=exception.ImageNotFound(image_id='image1'))
+    def test_prefetch_failed(self, mock_fetch):
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.prefetcher.prefetch(self.context, ['image1'])
+            self.prefetcher._pool.waitall()
+
+        self.assertEqual(imageprefetch.STATUS_FAILED,
+                         self.prefetcher.get_status('image1'))
+        self.assertIsNone(self.prefetcher.get_status('image2'))
@@ -0,0 +1,137 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from nova import objects
+from nova import test
+from nova.tests.unit.virt.vmwareapi import fake
+from nova.virt.vmwareapi import vm_inventory
+from nova.virt.vmwareapi import vm_util
+
+_UUID = 'ba4e4fa8-b65a-4c6d-a6ab-f7e8c1f32a4a'
+
+
+def _change(name, val=None, op='assign'):
+    change = fake.DataObject()
+    change.name = name
+    change.op = op
+    change.val = val
+    return change
+
+
+def _object_update(moid, kind, changes=()):
+    object_update = fake.DataObject()
+    object_update.obj = fake.ManagedObjectReference('VirtualMachine', moid)
+    object_update.kind = kind
+    object_update.changeSet = list(changes)
+    return object_update
+
+
+def _update_set(object_updates, version='1', truncated=False):
+    filter_update = fake.DataObject()
+    filter_update.objectSet = object_updates
+    update_set = fake.DataObject()
+    update_set.filterSet = [filter_update]
+    update_set.version = version
+    update_set.truncated = truncated
+    return update_set
+
+
+class VMInventoryTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(VMInventoryTestCase, self).setUp()
+        vm_util.vm_refs_cache_reset()
+        self.session = mock.Mock()
+        self.session.vm_inventory = vm_inventory.VMInventory(self.session)
+        self.inventory = self.session.vm_inventory
+        self.res_pool = fake.ManagedObjectReference('ResourcePool', 'rp-1')
+
+    def _wait_for_updates(self, *update_sets):
+        self.session._call_method.side_effect = update_sets
+        for _update_set in update_sets:
+            self.inventory._wait_for_updates()
+
+    def _enter(self, moid='vm-1', name=_UUID, power_state='poweredOn'):
+        return _object_update(moid, 'enter', [
+            _change('name', name, 'add'),
+            _change('resourcePool', self.res_pool, 'add'),
+            _change('runtime.powerState', power_state, 'add')])
+
+    def test_ready_when_not_truncated(self):
+        self._wait_for_updates(_update_set([self._enter()], truncated=True))
+        self.assertFalse(self.inventory.ready)
+        self.assertIsNone(vm_util.get_vm_inventory(self.session))
+
+        self._wait_for_updates(_update_set([], version='2'))
+        self.assertTrue(self.inventory.ready)
+        self.assertEqual(self.inventory,
+                         vm_util.get_vm_inventory(self.session))
+        self.assertEqual('2', self.inventory._version)
+
+    def test_apply_changes(self):
+        self._wait_for_updates(_update_set([self._enter()]))
+        vm_ref = self.inventory.get_vm_ref(_UUID)
+        self.assertEqual('vm-1', vm_ref.value)
+
+        self._wait_for_updates(_update_set([_object_update('vm-1', 'modify', [
+            _change('runtime.powerState', 'poweredOff')])]))
+        props = self.inventory.get_vm_properties(vm_ref)
+        self.assertEqual('poweredOff', props['runtime.powerState'])
+        self.assertEqual({_UUID: props},
+                         self.inventory.get_vms_of_resource_pool(
+                             self.res_pool))
+
+        self._wait_for_updates(_update_set([_object_update('vm-1',
+                                                           'leave')]))
+        self.assertIsNone(self.inventory.get_vm_ref(_UUID))
+        self.assertIsNone(self.inventory.get_vm_properties(vm_ref))
+
+    def test_leave_invalidates_vm_ref_cache(self):
+        vm_util.vm_ref_cache_update(_UUID, 'stale-ref')
+        self._wait_for_updates(_update_set([self._enter()]),
+                               _update_set([_object_update('vm-1', 'leave')]))
+        self.assertIsNone(vm_util.vm_ref_cache_get(_UUID))
+
+    def test_get_vms_of_resource_pool_ignores_invalid_vms(self):
+        self._wait_for_updates(_update_set([
+            self._enter(),
+            self._enter(moid='vm-2', name='not-an-instance')]))
+        self.assertEqual([_UUID], list(
+            self.inventory.get_vms_of_resource_pool(self.res_pool)))
+
+    def test_get_vm_ref_from_inventory(self):
+        self._wait_for_updates(_update_set([self._enter()]))
+        instance = objects.Instance(uuid=_UUID)
+        with mock.patch.object(vm_util, 'search_vm_ref_by_identifier') as (
+                mock_search):
+            vm_ref = vm_util.get_vm_ref(self.session, instance)
+        self.assertEqual('vm-1', vm_ref.value)
+        self.assertFalse(mock_search.called)
+
+    def test_reset(self):
+        self._wait_for_updates(_update_set([self._enter()]))
+        self.inventory._collector = mock.sentinel.collector
+        self.session._call_method.side_effect = None
+        self.session._call_method.reset_mock()
+
+        self.inventory._reset()
+
+        self.assertFalse(self.inventory.ready)
+        self.assertIsNone(self.inventory.get_vm_ref(_UUID))
+        self.session._call_method.assert_called_once_with(
+            self.session.vim, 'DestroyPropertyCollector',
+            mock.sentinel.collector)
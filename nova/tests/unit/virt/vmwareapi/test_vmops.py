@@ -2072,6 +2072,17 @@ class VMwareVMOpsTestCase(test.NoDBTestCase):
                 vi.dc_info.vmFolder,
                 self._vmops._root_resource_pool)
 
+    @mock.patch.object(vm_util, 'get_vm_inventory')
+    def test_get_power_states_from_inventory(self, mock_get_inventory):
+        inventory = mock_get_inventory.return_value
+        inventory.get_vms_of_resource_pool.return_value = {
+            'uuid1': {'runtime.powerState': 'poweredOn'},
+            'uuid2': {'name': 'uuid2'}}
+        self.assertEqual({'uuid1': power_state.RUNNING},
+                         self._vmops.get_power_states())
+        inventory.get_vms_of_resource_pool.assert_called_once_with(
+            self._vmops._root_resource_pool)
+
     @mock.patch.object(uuidutils, 'generate_uuid', return_value='tmp-uuid')
     def test_prepare_iso_image(self, mock_generate_uuid):
         vi = self._make_vm_config_info(is_iso=True)
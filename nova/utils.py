@@ -1369,6 +1369,21 @@ def get_hash_str(base_str):
         base_str = base_str.encode('utf-8')
     return hashlib.md5(base_str).hexdigest()
 
+
+def get_uuids_digest(uuids):
+    """Returns a compact digest of a collection of UUID strings.
+
+    The digest is made of the number of UUIDs and of the XOR of their MD5
+    hashes, so it does not depend on the order of the UUIDs and two
+    collections can be compared without exchanging all their UUIDs.
+    """
+    count = 0
+    xor = 0
+    for uuid in uuids:
+        xor ^= int(get_hash_str(uuid), 16)
+        count += 1
+    return '%d-%032x' % (count, xor)
+
 if hasattr(hmac, 'compare_digest'):
     constant_time_compare = hmac.compare_digest
 else:
@@ -196,6 +196,17 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Get the current power states of all the instances known to the
+        hypervisor, in as few calls to the hypervisor as possible.
+
+        Drivers which can not do better than one call per instance should
+        not implement it, get_info() is then called for each instance.
+
+        :returns: dict of power states by instance uuid
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -256,6 +267,15 @@ class ComputeDriver(object):
         """
         raise NotImplementedError()
 
+    def list_instance_uuids_on_node(self, nodename):
+        """Return the UUIDs of the instances known to the virtualization
+        layer on the node specified, as a list.
+
+        This is called by the resource tracker of the node on every
+        periodic task, so it must be cheap.
+        """
+        raise NotImplementedError()
+
     def rebuild(self, context, instance, image_meta, injected_files,
                 admin_password, bdms, detach_block_devices,
                 attach_block_devices, network_info=None,
@@ -1204,6 +1224,17 @@ class ComputeDriver(object):
         """
         pass
 
+    def prefetch_images(self, context, image_ids):
+        """Fetch images into the driver's local image cache.
+
+        The images are fetched in the background, so that the instances
+        booted from them later on do not wait for them to be fetched.
+
+        :param context: security context used to fetch the images
+        :param image_ids: list of the ids of the images to fetch
+        """
+        raise NotImplementedError()
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate."""
         # NOTE(jogo) Currently only used for XenAPI-Pool
@@ -15,13 +15,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from eventlet import greenthread
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
 
 from nova.compute import utils as compute_utils
 from nova import context
-from nova.i18n import _LI
+from nova.i18n import _LE, _LI
 from nova.network import linux_net
 from nova import objects
 from nova import utils
@@ -36,6 +37,12 @@ firewall_opts = [
     cfg.BoolOpt('allow_same_net_traffic',
                 default=True,
                 help='Whether to allow network traffic from same network'),
+    cfg.FloatOpt('firewall_refresh_delay',
+                 default=0,
+                 help='Number of seconds during which the refreshes of the '
+                      'security group rules and members are merged into a '
+                      'single rebuild of the iptables rules of the '
+                      'instances. 0 refreshes them on every request.'),
 ]
 
 CONF = cfg.CONF
@@ -147,6 +154,14 @@ class IptablesFirewallDriver(FirewallDriver):
         self.dhcp_create = False
         self.dhcp_created = False
 
+        # Security groups whose refresh is delayed by firewall_refresh_delay
+        self._pending_refreshes = set()
+        self._refresh_scheduled = False
+        self.refresh_stats = {'requests': 0, 'refreshes': 0}
+        # IPs of the members of the security groups by (group id, ip
+        # version), cached while rebuilding the rules of all the instances
+        self._member_ips = None
+
         self.iptables.ipv4['filter'].add_chain('sg-fallback')
         self.iptables.ipv4['filter'].add_rule('sg-fallback', '-j DROP')
         self.iptables.ipv6['filter'].add_chain('sg-fallback')
@@ -394,24 +409,12 @@ class IptablesFirewallDriver(FirewallDriver):
                     fw_rules += [' '.join(args)]
                 else:
                     if rule['grantee_group']:
-                        insts = (
-                            objects.InstanceList.get_by_security_group(
-                                ctxt, rule['grantee_group']))
-                        for instance in insts:
-                            if instance.info_cache['deleted']:
-                                LOG.debug('ignoring deleted cache')
-                                continue
-                            nw_info = compute_utils.get_nw_info_for_instance(
-                                    instance)
-
-                            ips = [ip['address']
-                                for ip in nw_info.fixed_ips()
-                                    if ip['version'] == version]
-
-                            LOG.debug('ips: %r', ips, instance=instance)
-                            for ip in ips:
-                                subrule = args + ['-s %s' % ip]
-                                fw_rules += [' '.join(subrule)]
+                        ips = self._get_member_ips(ctxt,
+                                                   rule['grantee_group'],
+                                                   version)
+                        for ip in ips:
+                            subrule = args + ['-s %s' % ip]
+                            fw_rules += [' '.join(subrule)]
 
         ipv4_rules += ['-j $sg-fallback']
         ipv6_rules += ['-j $sg-fallback']
@@ -419,16 +422,93 @@ class IptablesFirewallDriver(FirewallDriver):
             security_groups, ipv4_rules, ipv6_rules, instance=instance)
         return ipv4_rules, ipv6_rules
 
+    def _get_member_ips(self, ctxt, security_group, version):
+        """Returns the fixed IPs of the version specified of the instances
+        of the security group.
+        """
+        key = (security_group.id, version)
+        if self._member_ips is not None and key in self._member_ips:
+            return self._member_ips[key]
+
+        ips = []
+        insts = objects.InstanceList.get_by_security_group(ctxt,
+                                                           security_group)
+        for instance in insts:
+            if instance.info_cache['deleted']:
+                LOG.debug('ignoring deleted cache')
+                continue
+            nw_info = compute_utils.get_nw_info_for_instance(instance)
+            inst_ips = [ip['address'] for ip in nw_info.fixed_ips()
+                        if ip['version'] == version]
+            LOG.debug('ips: %r', inst_ips, instance=instance)
+            ips += inst_ips
+
+        if self._member_ips is not None:
+            self._member_ips[key] = ips
+        return ips
+
     def instance_filter_exists(self, instance, network_info):
         pass
 
     def refresh_security_group_members(self, security_group):
-        self.do_refresh_security_group_rules(security_group)
-        self.iptables.apply()
+        self._refresh_security_group(security_group)
 
     def refresh_security_group_rules(self, security_group):
-        self.do_refresh_security_group_rules(security_group)
-        self.iptables.apply()
+        self._refresh_security_group(security_group)
+
+    def _refresh_security_group(self, security_group):
+        self.refresh_stats['requests'] += 1
+        if CONF.firewall_refresh_delay <= 0:
+            self.refresh_stats['refreshes'] += 1
+            self.do_refresh_security_group_rules(security_group)
+            self.iptables.apply()
+            return
+
+        # The rules of all the instances are rebuilt on refresh, so the
+        # requests received until the delayed refresh runs are merged into
+        # it
+        self._pending_refreshes.add(security_group)
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            greenthread.spawn_after(CONF.firewall_refresh_delay,
+                                    self._do_pending_refreshes)
+
+    def _do_pending_refreshes(self):
+        security_groups = self._pending_refreshes
+        self._pending_refreshes = set()
+        self._refresh_scheduled = False
+        self.refresh_stats['refreshes'] += 1
+        LOG.debug('Refreshing the rules of the instances for the security '
+                  'groups %(groups)s, %(ratio).2f requests per refresh',
+                  {'groups': ', '.join(str(sg) for sg in security_groups),
+                   'ratio': self.get_refresh_stats()['coalescing_ratio']})
+
+        self._member_ips = {}
+        try:
+            self.do_refresh_security_group_rules(security_groups)
+            self.iptables.apply()
+        except Exception:
+            LOG.exception(_LE('Failed to refresh the security groups %s, '
+                              'retrying'),
+                          ', '.join(str(sg) for sg in security_groups))
+            # The rules stay stale until they are refreshed, so the
+            # refresh is scheduled again with the requests received since
+            self._pending_refreshes |= security_groups
+            if not self._refresh_scheduled:
+                self._refresh_scheduled = True
+                greenthread.spawn_after(CONF.firewall_refresh_delay,
+                                        self._do_pending_refreshes)
+        finally:
+            self._member_ips = None
+
+    def get_refresh_stats(self):
+        """Returns the number of refreshes of the security groups
+        requested and done, and the number of requests per refresh.
+        """
+        stats = dict(self.refresh_stats)
+        stats['coalescing_ratio'] = (float(stats['requests']) /
+                                     max(stats['refreshes'], 1))
+        return stats
 
     def refresh_instance_security_rules(self, instance):
         self.do_refresh_instance_rules(instance)
@@ -21,6 +21,7 @@ A driver wrapping the Ironic API, such that Nova may provision
 bare metal resources.
 """
 import base64
+import datetime
 import gzip
 import logging as py_logging
 import shutil
@@ -33,6 +34,7 @@ from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_utils import excutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 import six
 
 from nova.api.metadata import base as instance_metadata
@@ -97,6 +99,19 @@ opts = [
                default=2,
                help='How often to retry in seconds when a request '
                     'does conflict'),
+    cfg.IntOpt('node_cache_full_refresh_interval',
+               default=0,
+               help='Interval in seconds between two refreshes of the node '
+                    'cache which list all the nodes with their details. In '
+                    'between, the periodic refreshes only list the details '
+                    'of the nodes updated since the previous refresh. 0 '
+                    'lists all the nodes with their details on every '
+                    'refresh.'),
+    cfg.IntOpt('node_cache_max_age',
+               default=0,
+               help='Maximum age in seconds of the node cache for the state '
+                    'of an instance to be read from it instead of being '
+                    'queried from Ironic. 0 always queries Ironic.'),
     ]
 
 ironic_group = cfg.OptGroup(name='ironic',
@@ -112,6 +127,14 @@ _POWER_STATE_MAP = {
     ironic_states.POWER_OFF: power_state.SHUTDOWN,
 }
 
+# Number of nodes listed per request by the incremental node cache refreshes
+_NODE_CACHE_PAGE_SIZE = 50
+
+# The nodes updated this long before the most recent update in the node cache
+# are listed again by the incremental refreshes, in case the updates committed
+# around the same time were not visible yet to the previous refresh.
+_NODE_CACHE_SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
 _UNPROVISION_STATES = (ironic_states.ACTIVE, ironic_states.DEPLOYFAIL,
                        ironic_states.ERROR, ironic_states.DEPLOYWAIT,
                        ironic_states.DEPLOYING)
@@ -192,6 +215,11 @@ class IronicDriver(virt_driver.ComputeDriver):
             default='nova.virt.firewall.NoopFirewallDriver')
         self.node_cache = {}
         self.node_cache_time = 0
+        self.node_cache_full_time = 0
+        self.node_cache_stats = {'hits': 0, 'misses': 0,
+                                 'full_refreshes': 0,
+                                 'incremental_refreshes': 0,
+                                 'nodes_fetched': 0}
 
         ironicclient_log_level = CONF.ironic.client_log_level
         if ironicclient_log_level:
@@ -486,6 +514,8 @@ class IronicDriver(virt_driver.ComputeDriver):
         :returns: True if the instance exists. False if not.
 
         """
+        if self._get_cached_node(instance) is not None:
+            return True
         try:
             _validate_instance_and_node(self.ironicclient, instance)
             return True
@@ -531,6 +561,19 @@ class IronicDriver(virt_driver.ComputeDriver):
         return list(n.instance_uuid
                     for n in self._get_node_list(associated=True, limit=0))
 
+    def list_instance_uuids_on_node(self, nodename):
+        """Return the UUID of the instance provisioned on the node, from
+        the node cache refreshed by get_available_nodes().
+
+        :param nodename: the UUID of the node.
+        :returns: a list of zero or one instance UUID.
+
+        """
+        node = self.node_cache.get(nodename)
+        if node is None or not node.instance_uuid:
+            return []
+        return [node.instance_uuid]
+
     def node_is_available(self, nodename):
         """Confirms a Nova hypervisor node exists in the Ironic inventory.
 
@@ -559,13 +602,128 @@ class IronicDriver(virt_driver.ComputeDriver):
             return False
 
     def _refresh_cache(self):
+        interval = CONF.ironic.node_cache_full_refresh_interval
+        if (self.node_cache and interval > 0 and
+                time.time() - self.node_cache_full_time < interval and
+                self._refresh_cache_incrementally()):
+            return
+
         # NOTE(lucasagomes): limit == 0 is an indicator to continue
         # pagination until there're no more values to be returned.
         node_cache = {}
         for node in self._get_node_list(detail=True, limit=0):
             node_cache[node.uuid] = node
         self.node_cache = node_cache
+        self.node_cache_time = self.node_cache_full_time = time.time()
+        self.node_cache_stats['full_refreshes'] += 1
+        self.node_cache_stats['nodes_fetched'] += len(node_cache)
+        LOG.debug("Node cache stats: %s", self._get_node_cache_stats())
+
+    def _refresh_cache_incrementally(self):
+        """Refresh the node cache with the details of the nodes updated
+        since the previous refresh only.
+
+        The nodes are listed without details to find the nodes added and
+        deleted since. The nodes updated since the most recent update in
+        the cache, minus _NODE_CACHE_SYNC_OVERLAP, are listed with their
+        details, by pages of nodes sorted by decreasing update time, until
+        the pages reach the nodes which were not updated since.
+
+        :returns: False if the cache could not be refreshed
+        """
+        update_times = [timeutils.parse_isotime(node.updated_at)
+                        for node in self.node_cache.values()
+                        if node.updated_at]
+        if not update_times:
+            return False
+        since = max(update_times) - _NODE_CACHE_SYNC_OVERLAP
+
+        def updated_since(node):
+            return (node.updated_at is not None and
+                    timeutils.parse_isotime(node.updated_at) >= since)
+
+        start = time.time()
+        try:
+            node_uuids = set(node.uuid for node in
+                             self.ironicclient.call("node.list", limit=0))
+            updated_nodes = []
+            marker = None
+            while True:
+                nodes = self.ironicclient.call(
+                    "node.list", detail=True, limit=_NODE_CACHE_PAGE_SIZE,
+                    marker=marker, sort_key='updated_at', sort_dir='desc')
+                updated_nodes.extend(node for node in nodes
+                                     if updated_since(node))
+                if len(nodes) < _NODE_CACHE_PAGE_SIZE:
+                    break
+                # Nodes which were never updated have no update time and
+                # may be sorted before the others
+                if (nodes[-1].updated_at is not None and
+                        not updated_since(nodes[-1])):
+                    break
+                marker = nodes[-1].uuid
+        except exception.NovaException:
+            return False
+
+        node_cache = dict(self.node_cache)
+        for node in updated_nodes:
+            node_cache[node.uuid] = node
+        # Nodes which were never updated do not show up in the pages above
+        new_uuids = node_uuids - set(node_cache)
+        for node_uuid in new_uuids:
+            try:
+                node_cache[node_uuid] = self.ironicclient.call("node.get",
+                                                               node_uuid)
+            except (exception.NovaException, ironic.exc.NotFound):
+                node_uuids.discard(node_uuid)
+        for node_uuid in set(node_cache) - node_uuids:
+            del node_cache[node_uuid]
+
+        self.node_cache = node_cache
         self.node_cache_time = time.time()
+        self.node_cache_stats['incremental_refreshes'] += 1
+        self.node_cache_stats['nodes_fetched'] += (len(updated_nodes) +
+                                                   len(new_uuids))
+        LOG.debug("Refreshed %(updated)d updated and %(new)d new nodes of "
+                  "the node cache in %(elapsed).2f seconds, stats: %(stats)s",
+                  {'updated': len(updated_nodes), 'new': len(new_uuids),
+                   'elapsed': time.time() - start,
+                   'stats': self._get_node_cache_stats()})
+        return True
+
+    def _get_cached_node(self, instance):
+        """Returns the node of the instance from the node cache, if the
+        cache is recent enough (CONF.ironic.node_cache_max_age), or None.
+        """
+        max_age = CONF.ironic.node_cache_max_age
+        if max_age <= 0:
+            return None
+        node = None
+        if (instance.obj_attr_is_set('node') and
+                time.time() - self.node_cache_time < max_age):
+            node = self.node_cache.get(instance.node)
+            if node is not None and node.instance_uuid != instance.uuid:
+                node = None
+        if node is None:
+            self.node_cache_stats['misses'] += 1
+        else:
+            self.node_cache_stats['hits'] += 1
+        return node
+
+    def _evict_cached_node(self, node_uuid):
+        """Removes a node from the node cache, so that its power and
+        provision states are read from Ironic until the next refresh.
+        """
+        self.node_cache.pop(node_uuid, None)
+
+    def _get_node_cache_stats(self):
+        """Returns the counters of the node cache and its age in seconds,
+        None if it was never refreshed.
+        """
+        stats = dict(self.node_cache_stats)
+        stats['age'] = (time.time() - self.node_cache_time
+                        if self.node_cache_time else None)
+        return stats
 
     def get_available_nodes(self, refresh=False):
         """Returns the UUIDs of all nodes in the Ironic inventory.
@@ -625,11 +783,14 @@ class IronicDriver(virt_driver.ComputeDriver):
         :param instance: the instance object.
         :returns: a InstanceInfo object
         """
-        try:
-            node = _validate_instance_and_node(self.ironicclient, instance)
-        except exception.InstanceNotFound:
-            return hardware.InstanceInfo(
-                state=map_power_state(ironic_states.NOSTATE))
+        node = self._get_cached_node(instance)
+        if node is None:
+            try:
+                node = _validate_instance_and_node(self.ironicclient,
+                                                   instance)
+            except exception.InstanceNotFound:
+                return hardware.InstanceInfo(
+                    state=map_power_state(ironic_states.NOSTATE))
 
         properties = self._parse_node_properties(node)
         memory_kib = properties['memory_mb'] * 1024
@@ -796,6 +957,7 @@ class IronicDriver(virt_driver.ComputeDriver):
                          {'instance': instance['uuid'], 'node': node_uuid})
 
         # trigger the node deploy
+        self._evict_cached_node(node_uuid)
         try:
             self.ironicclient.call("node.set_provision_state", node_uuid,
                                    ironic_states.ACTIVE,
@@ -824,6 +986,8 @@ class IronicDriver(virt_driver.ComputeDriver):
                              {'instance': instance.uuid,
                               'node': node_uuid})
                 self.destroy(context, instance, network_info)
+        finally:
+            self._evict_cached_node(node_uuid)
 
     def _unprovision(self, ironicclient, instance, node):
         """This method is called from destroy() to unprovision
@@ -906,10 +1070,14 @@ class IronicDriver(virt_driver.ComputeDriver):
             #             without raising any exceptions.
             return
 
-        if node.provision_state in _UNPROVISION_STATES:
-            self._unprovision(self.ironicclient, instance, node)
+        self._evict_cached_node(node.uuid)
+        try:
+            if node.provision_state in _UNPROVISION_STATES:
+                self._unprovision(self.ironicclient, instance, node)
 
-        self._cleanup_deploy(context, node, instance, network_info)
+            self._cleanup_deploy(context, node, instance, network_info)
+        finally:
+            self._evict_cached_node(node.uuid)
         LOG.info(_LI('Successfully unprovisioned Ironic node %s'),
                  node.uuid, instance=instance)
 
@@ -936,12 +1104,16 @@ class IronicDriver(virt_driver.ComputeDriver):
         """
         LOG.debug('Reboot called for instance', instance=instance)
         node = _validate_instance_and_node(self.ironicclient, instance)
+        self._evict_cached_node(node.uuid)
         self.ironicclient.call("node.set_power_state", node.uuid, 'reboot')
 
         timer = loopingcall.FixedIntervalLoopingCall(
                     self._wait_for_power_state,
                     self.ironicclient, instance, 'reboot')
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        try:
+            timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        finally:
+            self._evict_cached_node(node.uuid)
         LOG.info(_LI('Successfully rebooted Ironic node %s'),
                  node.uuid, instance=instance)
 
@@ -961,12 +1133,16 @@ class IronicDriver(virt_driver.ComputeDriver):
         """
         LOG.debug('Power off called for instance', instance=instance)
         node = _validate_instance_and_node(self.ironicclient, instance)
+        self._evict_cached_node(node.uuid)
         self.ironicclient.call("node.set_power_state", node.uuid, 'off')
 
         timer = loopingcall.FixedIntervalLoopingCall(
                     self._wait_for_power_state,
                     self.ironicclient, instance, 'power off')
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        try:
+            timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        finally:
+            self._evict_cached_node(node.uuid)
         LOG.info(_LI('Successfully powered off Ironic node %s'),
                  node.uuid, instance=instance)
 
@@ -987,12 +1163,16 @@ class IronicDriver(virt_driver.ComputeDriver):
         """
         LOG.debug('Power on called for instance', instance=instance)
         node = _validate_instance_and_node(self.ironicclient, instance)
+        self._evict_cached_node(node.uuid)
         self.ironicclient.call("node.set_power_state", node.uuid, 'on')
 
         timer = loopingcall.FixedIntervalLoopingCall(
                     self._wait_for_power_state,
                     self.ironicclient, instance, 'power on')
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        try:
+            timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        finally:
+            self._evict_cached_node(node.uuid)
         LOG.info(_LI('Successfully powered on Ironic node %s'),
                  node.uuid, instance=instance)
 
@@ -1182,6 +1362,7 @@ class IronicDriver(virt_driver.ComputeDriver):
                                 preserve_ephemeral)
 
         # Trigger the node rebuild/redeploy.
+        self._evict_cached_node(node_uuid)
         try:
             self.ironicclient.call("node.set_provision_state",
                               node_uuid, ironic_states.REBUILD)
@@ -1198,5 +1379,8 @@ class IronicDriver(virt_driver.ComputeDriver):
         timer = loopingcall.FixedIntervalLoopingCall(self._wait_for_active,
                                                      self.ironicclient,
                                                      instance)
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        try:
+            timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        finally:
+            self._evict_cached_node(node_uuid)
         LOG.info(_LI('Instance was successfully rebuilt'), instance=instance)
@@ -98,6 +98,7 @@ from nova.virt.libvirt import guest as libvirt_guest
 from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
 from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import imageprefetch
 from nova.virt.libvirt import instancejobtracker
 from nova.virt.libvirt.storage import dmcrypt
 from nova.virt.libvirt.storage import lvm
@@ -270,7 +271,44 @@ libvirt_opts = [
                 default=[],
                 help='List of guid targets and ranges.'
                      'Syntax is guest-gid:host-gid:count'
-                     'Maximum of 5 allowed.')
+                     'Maximum of 5 allowed.'),
+    cfg.IntOpt('inventory_cache_max_age',
+               default=0,
+               help='Maximum age in seconds of the host inventory cached '
+                    'between two resource audits: CPU info, NUMA topology, '
+                    'PCI devices, used vCPUs and disk over-commit. The '
+                    'cached values are also refreshed when libvirt reports '
+                    'domain or node device events which change them. The '
+                    'over-committed disk size also grows as guests write to '
+                    'their disks, which only this maximum age accounts for. '
+                    '0 disables the cache.'),
+    cfg.IntOpt('event_queue_size',
+               default=0,
+               help='Maximum number of libvirt events waiting to be '
+                    'dispatched to the compute manager. When it is reached, '
+                    'the libvirt event loop waits for the pending events to '
+                    'be dispatched before receiving more. 0 means no limit.'),
+    cfg.BoolOpt('coalesce_lifecycle_events',
+                default=False,
+                help='Only dispatch the last of the lifecycle events of an '
+                     'instance received from libvirt while the previous '
+                     'events were being dispatched. Each dispatched event '
+                     'costs a database lookup and a power state query, '
+                     'which event storms otherwise pile up.'),
+    cfg.IntOpt('image_prefetch_concurrency',
+               default=2,
+               help='Maximum number of images prefetched into the image '
+                    'cache of the host at the same time, when the compute '
+                    'service is asked to prefetch images.'),
+    cfg.ListOpt('prefetch_image_ids',
+                default=[],
+                help='IDs of the images prefetched into the image cache of '
+                     'the host when the compute service starts, for example '
+                     'the most popular images. They are downloaded without '
+                     'a user token, so Glance must let the compute service '
+                     'download them with an admin context. Other images can '
+                     'be prefetched on demand with the prefetch_images() '
+                     'method of the compute RPC API.'),
     ]
 
 CONF = cfg.CONF
@@ -441,9 +479,12 @@ class LibvirtDriver(driver.ComputeDriver):
         if libvirt is None:
             libvirt = importutils.import_module('libvirt')
 
-        self._host = host.Host(self._uri(), read_only,
-                               lifecycle_event_handler=self.emit_event,
-                               conn_event_handler=self._handle_conn_event)
+        self._host = host.Host(
+            self._uri(), read_only,
+            lifecycle_event_handler=self.emit_event,
+            conn_event_handler=self._handle_conn_event,
+            event_queue_size=CONF.libvirt.event_queue_size,
+            coalesce_events=CONF.libvirt.coalesce_lifecycle_events)
         self._initiator = None
         self._fc_wwnns = None
         self._fc_wwpns = None
@@ -461,6 +502,8 @@ class LibvirtDriver(driver.ComputeDriver):
         self._disk_cachemode = None
         self.image_cache_manager = imagecache.ImageCacheManager()
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
+        self._image_prefetcher = imageprefetch.ImagePrefetcher(
+            CONF.libvirt.image_prefetch_concurrency)
 
         self.disk_cachemodes = {}
 
@@ -499,6 +542,10 @@ class LibvirtDriver(driver.ComputeDriver):
         self.job_tracker = instancejobtracker.InstanceJobTracker()
         self._remotefs = remotefs.RemoteFilesystem()
 
+        # Host inventory cached between two resource audits, see
+        # _get_cached_inventory()
+        self._inventory_cache = {}
+
     def _get_volume_drivers(self):
         return libvirt_volume_drivers
 
@@ -611,6 +658,11 @@ class LibvirtDriver(driver.ComputeDriver):
                  'qemu_ver': self._version_to_string(
                      MIN_QEMU_S390_VERSION)})
 
+        if CONF.libvirt.prefetch_image_ids:
+            utils.spawn_n(self.prefetch_images,
+                          nova_context.get_admin_context(),
+                          CONF.libvirt.prefetch_image_ids)
+
     # TODO(sahid): This method is targeted for removal when the tests
     # have been updated to avoid its use
     #
@@ -660,6 +712,10 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def list_instance_uuids_on_node(self, nodename):
+        # NOTE: The host is the only node of this driver
+        return self.list_instance_uuids()
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
@@ -4345,6 +4401,10 @@ class LibvirtDriver(driver.ComputeDriver):
         # workaround, see libvirt/compat.py
         return guest.get_info(self._host)
 
+    def get_power_states(self):
+        return {uuid: libvirt_guest.LIBVIRT_POWER_STATE[state]
+                for uuid, state in self._host.get_domain_states().items()}
+
     def _create_domain_setup_lxc(self, instance, image_meta,
                                  block_device_info, disk_info):
         inst_path = libvirt_utils.get_instance_path(instance)
@@ -4979,6 +5039,31 @@ class LibvirtDriver(driver.ComputeDriver):
     def refresh_provider_fw_rules(self):
         self.firewall_driver.refresh_provider_fw_rules()
 
+    def _get_cached_inventory(self, name, generation, func):
+        """Returns the result of func, cached for at most
+        CONF.libvirt.inventory_cache_max_age seconds and for as long as the
+        generation given by the host does not change.
+
+        :param name: name of the cached value
+        :param generation: domain or device generation of the host read
+                           before calling func, or None if the host does not
+                           track it
+        :param func: function computing the value
+        """
+        max_age = CONF.libvirt.inventory_cache_max_age
+        if max_age <= 0:
+            return func()
+
+        now = time.time()
+        cached = self._inventory_cache.get(name)
+        if (cached is not None and cached[0] == generation and
+                now - cached[1] < max_age):
+            return cached[2]
+
+        value = func()
+        self._inventory_cache[name] = (generation, now, value)
+        return value
+
     def get_available_resource(self, nodename):
         """Retrieve resource information.
 
@@ -5002,10 +5087,14 @@ class LibvirtDriver(driver.ComputeDriver):
         data["supported_instances"] = jsonutils.dumps(
             self._get_instance_capabilities())
 
+        domain_generation = self._host.get_domain_generation()
+        device_generation = self._host.get_device_generation()
+
         data["vcpus"] = self._get_vcpu_total()
         data["memory_mb"] = self._host.get_memory_mb_total()
         data["local_gb"] = disk_info_dict['total']
-        data["vcpus_used"] = self._get_vcpu_used()
+        data["vcpus_used"] = self._get_cached_inventory(
+            'vcpus_used', domain_generation, self._get_vcpu_used)
         data["memory_mb_used"] = self._host.get_memory_mb_used()
         data["local_gb_used"] = disk_info_dict['used']
         data["hypervisor_type"] = self._host.get_driver_type()
@@ -5020,17 +5109,27 @@ class LibvirtDriver(driver.ComputeDriver):
         # That said, arch_filter.py now seems to rely on
         # the libvirt drivers format which suggests this
         # data format needs to be standardized across drivers
-        data["cpu_info"] = jsonutils.dumps(self._get_cpu_info())
+        #
+        # NOTE: the CPU info and the NUMA topology come from the host
+        # capabilities, which are never refreshed, so their cached values only
+        # expire with their age.
+        data["cpu_info"] = self._get_cached_inventory(
+            'cpu_info', 0,
+            lambda: jsonutils.dumps(self._get_cpu_info()))
 
         disk_free_gb = disk_info_dict['free']
-        disk_over_committed = self._get_disk_over_committed_size_total()
+        disk_over_committed = self._get_cached_inventory(
+            'disk_over_committed', domain_generation,
+            self._get_disk_over_committed_size_total)
         available_least = disk_free_gb * units.Gi - disk_over_committed
         data['disk_available_least'] = available_least / units.Gi
 
-        data['pci_passthrough_devices'] = \
-            self._get_pci_passthrough_devices()
+        data['pci_passthrough_devices'] = self._get_cached_inventory(
+            'pci_passthrough_devices', device_generation,
+            self._get_pci_passthrough_devices)
 
-        numa_topology = self._get_host_numa_topology()
+        numa_topology = self._get_cached_inventory(
+            'numa_topology', 0, self._get_host_numa_topology)
         if numa_topology:
             data['numa_topology'] = numa_topology._to_json()
         else:
@@ -6598,6 +6697,16 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def prefetch_images(self, context, image_ids):
+        """Fetch images into the local cache of images in the background."""
+        # NOTE: the rbd image backend clones the images from Glance when
+        # they are stored in Ceph, which the cached file would bypass.
+        if CONF.libvirt.images_type == 'rbd':
+            LOG.debug("Not prefetching images %s with the rbd image backend",
+                      image_ids)
+            return
+        self._image_prefetcher.prefetch(context, image_ids)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
@@ -27,11 +27,13 @@ the raw libvirt API. These APIs are then used by all
 the other libvirt related classes
 """
 
+import collections
 import operator
 import os
 import socket
 import sys
 import threading
+import time
 
 import eventlet
 from eventlet import greenio
@@ -195,7 +197,9 @@ class Host(object):
 
     def __init__(self, uri, read_only=False,
                  conn_event_handler=None,
-                 lifecycle_event_handler=None):
+                 lifecycle_event_handler=None,
+                 event_queue_size=0,
+                 coalesce_events=False):
 
         global libvirt
         if libvirt is None:
@@ -206,12 +210,25 @@ class Host(object):
         self._conn_event_handler = conn_event_handler
         self._lifecycle_event_handler = lifecycle_event_handler
         self._skip_list_all_domains = False
+        self._skip_all_domain_stats = False
         self._caps = None
         self._hostname = None
 
         self._wrapped_conn = None
         self._wrapped_conn_lock = threading.Lock()
         self._event_queue = None
+        # Maximum number of events waiting for dispatch, 0 for no limit
+        self._event_queue_size = event_queue_size
+        # Whether only the last of the lifecycle events of a domain queued
+        # together is dispatched
+        self._coalesce_events = coalesce_events
+        self._event_notify_lock = native_threading.Lock()
+        self._event_notify_pending = False
+        self._event_stats = {'dispatched': 0,
+                             'coalesced': 0,
+                             'max_queue_depth': 0,
+                             'dispatch_latency_total': 0.0,
+                             'dispatch_latency_max': 0.0}
 
         self._events_delayed = {}
         # Note(toabctl): During a reboot of a domain, STOPPED and
@@ -220,6 +237,13 @@ class Host(object):
         #                STOPPED lifecycle event some seconds.
         self._lifecycle_delay = 15
 
+        # Numbers of the events received about the domains and the node
+        # devices, and whether the connection delivers these events.
+        self._domain_generation = 0
+        self._device_generation = 0
+        self._domain_events = False
+        self._device_events = False
+
     def _native_thread(self):
         """Receives async events coming in from libvirtd.
 
@@ -259,6 +283,8 @@ class Host(object):
 
         self = opaque
 
+        self._domain_generation += 1
+
         uuid = dom.UUIDString()
         transition = None
         if event == libvirt.VIR_DOMAIN_EVENT_STOPPED:
@@ -273,6 +299,28 @@ class Host(object):
         if transition is not None:
             self._queue_event(virtevent.LifecycleEvent(uuid, transition))
 
+    @staticmethod
+    def _event_device_callback(conn, dom, dev, opaque):
+        """Receives device addition and removal events from libvirt.
+
+        NB: this method is executing in a native thread, not
+        an eventlet coroutine. Any use of logging APIs in particular
+        is forbidden.
+        """
+        self = opaque
+        self._domain_generation += 1
+
+    @staticmethod
+    def _event_node_device_callback(conn, dev, event, detail, opaque):
+        """Receives node device lifecycle events from libvirt.
+
+        NB: this method is executing in a native thread, not
+        an eventlet coroutine. Any use of logging APIs in particular
+        is forbidden.
+        """
+        self = opaque
+        self._device_generation += 1
+
     def _close_callback(self, conn, reason, opaque):
         close_info = {'conn': conn, 'reason': reason}
         self._queue_event(close_info)
@@ -326,15 +374,24 @@ class Host(object):
         This method is called by the native event thread to
         put events on the queue for later dispatch by the
         green thread. Any use of logging APIs is forbidden.
+
+        When the queue is bounded and full, this blocks the native
+        event thread until the green thread dispatched some events,
+        which in turn leaves the events pending in libvirt.
         """
 
         if self._event_queue is None:
             return
 
         # Queue the event...
-        self._event_queue.put(event)
-
-        # ...then wakeup the green thread to dispatch it
+        self._event_queue.put((time.time(), event))
+
+        # ...then wakeup the green thread to dispatch it, unless it was
+        # woken up already and did not start dispatching yet
+        with self._event_notify_lock:
+            if self._event_notify_pending:
+                return
+            self._event_notify_pending = True
         c = ' '.encode()
         self._event_notify_send.write(c)
         self._event_notify_send.flush()
@@ -354,20 +411,39 @@ class Host(object):
         except ValueError:
             return  # will be raised when pipe is closed
 
+        # The events queued from now on need another notification
+        with self._event_notify_lock:
+            self._event_notify_pending = False
+
+        stats = self._event_stats
+        stats['max_queue_depth'] = max(stats['max_queue_depth'],
+                                       self._event_queue.qsize())
+
         # Process as many events as possible without
         # blocking
         last_close_event = None
+        lifecycle_events = collections.OrderedDict()
         while not self._event_queue.empty():
             try:
-                event = self._event_queue.get(block=False)
+                queued_at, event = self._event_queue.get(block=False)
                 if isinstance(event, virtevent.LifecycleEvent):
-                    # call possibly with delay
-                    self._event_emit_delayed(event)
+                    if not self._coalesce_events:
+                        self._event_dispatch(queued_at, event)
+                        continue
+                    # NOTE: the lifecycle events are handled as the power
+                    # state they lead to, so only the last one of a domain
+                    # matters. Dispatching it keeps the order of the last
+                    # events of the domains.
+                    if lifecycle_events.pop(event.uuid, None) is not None:
+                        stats['coalesced'] += 1
+                    lifecycle_events[event.uuid] = (queued_at, event)
 
                 elif 'conn' in event and 'reason' in event:
                     last_close_event = event
             except native_Queue.Empty:
                 pass
+        for queued_at, event in lifecycle_events.values():
+            self._event_dispatch(queued_at, event)
         if last_close_event is None:
             return
         conn = last_close_event['conn']
@@ -381,6 +457,29 @@ class Host(object):
                 if self._conn_event_handler is not None:
                     self._conn_event_handler(False, msg)
 
+    def _event_dispatch(self, queued_at, event):
+        latency = time.time() - queued_at
+        stats = self._event_stats
+        stats['dispatched'] += 1
+        stats['dispatch_latency_total'] += latency
+        stats['dispatch_latency_max'] = max(stats['dispatch_latency_max'],
+                                            latency)
+        # call possibly with delay
+        self._event_emit_delayed(event)
+
+    def get_event_stats(self):
+        """Returns the counters of the lifecycle events dispatched.
+
+        The latency is the time in seconds between the reception of an
+        event from libvirt and its dispatch, not counting the delay of
+        the STOPPED events. The queue depth is the number of events
+        waiting for dispatch.
+        """
+        stats = dict(self._event_stats)
+        stats['queue_depth'] = (self._event_queue.qsize()
+                                if self._event_queue is not None else 0)
+        return stats
+
     def _event_emit_delayed(self, event):
         """Emit events - possibly delayed."""
         def event_cleanup(gt, *args, **kwargs):
@@ -421,7 +520,7 @@ class Host(object):
         of the Apache License v2.0.
         """
 
-        self._event_queue = native_Queue.Queue()
+        self._event_queue = native_Queue.Queue(self._event_queue_size)
         try:
             rpipe, wpipe = os.pipe()
             self._event_notify_send = greenio.GreenPipe(wpipe, 'wb', 0)
@@ -477,6 +576,13 @@ class Host(object):
 
         self._wrapped_conn = wrapped_conn
 
+        # NOTE: the events sent while there was no connection are lost, so
+        # anything cached from the previous connection has to be refreshed.
+        self._domain_generation += 1
+        self._device_generation += 1
+        self._domain_events = False
+        self._device_events = False
+
         try:
             LOG.debug("Registering for lifecycle events %s", self)
             wrapped_conn.domainEventRegisterAny(
@@ -487,6 +593,9 @@ class Host(object):
         except Exception as e:
             LOG.warn(_LW("URI %(uri)s does not support events: %(error)s"),
                      {'uri': self._uri, 'error': e})
+        else:
+            self._domain_events = True
+            self._register_device_events(wrapped_conn)
 
         try:
             LOG.debug("Registering for connection events: %s", str(self))
@@ -507,6 +616,54 @@ class Host(object):
 
         return wrapped_conn
 
+    def _register_device_events(self, wrapped_conn):
+        """Registers for the events about the devices of the domains and
+        about the node devices, when libvirt provides them.
+        """
+        for event_id in ('VIR_DOMAIN_EVENT_ID_DEVICE_ADDED',
+                         'VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED'):
+            if not hasattr(libvirt, event_id):
+                continue
+            try:
+                wrapped_conn.domainEventRegisterAny(
+                    None,
+                    getattr(libvirt, event_id),
+                    self._event_device_callback,
+                    self)
+            except Exception as e:
+                LOG.debug("URI %(uri)s does not support %(event)s events: "
+                          "%(error)s",
+                          {'uri': self._uri, 'event': event_id, 'error': e})
+
+        if hasattr(libvirt, 'VIR_NODE_DEVICE_EVENT_ID_LIFECYCLE'):
+            try:
+                wrapped_conn.connNodeDeviceEventRegisterAny(
+                    None,
+                    libvirt.VIR_NODE_DEVICE_EVENT_ID_LIFECYCLE,
+                    self._event_node_device_callback,
+                    self)
+            except Exception as e:
+                LOG.debug("URI %(uri)s does not support node device events: "
+                          "%(error)s", {'uri': self._uri, 'error': e})
+            else:
+                self._device_events = True
+
+    def get_domain_generation(self):
+        """Returns a number which changes whenever a domain of the host is
+        defined, undefined, started, stopped or changes devices, or None if
+        libvirt does not send the events needed to follow these changes.
+        """
+        if self._domain_events:
+            return self._domain_generation
+
+    def get_device_generation(self):
+        """Returns a number which changes whenever a node device of the
+        host is created or deleted, or None if libvirt does not send the
+        events needed to follow these changes.
+        """
+        if self._device_events:
+            return self._device_generation
+
     def _get_connection(self):
         # multiple concurrent connections are protected by _wrapped_conn_lock
         with self._wrapped_conn_lock:
@@ -731,6 +888,32 @@ class Host(object):
 
         return doms
 
+    def get_domain_states(self):
+        """Get the libvirt states of the domains of all nova instances
+
+        Query libvirt for the state of every domain, running or not, in a
+        single API call when libvirt supports it (>= 1.2.8), or else by
+        listing the domains and getting their info one by one. Any "host"
+        domain (aka Xen Domain-0) is filtered out.
+
+        :returns: dict of libvirt domain states by domain UUID
+        """
+        if not self._skip_all_domain_stats:
+            try:
+                stats = self.get_connection().getAllDomainStats(
+                    libvirt.VIR_DOMAIN_STATS_STATE)
+            except (libvirt.libvirtError, AttributeError) as ex:
+                LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                             "falling back to slow code path: %(ex)s"),
+                         {'ex': ex})
+                self._skip_all_domain_stats = True
+            else:
+                return {dom.UUIDString(): record['state.state']
+                        for dom, record in stats if dom.ID() != 0}
+
+        return {dom.UUIDString(): dom.info()[0]
+                for dom in self.list_instance_domains(only_running=False)}
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
@@ -20,6 +20,7 @@ http://wiki.openstack.org/nova-image-cache-management.
 
 """
 
+import collections
 import hashlib
 import os
 import re
@@ -31,6 +32,7 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import fileutils
+from oslo_utils import units
 
 from nova.i18n import _LE
 from nova.i18n import _LI
@@ -65,6 +67,18 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_base_images_max_rate',
+               default=0,
+               help='Maximum rate in MB per second at which the base images '
+                    'are read to checksum them. 0 means no limit.'),
+    cfg.StrOpt('image_cache_index_filename',
+               help='File persisting the index of the image cache between '
+                    'runs of the image cache manager, for instance '
+                    '$instances_path/image_cache_index_$host.json. The '
+                    'index records the backing file of the instance disks, '
+                    'so that only the new disks are inspected with '
+                    'qemu-img, and the size, modification time and users of '
+                    'the base images. It is not used if unset.'),
     ]
 
 CONF = cfg.CONF
@@ -216,9 +230,19 @@ def write_stored_info(target, field=None, value=None):
 def _hash_file(filename):
     """Generate a hash for the contents of a file."""
     checksum = hashlib.sha1()
+    max_rate = CONF.libvirt.checksum_base_images_max_rate * units.Mi
+    start = time.time()
+    read = 0
     with open(filename) as f:
         for chunk in iter(lambda: f.read(32768), b''):
             checksum.update(chunk)
+            if max_rate:
+                # NOTE: sleeping also gives other threads a chance to run
+                # while hashing large images
+                read += len(chunk)
+                delay = float(read) / max_rate - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
     return checksum.hexdigest()
 
 
@@ -239,6 +263,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        # Index of the image cache, loaded from
+        # CONF.libvirt.image_cache_index_filename on the first run
+        self._index = None
         self._reset_state()
 
     def _reset_state(self):
@@ -257,6 +284,10 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.removable_base_files = []
         self.unexplained_images = []
 
+        self.base_images = []
+        self.base_file_users = collections.defaultdict(set)
+        self.indexed_disks = set()
+
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
         entpath = os.path.join(base_dir, ent)
@@ -306,9 +337,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 if os.path.exists(disk_path):
                     LOG.debug('%s has a disk file', ent)
                     try:
-                        backing_file = libvirt_utils.get_disk_backing_file(
-                            disk_path)
-                    except processutils.ProcessExecutionError:
+                        backing_file = self._get_disk_backing_file(disk_path)
+                    except (processutils.ProcessExecutionError, OSError):
                         # (for bug 1261442)
                         if not os.path.exists(disk_path):
                             LOG.debug('Failed to get disk backing file: %s',
@@ -328,6 +358,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                             backing_file)
                         if backing_path not in inuse_images:
                             inuse_images.append(backing_path)
+                        self.base_file_users[backing_path].add(ent)
 
                         if backing_path in self.unexplained_images:
                             LOG.warn(_LW('Instance %(instance)s is using a '
@@ -339,6 +370,88 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                             self.unexplained_images.remove(backing_path)
         return inuse_images
 
+    def _get_disk_backing_file(self, disk_path):
+        """Returns the backing file of an instance disk.
+
+        When the image cache index is enabled, the backing file is read from
+        the index as long as the disk is the same file, and only queried
+        with qemu-img for the new disks. A disk recreated with the same path
+        may reuse the inode of the previous one, so the backing files are
+        also queried again once they are as old as the unused base images
+        which get removed.
+        """
+        if not CONF.libvirt.image_cache_index_filename:
+            return libvirt_utils.get_disk_backing_file(disk_path)
+
+        disks = self._load_index()['disks']
+        inode = os.stat(disk_path).st_ino
+        self.indexed_disks.add(disk_path)
+        now = time.time()
+        entry = disks.get(disk_path)
+        if (entry is not None and entry['inode'] == inode and
+                now - entry['checked_at'] <
+                CONF.remove_unused_original_minimum_age_seconds):
+            return entry['backing_file']
+
+        backing_file = libvirt_utils.get_disk_backing_file(disk_path)
+        disks[disk_path] = {'inode': inode,
+                            'backing_file': backing_file,
+                            'checked_at': now}
+        return backing_file
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {'disks': {}, 'base_files': {}}
+            filename = CONF.libvirt.image_cache_index_filename
+            if os.path.exists(filename):
+                try:
+                    with open(filename, 'r') as f:
+                        self._index.update(jsonutils.loads(f.read()))
+                except (IOError, ValueError) as e:
+                    LOG.warn(_LW('Ignoring the image cache index %(file)s '
+                                 'which could not be read: %(error)s'),
+                             {'file': filename, 'error': e})
+        return self._index
+
+    def _save_index(self):
+        """Persist the index of the image cache.
+
+        The disks of the instances which are gone are dropped from the
+        index, and the base images are recorded with their size,
+        modification time and the instances using them.
+        """
+        filename = CONF.libvirt.image_cache_index_filename
+        if not filename:
+            return
+
+        index = self._load_index()
+        index['disks'] = dict((disk_path, entry) for disk_path, entry
+                              in index['disks'].items()
+                              if disk_path in self.indexed_disks)
+        base_files = {}
+        for base_file in self.base_images:
+            try:
+                stat = os.stat(base_file)
+            except OSError:
+                # Removed by this run
+                continue
+            base_files[base_file] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'users': sorted(self.base_file_users.get(base_file, []))}
+        index['base_files'] = base_files
+
+        # Write a temporary file first so that the index is never truncated
+        tmp_filename = '%s.tmp' % filename
+        try:
+            fileutils.ensure_tree(os.path.dirname(filename))
+            with open(tmp_filename, 'w') as f:
+                f.write(jsonutils.dumps(index))
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError) as e:
+            LOG.warn(_LW('Failed to write the image cache index %(file)s: '
+                         '%(error)s'), {'file': filename, 'error': e})
+
     def _find_base_file(self, base_dir, fingerprint):
         """Find the base file matching this fingerprint.
 
@@ -537,6 +650,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                           'remote': remote})
 
                 self.active_base_files.append(base_file)
+                self.base_file_users[base_file].update(instances)
 
                 if not base_file:
                     LOG.warn(_LW('image %(id)s at (%(base_file)s): warning '
@@ -655,6 +769,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self._reset_state()
         # read the cached images
         self._list_base_images(base_dir)
+        self.base_images = list(self.unexplained_images)
         # read running instances data
         running = self._list_running_instances(context, all_instances)
         self.used_images = running['used_images']
@@ -664,3 +779,4 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         # perform the aging and image verification
         self._age_and_verify_cached_images(context, all_instances, base_dir)
         self._age_and_verify_swap_images(context, base_dir)
+        self._save_index()
@@ -0,0 +1,114 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Prefetch of images into the image cache of the host, ahead of the
+instances booted from them.
+"""
+
+import os
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import fileutils
+
+from nova.i18n import _LI, _LW
+from nova import utils
+from nova.virt.libvirt import imagecache
+from nova.virt.libvirt import utils as libvirt_utils
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+
+STATUS_FETCHING = 'fetching'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+
+class ImagePrefetcher(object):
+    """Fetches images into the image cache of the host in the background.
+
+    The images are fetched by a bounded number of green threads, under the
+    same lock as the fetch done by Image.cache(), so that an instance booted
+    while its image is prefetched waits for the prefetch instead of fetching
+    the image again. Once the image is in the cache, booting instances from
+    it does not fetch it at all.
+    """
+
+    def __init__(self, concurrency):
+        self._pool = eventlet.GreenPool(concurrency)
+        # Status of the images prefetched by image id
+        self._status = {}
+
+    def prefetch(self, context, image_ids):
+        """Schedules the prefetch of the images which are not in the image
+        cache nor being prefetched already.
+        """
+        for image_id in image_ids:
+            if self._status.get(image_id) == STATUS_FETCHING:
+                continue
+            if self.is_ready(image_id):
+                self._status[image_id] = STATUS_READY
+                continue
+            self._status[image_id] = STATUS_FETCHING
+            self._pool.spawn_n(self._fetch, context, image_id)
+
+    def _get_base_path(self, image_id):
+        filename = imagecache.get_cache_fname({'image_id': image_id},
+                                              'image_id')
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        return base_dir, filename
+
+    def _fetch(self, context, image_id):
+        base_dir, filename = self._get_base_path(image_id)
+        target = os.path.join(base_dir, filename)
+
+        @utils.synchronized(filename, external=True,
+                            lock_path=os.path.join(CONF.instances_path,
+                                                   'locks'))
+        def _fetch_sync():
+            # The image may have been fetched by a boot while waiting for
+            # the lock
+            if not os.path.exists(target):
+                libvirt_utils.fetch_image(context, target, image_id,
+                                          context.user_id,
+                                          context.project_id)
+
+        try:
+            fileutils.ensure_tree(base_dir)
+            _fetch_sync()
+        except Exception as e:
+            LOG.warning(_LW("Failed to prefetch image %(image_id)s: %(e)s"),
+                        {'image_id': image_id, 'e': e})
+            self._status[image_id] = STATUS_FAILED
+        else:
+            LOG.info(_LI("Prefetched image %s"), image_id)
+            self._status[image_id] = STATUS_READY
+
+    def is_ready(self, image_id):
+        """Returns whether the image is in the image cache of the host."""
+        base_dir, filename = self._get_base_path(image_id)
+        return os.path.exists(os.path.join(base_dir, filename))
+
+    def get_status(self, image_id):
+        """Returns the status of the prefetch of the image: fetching, ready
+        or failed, or None if it was never prefetched.
+        """
+        return self._status.get(image_id)
@@ -42,6 +42,7 @@ from nova.virt.vmwareapi import constants
 from nova.virt.vmwareapi import error_util
 from nova.virt.vmwareapi import host
 from nova.virt.vmwareapi import vim_util as nova_vim_util
+from nova.virt.vmwareapi import vm_inventory
 from nova.virt.vmwareapi import vm_util
 from nova.virt.vmwareapi import vmops
 from nova.virt.vmwareapi import volumeops
@@ -97,7 +98,13 @@ vmwareapi_opts = [
                help='Optional VIM Service WSDL Location '
                     'e.g http://<server>/vimService.wsdl. '
                     'Optional over-ride to default location for bug '
-                    'work-arounds')
+                    'work-arounds'),
+    cfg.BoolOpt('use_vm_inventory',
+                default=False,
+                help='Whether to keep a local inventory of the virtual '
+                     'machines of vCenter, updated by the property '
+                     'collector, to look up the virtual machines, their '
+                     'power state and their host without querying vCenter.'),
     ]
 
 spbm_opts = [
@@ -164,6 +171,9 @@ class VMwareVCDriver(driver.ComputeDriver):
                     % CONF.vmware.datastore_regex)
 
         self._session = VMwareAPISession(scheme=scheme)
+        if CONF.vmware.use_vm_inventory:
+            self._session.vm_inventory = vm_inventory.VMInventory(
+                self._session)
 
         self._check_min_version()
 
@@ -237,8 +247,12 @@ class VMwareVCDriver(driver.ComputeDriver):
         vim = self._session.vim
         if vim is None:
             self._session._create_session()
+        if self._session.vm_inventory is not None:
+            self._session.vm_inventory.start()
 
     def cleanup_host(self, host):
+        if self._session.vm_inventory is not None:
+            self._session.vm_inventory.stop()
         self._session.logout()
 
     def _register_openstack_extension(self):
@@ -531,6 +545,10 @@ class VMwareVCDriver(driver.ComputeDriver):
         """Return info about the VM instance."""
         return self._vmops.get_info(instance)
 
+    def get_power_states(self):
+        """Return the power states of the VM instances."""
+        return self._vmops.get_power_states()
+
     def get_diagnostics(self, instance):
         """Return data about VM diagnostics."""
         return self._vmops.get_diagnostics(instance)
@@ -594,6 +612,10 @@ class VMwareAPISession(api.VMwareAPISession):
     """Sets up a session with the VC/ESX host and handles all
     the calls made to the host.
     """
+
+    # VMInventory of the virtual machines of vCenter, if enabled
+    vm_inventory = None
+
     def __init__(self, host_ip=CONF.vmware.host_ip,
                  host_port=CONF.vmware.host_port,
                  username=CONF.vmware.host_username,
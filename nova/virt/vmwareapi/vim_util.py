@@ -165,3 +165,43 @@ def get_properties_for_a_collection_of_objects(vim, type,
 def get_about_info(vim):
     """Get the About Info from the service content."""
     return vim.service_content.about
+
+
+def create_property_filter(vim, collector, type, properties_to_collect):
+    """Creates a filter on the property collector specified which reports
+    the changes of the properties of all the objects of the type specified.
+
+    :returns: the container view and the property filter created, to be
+              destroyed by the caller
+    """
+    client_factory = vim.client.factory
+    view = vim.CreateContainerView(vim.service_content.viewManager,
+                                   container=vim.service_content.rootFolder,
+                                   type=[type], recursive=True)
+    traversal_spec = vutil.build_traversal_spec(client_factory, 'view',
+                                                'ContainerView', 'view',
+                                                False, [])
+    object_spec = vutil.build_object_spec(client_factory, view,
+                                          [traversal_spec])
+    object_spec.skip = True
+    property_spec = vutil.build_property_spec(client_factory, type_=type,
+                                properties_to_collect=properties_to_collect)
+    property_filter_spec = vutil.build_property_filter_spec(client_factory,
+                                [property_spec], [object_spec])
+    property_filter = vim.CreateFilter(collector, spec=property_filter_spec,
+                                       partialUpdates=False)
+    return view, property_filter
+
+
+def wait_for_updates_ex(vim, collector, version, max_wait_seconds):
+    """Waits for the changes reported by the filters of the property
+    collector specified since the version given.
+
+    :returns: an UpdateSet, or None if nothing changed within
+              max_wait_seconds
+    """
+    client_factory = vim.client.factory
+    options = client_factory.create('ns0:WaitOptions')
+    options.maxWaitSeconds = max_wait_seconds
+    options.maxObjectUpdates = CONF.vmware.maximum_objects
+    return vim.WaitForUpdatesEx(collector, version=version, options=options)
@@ -0,0 +1,233 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local inventory of the virtual machines of a vCenter, kept up to date by
+the property collector.
+"""
+
+from eventlet import greenthread
+from oslo_log import log as logging
+from oslo_utils import uuidutils
+
+from nova.i18n import _LE, _LI
+from nova import utils
+from nova.virt.vmwareapi import vim_util
+from nova.virt.vmwareapi import vm_util
+
+LOG = logging.getLogger(__name__)
+
+VM_UUID_PROPERTY = 'config.extraConfig["nvp.vm-uuid"]'
+
+PROPERTIES = ['name',
+              'config.instanceUuid',
+              VM_UUID_PROPERTY,
+              'resourcePool',
+              'runtime.connectionState',
+              'runtime.host',
+              'runtime.powerState',
+              'summary.config.memorySizeMB',
+              'summary.config.numCpu']
+
+# Time waited by vCenter for changes before answering WaitForUpdatesEx
+MAX_WAIT_SECONDS = 60
+
+# Time waited before setting up the inventory again after a failure
+RETRY_INTERVAL = 10
+
+
+class VMInventory(object):
+    """Inventory of the virtual machines of a vCenter.
+
+    A green thread creates a property collector filter on all the virtual
+    machines of the vCenter and applies the changes reported by
+    WaitForUpdatesEx to the local inventory, so that the virtual machines
+    can be looked up without querying vCenter.
+
+    The inventory is only ready once it has received the properties of all
+    the virtual machines. It is not ready again until it is set up again
+    after a failure, for instance when the session to vCenter is recreated.
+    Callers must fall back to querying vCenter while it is not ready.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self._thread = None
+        self._collector = None
+        self._view = None
+        self._version = ''
+        self.ready = False
+        # Properties of the virtual machines by managed object id
+        self._vms = {}
+        # Managed object ids by instance uuid, by nvp.vm-uuid and by name
+        self._by_instance_uuid = {}
+        self._by_vm_uuid = {}
+        self._by_name = {}
+
+    def start(self):
+        self._thread = utils.spawn(self._run)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+        self._reset()
+
+    def _run(self):
+        while True:
+            try:
+                self._set_up()
+                while True:
+                    self._wait_for_updates()
+            except Exception:
+                LOG.exception(_LE("The inventory of the virtual machines "
+                                  "failed, setting it up again in "
+                                  "%d seconds"), RETRY_INTERVAL)
+                self._reset()
+                greenthread.sleep(RETRY_INTERVAL)
+
+    def _set_up(self):
+        vim = self._session.vim
+        self._collector = self._session._call_method(
+            vim, 'CreatePropertyCollector',
+            vim.service_content.propertyCollector)
+        self._view, _filter = self._session._call_method(
+            vim_util, 'create_property_filter', self._collector,
+            'VirtualMachine', PROPERTIES)
+        self._version = ''
+        LOG.info(_LI("Loading the inventory of the virtual machines"))
+
+    def _reset(self):
+        self.ready = False
+        self._vms = {}
+        self._by_instance_uuid = {}
+        self._by_vm_uuid = {}
+        self._by_name = {}
+        # NOTE: destroying the collector also destroys its filter. The
+        # session may be gone already, in which case vCenter destroyed them
+        # with it.
+        for method, obj in (('DestroyPropertyCollector', self._collector),
+                            ('DestroyView', self._view)):
+            if obj is None:
+                continue
+            try:
+                self._session._call_method(self._session.vim, method, obj)
+            except Exception:
+                LOG.debug("Failed to destroy %s", obj)
+        self._collector = None
+        self._view = None
+
+    def _wait_for_updates(self):
+        update_set = self._session._call_method(
+            vim_util, 'wait_for_updates_ex', self._collector, self._version,
+            MAX_WAIT_SECONDS)
+        if update_set is None:
+            return
+        for filter_update in getattr(update_set, 'filterSet', []):
+            for object_update in getattr(filter_update, 'objectSet', []):
+                self._apply(object_update)
+        self._version = update_set.version
+        # The updates are truncated until all of them have been received
+        if not getattr(update_set, 'truncated', False) and not self.ready:
+            self.ready = True
+            LOG.info(_LI("Loaded the inventory of %d virtual machines"),
+                     len(self._vms))
+
+    def _apply(self, object_update):
+        moid = object_update.obj.value
+        old_identifiers = set()
+        props = self._vms.get(moid)
+        if props is not None:
+            old_identifiers = self._unindex(moid, props)
+
+        if object_update.kind == 'leave':
+            self._vms.pop(moid, None)
+            new_identifiers = set()
+        else:
+            if props is None:
+                props = self._vms[moid] = {}
+            props['moref'] = object_update.obj
+            for change in getattr(object_update, 'changeSet', []):
+                if change.op in ('remove', 'indirectRemove'):
+                    props.pop(change.name, None)
+                else:
+                    props[change.name] = getattr(change, 'val', None)
+            new_identifiers = self._index(moid, props)
+
+        # References cached before the inventory was ready may point to a
+        # virtual machine which is gone or was renamed
+        for identifier in old_identifiers - new_identifiers:
+            vm_util.vm_ref_cache_delete(identifier)
+
+    def _get_identifiers(self, props):
+        vm_uuid = props.get(VM_UUID_PROPERTY)
+        return ((self._by_instance_uuid, props.get('config.instanceUuid')),
+                (self._by_vm_uuid, getattr(vm_uuid, 'value', None)),
+                (self._by_name, props.get('name')))
+
+    def _index(self, moid, props):
+        identifiers = set()
+        for index, identifier in self._get_identifiers(props):
+            if identifier is not None:
+                index[identifier] = moid
+                identifiers.add(identifier)
+        return identifiers
+
+    def _unindex(self, moid, props):
+        identifiers = set()
+        for index, identifier in self._get_identifiers(props):
+            if identifier is not None and index.get(identifier) == moid:
+                del index[identifier]
+                identifiers.add(identifier)
+        return identifiers
+
+    def _get(self, identifier):
+        for index in (self._by_instance_uuid, self._by_vm_uuid,
+                      self._by_name):
+            moid = index.get(identifier)
+            if moid is not None:
+                return self._vms[moid]
+
+    def get_vm_ref(self, identifier):
+        """Returns the reference to the virtual machine with the instance
+        uuid, the nvp.vm-uuid or the name specified, or None.
+        """
+        props = self._get(identifier)
+        if props is not None:
+            return props['moref']
+
+    def get_vm_properties(self, vm_ref):
+        """Returns a dict of the properties of the virtual machine, or None
+        if it is not in the inventory.
+        """
+        props = self._vms.get(vm_ref.value)
+        if props is not None:
+            return dict(props)
+
+    def get_vms_of_resource_pool(self, res_pool_ref):
+        """Returns a dict of the properties of the valid virtual machines of
+        the resource pool specified, by virtual machine name.
+        """
+        vms = {}
+        for props in self._vms.values():
+            res_pool = props.get('resourcePool')
+            vm_name = props.get('name')
+            if (res_pool is None or res_pool.value != res_pool_ref.value or
+                    props.get('runtime.connectionState') in
+                    ('orphaned', 'inaccessible') or
+                    not uuidutils.is_uuid_like(vm_name)):
+                continue
+            vms[vm_name] = dict(props)
+        return vms
@@ -136,7 +136,22 @@ def vm_ref_cache_get(id):
     return _VM_REFS_CACHE.get(id)
 
 
+def get_vm_inventory(session):
+    """Returns the VMInventory of the session if it is ready to answer,
+    None otherwise.
+    """
+    inventory = getattr(session, 'vm_inventory', None)
+    if inventory is not None and inventory.ready:
+        return inventory
+
+
 def _vm_ref_cache(id, func, session, data):
+    inventory = get_vm_inventory(session)
+    if inventory is not None:
+        vm_ref = inventory.get_vm_ref(id)
+        if vm_ref is not None:
+            return vm_ref
+
     vm_ref = vm_ref_cache_get(id)
     if not vm_ref:
         vm_ref = func(session, data)
@@ -1100,6 +1115,11 @@ def get_host_ref_for_vm(session, instance):
     """Get a MoRef to the ESXi host currently running an instance."""
 
     vm_ref = get_vm_ref(session, instance)
+    inventory = get_vm_inventory(session)
+    if inventory is not None:
+        props = inventory.get_vm_properties(vm_ref)
+        if props is not None:
+            return props.get('runtime.host')
     return session._call_method(vutil, "get_object_property",
                                 vm_ref, "runtime.host")
 
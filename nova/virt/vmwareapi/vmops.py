@@ -1453,16 +1453,20 @@ class VMwareVMOps(object):
         """Return data about the VM instance."""
         vm_ref = vm_util.get_vm_ref(self._session, instance)
 
-        lst_properties = ["summary.config.numCpu",
-                    "summary.config.memorySizeMB",
-                    "runtime.powerState"]
-        try:
-            vm_props = self._session._call_method(vutil,
-                                                  "get_object_properties_dict",
-                                                  vm_ref,
-                                                  lst_properties)
-        except vexc.ManagedObjectNotFoundException:
-            raise exception.InstanceNotFound(instance_id=instance.uuid)
+        vm_props = None
+        inventory = vm_util.get_vm_inventory(self._session)
+        if inventory is not None:
+            vm_props = inventory.get_vm_properties(vm_ref)
+        if vm_props is None:
+            lst_properties = ["summary.config.numCpu",
+                              "summary.config.memorySizeMB",
+                              "runtime.powerState"]
+            try:
+                vm_props = self._session._call_method(
+                    vutil, "get_object_properties_dict", vm_ref,
+                    lst_properties)
+            except vexc.ManagedObjectNotFoundException:
+                raise exception.InstanceNotFound(instance_id=instance.uuid)
         max_mem = int(vm_props.get('summary.config.memorySizeMB', 0)) * 1024
         num_cpu = int(vm_props.get('summary.config.numCpu', 0))
         return hardware.InstanceInfo(
@@ -1661,27 +1665,27 @@ class VMwareVMOps(object):
             datastores_info.append((ds, dc_info))
         self._imagecache.update(context, instances, datastores_info)
 
-    def _get_valid_vms_from_retrieve_result(self, retrieve_result):
-        """Returns list of valid vms from RetrieveResult object."""
-        lst_vm_names = []
-
+    def _iter_valid_vms(self, retrieve_result):
+        """Yields the name and the properties of the valid vms of a
+        RetrieveResult object.
+        """
         while retrieve_result:
             for vm in retrieve_result.objects:
-                vm_name = None
-                conn_state = None
-                for prop in vm.propSet:
-                    if prop.name == "name":
-                        vm_name = prop.val
-                    elif prop.name == "runtime.connectionState":
-                        conn_state = prop.val
+                props = {prop.name: prop.val for prop in vm.propSet}
+                vm_name = props.get("name")
+                conn_state = props.get("runtime.connectionState")
                 # Ignoring the orphaned or inaccessible VMs
                 if (conn_state not in ["orphaned", "inaccessible"] and
                     uuidutils.is_uuid_like(vm_name)):
-                    lst_vm_names.append(vm_name)
+                    yield vm_name, props
             retrieve_result = self._session._call_method(vutil,
                                                          'continue_retrieval',
                                                          retrieve_result)
-        return lst_vm_names
+
+    def _get_valid_vms_from_retrieve_result(self, retrieve_result):
+        """Returns list of valid vms from RetrieveResult object."""
+        return [vm_name for vm_name, _props
+                in self._iter_valid_vms(retrieve_result)]
 
     def instance_exists(self, instance):
         try:
@@ -1904,6 +1908,11 @@ class VMwareVMOps(object):
 
     def list_instances(self):
         """Lists the VM instances that are registered with vCenter cluster."""
+        inventory = vm_util.get_vm_inventory(self._session)
+        if inventory is not None and self._root_resource_pool:
+            return list(inventory.get_vms_of_resource_pool(
+                self._root_resource_pool))
+
         properties = ['name', 'runtime.connectionState']
         LOG.debug("Getting list of instances from cluster %s",
                   self._cluster)
@@ -1917,6 +1926,27 @@ class VMwareVMOps(object):
         LOG.debug("Got total of %s instances", str(len(lst_vm_names)))
         return lst_vm_names
 
+    def get_power_states(self):
+        """Returns the power states of the VM instances of the cluster,
+        retrieved by a single property collector query.
+        """
+        inventory = vm_util.get_vm_inventory(self._session)
+        if inventory is not None and self._root_resource_pool:
+            vms = inventory.get_vms_of_resource_pool(self._root_resource_pool)
+            # The power state of a VM may not have been reported yet
+            return {vm_name: VMWARE_POWER_STATES[props['runtime.powerState']]
+                    for vm_name, props in vms.items()
+                    if props.get('runtime.powerState') is not None}
+
+        properties = ['name', 'runtime.connectionState', 'runtime.powerState']
+        vms = []
+        if self._root_resource_pool:
+            vms = self._session._call_method(
+                vim_util, 'get_inner_objects', self._root_resource_pool, 'vm',
+                'VirtualMachine', properties)
+        return {vm_name: VMWARE_POWER_STATES[props['runtime.powerState']]
+                for vm_name, props in self._iter_valid_vms(vms)}
+
     def get_vnc_console(self, instance):
         """Return connection info for a vnc console using vCenter logic."""
 
@@ -187,6 +187,12 @@ class XenAPIDriver(driver.ComputeDriver):
         """
         return self._vmops.list_instance_uuids()
 
+    def list_instance_uuids_on_node(self, nodename):
+        """Get the list of nova instance uuids for VMs found on the
+        hypervisor, which is the only node of this driver.
+        """
+        return self.list_instance_uuids()
+
     def spawn(self, context, instance, image_meta, injected_files,
               admin_password, network_info=None, block_device_info=None):
         """Create VM instance."""
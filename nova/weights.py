@@ -23,6 +23,11 @@ import six
 
 from nova import loadables
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def normalize(weight_list, minval=None, maxval=None):
     """Normalize the values in a list between 0 and 1.0.
@@ -97,32 +102,61 @@ class BaseWeigher(object):
         just return a list of weights.
         """
         # Calculate the weights
-        weights = []
-        for obj in weighed_obj_list:
-            weight = self._weigh_object(obj.obj, weight_properties)
-
-            # Record the min and max values if they are None. If they anything
-            # but none we assume that the weigher has set them
-            if self.minval is None:
-                self.minval = weight
-            if self.maxval is None:
-                self.maxval = weight
+        weights = [self._weigh_object(obj.obj, weight_properties)
+                   for obj in weighed_obj_list]
+        self._record_range(weights)
+        return weights
 
-            if weight < self.minval:
-                self.minval = weight
-            elif weight > self.maxval:
-                self.maxval = weight
+    def weigh_objects_array(self, obj_list, weight_properties):
+        """Weigh multiple objects at once.
 
-            weights.append(weight)
+        Override in a subclass whose _weigh_object() only reads a numeric
+        attribute of the objects, see _weigh_attribute_array(). Return a
+        NumPy array of the weights, or None to have the objects weighed by
+        weigh_objects(). It is only called when NumPy is available.
+        """
+        return None
 
+    def _weigh_attribute_array(self, obj_list, attr_name):
+        """Return a NumPy array of the values of an attribute of the
+        objects, recording their range like weigh_objects() does.
+        """
+        weights = numpy.array([getattr(obj, attr_name) for obj in obj_list],
+                              dtype=float)
+        if len(weights):
+            self._record_range([float(weights.min()),
+                                float(weights.max())])
         return weights
 
+    def _record_range(self, weights):
+        # Record the min and max values if they are None. If they anything
+        # but none we assume that the weigher has set them
+        if len(weights):
+            minval = min(weights)
+            maxval = max(weights)
+            if self.minval is None or minval < self.minval:
+                self.minval = minval
+            if self.maxval is None or maxval > self.maxval:
+                self.maxval = maxval
+
 
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
+    # Set by enable_array_weighing()
+    _array_weighing = False
+
+    def enable_array_weighing(self):
+        """Sum the weights of the objects in NumPy arrays when it is
+        available, see BaseWeigher.weigh_objects_array().
+        """
+        self._array_weighing = True
+
     def get_weighed_objects(self, weighers, obj_list, weighing_properties):
         """Return a sorted (descending), normalized list of WeighedObjects."""
+        if self._array_weighing and numpy is not None:
+            return self._get_weighed_objects_array(weighers, obj_list,
+                                                   weighing_properties)
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
@@ -136,8 +170,72 @@ class BaseWeightHandler(loadables.BaseLoader):
                                 minval=weigher.minval,
                                 maxval=weigher.maxval)
 
-            for i, weight in enumerate(weights):
-                obj = weighed_objs[i]
-                obj.weight += weigher.weight_multiplier() * weight
+            multiplier = weigher.weight_multiplier()
+            for obj, weight in zip(weighed_objs, weights):
+                obj.weight += multiplier * weight
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def _get_weighed_objects_array(self, weighers, obj_list,
+                                   weighing_properties):
+        objs = list(obj_list)
+        if len(objs) <= 1:
+            return [self.object_class(obj, 0.0) for obj in objs]
+
+        totals = numpy.zeros(len(objs))
+        # Only built for the weighers which can't weigh arrays
+        weighed_objs = None
+        for weigher in weighers:
+            weights = weigher.weigh_objects_array(objs, weighing_properties)
+            if weights is None:
+                if weighed_objs is None:
+                    weighed_objs = [self.object_class(obj, 0.0)
+                                    for obj in objs]
+                for obj, weight in zip(weighed_objs, totals):
+                    obj.weight = float(weight)
+                weights = numpy.array(
+                    list(weigher.weigh_objects(weighed_objs,
+                                               weighing_properties)),
+                    dtype=float)
+
+            # Normalize the weights, see normalize()
+            minval = weights.min() if weigher.minval is None else (
+                weigher.minval)
+            maxval = weights.max() if weigher.maxval is None else (
+                weigher.maxval)
+            if minval != maxval:
+                totals += weigher.weight_multiplier() * (
+                    (weights - float(minval)) / (float(maxval) -
+                                                 float(minval)))
+
+        # NOTE: the sort is stable like sorted() so that the objects with
+        # the same weight keep their order.
+        return [self.object_class(objs[index], float(totals[index]))
+                for index in numpy.argsort(-totals, kind='mergesort')]
+
+    def get_weighed_object(self, weighers, obj, weighing_properties):
+        """Return a normalized WeighedObject for a single object.
+
+        The weights are normalized using the minimum and maximum values
+        already recorded by the weighers, so that the result can be compared
+        with the weights previously returned by get_weighed_objects(). If
+        weighing the object extends the range of any weigher, the weights of
+        all the objects would change and None is returned instead.
+
+        This is only valid for weighers which do not need all the objects to
+        weigh one of them.
+        """
+        weighed_obj = self.object_class(obj, 0.0)
+        for weigher in weighers:
+            ranges = (weigher.minval, weigher.maxval)
+            weights = weigher.weigh_objects([weighed_obj],
+                                            weighing_properties)
+            if (weigher.minval, weigher.maxval) != ranges:
+                return None
+
+            weight = list(normalize(weights,
+                                    minval=weigher.minval,
+                                    maxval=weigher.maxval))[0]
+            weighed_obj.weight += weigher.weight_multiplier() * weight
+
+        return weighed_obj
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+"""
+Measures the time spent by IptablesManager.apply() to apply a change to one
+chain depending on the number of rules, with full save/restore of the tables
+and with incremental applies (iptables_incremental_apply).
+
+The rules are spread over chains of 100 rules, like the security group
+chains of the instances. iptables-save and iptables-restore are not run: the
+tables restored are kept in memory and returned by the next save, so only
+the time spent by nova generating the tables, and the size of the input of
+iptables-restore, are measured.
+
+Usage:
+
+    python tools/perf/iptables_apply.py --rules 1000,10000,50000
+"""
+
+from __future__ import print_function
+
+import argparse
+import tempfile
+import time
+
+from oslo_config import cfg
+
+from nova.network import linux_net
+
+CONF = cfg.CONF
+
+RULES_PER_CHAIN = 100
+
+
+class FakeIptables(object):
+
+    def __init__(self):
+        self.tables = ''
+        self.restored_bytes = 0
+
+    def execute(self, *cmd, **kwargs):
+        if cmd[0].endswith('-save'):
+            return self.tables, ''
+        self.restored_bytes += len(kwargs['process_input'])
+        if '--noflush' not in cmd:
+            self.tables = kwargs['process_input']
+        return '', ''
+
+
+def _run(num_rules, incremental, iterations):
+    CONF.set_override('iptables_incremental_apply', incremental)
+    fake = FakeIptables()
+    manager = linux_net.IptablesManager(execute=fake.execute)
+    table = manager.ipv4['filter']
+    num_chains = max(1, num_rules // RULES_PER_CHAIN)
+    for i in range(num_chains):
+        table.add_chain('inst-%d' % i)
+        table.add_rule('local', '-d 10.%d.%d.%d -j $inst-%d' % (
+            i // 65536 % 256, i // 256 % 256, i % 256, i))
+    for i in range(num_rules):
+        table.add_rule('inst-%d' % (i % num_chains),
+                       '-s 192.168.%d.%d/32 -p tcp --dport %d -j ACCEPT' % (
+                           i // 256 % 256, i % 256, i // 65536 + 1))
+    manager._apply()
+
+    timings = []
+    fake.restored_bytes = 0
+    for i in range(iterations):
+        table.add_rule('inst-%d' % (i % num_chains),
+                       '-s 172.16.0.%d/32 -j ACCEPT' % i)
+        start = time.time()
+        manager._apply()
+        timings.append(time.time() - start)
+    return (sum(timings) / len(timings) * 1000,
+            fake.restored_bytes // iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rules', default='1000,10000,50000',
+                        help='Comma-separated list of rule counts')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Number of applies timed for each count')
+    args = parser.parse_args()
+
+    CONF([], project='nova', default_config_files=[])
+    CONF.set_override('use_ipv6', False)
+    CONF.set_override('lock_path', tempfile.mkdtemp(),
+                      group='oslo_concurrency')
+
+    print('%8s %12s %14s %12s %14s' % ('rules', 'full (ms)', 'full (bytes)',
+                                       'incr (ms)', 'incr (bytes)'))
+    for num_rules in [int(x) for x in args.rules.split(',')]:
+        full, full_bytes = _run(num_rules, False, args.iterations)
+        incr, incr_bytes = _run(num_rules, True, args.iterations)
+        print('%8d %12.1f %14d %12.1f %14d' % (num_rules, full, full_bytes,
+                                               incr, incr_bytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures the time spent by LibvirtDriver.get_available_resource() on a
+libvirt host, with the host inventory recomputed on every audit and with
+the inventory cached between audits (libvirt.inventory_cache_max_age).
+
+The driver connects read-only to the local libvirt daemon, so the host
+should already run the guests, for instance 200 of them, to get meaningful
+timings. The breakdown of the time spent in the most expensive parts of the
+inventory is printed as well.
+
+Usage:
+
+    python tools/perf/libvirt_inventory.py --iterations 10 \\
+        --instances-path /var/lib/nova/instances
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from oslo_config import cfg
+
+from nova.virt import fake
+from nova.virt.libvirt import driver as libvirt_driver
+
+CONF = cfg.CONF
+
+_TIMED_METHODS = ('_get_cpu_info', '_get_host_numa_topology',
+                  '_get_pci_passthrough_devices', '_get_vcpu_used',
+                  '_get_disk_over_committed_size_total')
+
+
+def _time_methods(drvr, timings):
+    def _wrap(name, func):
+        def _timed(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = timings.get(name, 0) + time.time() - start
+        return _timed
+
+    for name in _TIMED_METHODS:
+        setattr(drvr, name, _wrap(name, getattr(drvr, name)))
+
+
+def _run(max_age, iterations):
+    CONF.set_override('inventory_cache_max_age', max_age, group='libvirt')
+    drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+    drvr._host.initialize()
+    timings = {}
+    _time_methods(drvr, timings)
+
+    # The first audit always fills the cache
+    drvr.get_available_resource(CONF.host)
+    timings.clear()
+
+    start = time.time()
+    for _i in range(iterations):
+        drvr.get_available_resource(CONF.host)
+    total = (time.time() - start) / iterations * 1000
+    return total, {name: value / iterations * 1000
+                   for name, value in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=10,
+                        help='Number of audits timed with each setting')
+    parser.add_argument('--max-age', type=int, default=600,
+                        help='Maximum age of the cached inventory')
+    parser.add_argument('--connection-uri', default='qemu:///system',
+                        help='URI of the libvirt daemon')
+    parser.add_argument('--instances-path', default=None,
+                        help='Directory holding the disks of the guests')
+    args = parser.parse_args()
+
+    CONF([], project='nova', default_config_files=[])
+    CONF.set_override('connection_uri', args.connection_uri, group='libvirt')
+    if args.instances_path:
+        CONF.set_override('instances_path', args.instances_path)
+
+    uncached, uncached_parts = _run(0, args.iterations)
+    cached, cached_parts = _run(args.max_age, args.iterations)
+
+    print('%-40s %14s %14s' % ('', 'uncached (ms)', 'cached (ms)'))
+    for name in _TIMED_METHODS:
+        print('%-40s %14.1f %14.1f' % (name, uncached_parts.get(name, 0),
+                                       cached_parts.get(name, 0)))
+    print('%-40s %14.1f %14.1f' % ('get_available_resource', uncached,
+                                   cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures the time spent by HostManager.get_all_host_states() depending on the
+number of compute nodes, with full reloads of the compute nodes on every
+request and with incremental syncs (scheduler_host_state_full_sync_interval).
+
+An in-memory sqlite database is populated with the requested number of
+compute nodes and, between two requests, a fraction of them is updated as if
+their resource tracker had reported.
+
+Usage:
+
+    python tools/perf/scheduler_host_states.py --hosts 100,1000,3000
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from oslo_config import cfg
+
+from nova import context
+from nova import db
+from nova import objects
+from nova.scheduler import host_manager
+from nova.tests import fixtures as nova_fixtures
+
+CONF = cfg.CONF
+
+
+def _populate(ctxt, num_hosts):
+    compute_ids = []
+    for i in range(num_hosts):
+        host = 'host%d' % i
+        service = db.service_create(ctxt, {'host': host,
+                                           'binary': 'nova-compute',
+                                           'topic': 'compute',
+                                           'report_count': 0})
+        compute = db.compute_node_create(ctxt, {
+            'service_id': service['id'], 'host': host,
+            'hypervisor_hostname': 'node%d' % i, 'vcpus': 32,
+            'memory_mb': 131072, 'local_gb': 2048, 'vcpus_used': 0,
+            'memory_mb_used': 512, 'local_gb_used': 0, 'free_ram_mb': 130560,
+            'free_disk_gb': 2048, 'hypervisor_type': 'QEMU',
+            'hypervisor_version': 2000000, 'cpu_info': '{}',
+            'disk_available_least': 2048, 'host_ip': '10.0.0.1',
+            'supported_instances': '[["x86_64", "kvm", "hvm"]]',
+            'running_vms': 0, 'current_workload': 0, 'stats': '{}',
+            'metrics': '[]', 'pci_stats': None, 'numa_topology': None,
+            'cpu_allocation_ratio': 16.0, 'ram_allocation_ratio': 1.5})
+        compute_ids.append(compute['id'])
+    return compute_ids
+
+
+def _run(ctxt, compute_ids, full_sync_interval, iterations, changed):
+    CONF.set_override('scheduler_host_state_full_sync_interval',
+                      full_sync_interval)
+    hm = host_manager.HostManager()
+    # Behave like a scheduler receiving instance updates from all computes
+    hm._instance_info = {'host%d' % i: {'instances': {}, 'updated': True}
+                         for i in range(len(compute_ids))}
+    # Warm up the HostState map
+    list(hm.get_all_host_states(ctxt))
+
+    timings = []
+    for _i in range(iterations):
+        for compute_id in random.sample(compute_ids, changed):
+            db.compute_node_update(ctxt, compute_id,
+                                   {'vcpus_used': random.randint(0, 32)})
+        start = time.time()
+        list(hm.get_all_host_states(ctxt))
+        timings.append(time.time() - start)
+    return sum(timings) / len(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hosts', default='100,500,1000,3000',
+                        help='Comma-separated list of compute node counts')
+    parser.add_argument('--iterations', type=int, default=10,
+                        help='Number of requests timed for each count')
+    parser.add_argument('--changed-ratio', type=float, default=0.05,
+                        help='Ratio of compute nodes updated between two '
+                             'requests')
+    args = parser.parse_args()
+
+    CONF([], project='nova', default_config_files=[])
+    CONF.set_override('connection', 'sqlite://', group='database')
+    CONF.set_override('sqlite_synchronous', False, group='database')
+    CONF.set_override('scheduler_tracks_instance_changes', False)
+    objects.register_all()
+    database = nova_fixtures.Database()
+    database.setUp()
+    ctxt = context.get_admin_context()
+
+    print('%8s %16s %16s' % ('hosts', 'full (ms)', 'incremental (ms)'))
+    for num_hosts in [int(x) for x in args.hosts.split(',')]:
+        database.reset()
+        compute_ids = _populate(ctxt, num_hosts)
+        changed = max(1, int(num_hosts * args.changed_ratio))
+        full = _run(ctxt, compute_ids, 0, args.iterations, changed)
+        incremental = _run(ctxt, compute_ids, 600, args.iterations, changed)
+        print('%8d %16.1f %16.1f' % (num_hosts, full, incremental))
+    database.cleanUp()
+
+
+if __name__ == '__main__':
+    main()